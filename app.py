@@ -1,7 +1,15 @@
 import streamlit as st
 import os
-import pandas as pd
+import uuid
+from functools import partial
 from crew_modules import get_intake_crew, get_data_crew, get_analysis_crew, get_reporting_crew
+from jobs import JobRunner
+from tracing import TRACE_FILE, load_spans
+from stage_cache import file_hash, kickoff_stage
+from code_cache import find_recipe, kickoff_recipe
+from intake_cache import find_intake, kickoff_intake
+from workspace import Workspace, DATA_DIR, JIRA_TICKET, PROJECT_PLAN, UPLOADED_DATA, PRESENTATION, resolve_data_file
+from data_io import CLEANED_DATA_PATH, CLEANED_CSV_PATH, read_head, export_csv
 
 # Page Config
 st.set_page_config(page_title="CrewAI Data Science Team", layout="wide")
@@ -23,6 +31,160 @@ if 'analysis_result' not in st.session_state:
     st.session_state.analysis_result = None
 if 'project_request' not in st.session_state:
     st.session_state.project_request = ""
+if 'run_id' not in st.session_state:
+    st.session_state.run_id = uuid.uuid4().hex
+if 'workspace' not in st.session_state:
+    # Every browser session gets its own artifact directory, so concurrent users never collide
+    st.session_state.workspace = Workspace.create(st.session_state.run_id)
+workspace = st.session_state.workspace
+if 'jobs' not in st.session_state:
+    st.session_state.jobs = {}
+
+# Persistent Python kernel (opt-in): agent variables survive between code executions
+use_kernel = st.sidebar.checkbox("Persistent Python kernel", value=False,
+                                 help="Keep loaded DataFrames and imports between the agents' code runs.")
+kernel = workspace.kernel() if use_kernel else None
+if use_kernel:
+    if st.sidebar.button("Reset Python Kernel"):
+        kernel.reset()
+        st.sidebar.success("Kernel namespace cleared.")
+else:
+    workspace.shutdown_kernel()
+
+# Plan-on-sample (opt-in): the Data Engineer iterates on a stratified sample and its final
+# clean(df) runs over the full upload in parallel chunks
+use_sample = st.sidebar.checkbox("Plan cleaning on a sample", value=False,
+                                 help="Keep the Data Engineer's trial runs fast on large uploads.")
+sample_rows = st.sidebar.number_input("Sample rows", min_value=500, value=5000, step=500) if use_sample else None
+
+# Background Jobs: crews run on a shared thread pool and the page polls for progress
+@st.cache_resource
+def get_job_runner():
+    return JobRunner()
+
+runner = get_job_runner()
+
+def start_job(stage, label, build_crew, inputs=(), outputs=(), request=None, replay=False):
+    # Stages whose crew and input files are unchanged are restored from the stage cache
+    kickoff = partial(kickoff_stage, stage=stage, workspace=workspace, inputs=inputs, outputs=outputs)
+    if stage == "intake" and request is not None:
+        # Approved intakes are indexed by request, so similar requests can reuse their ticket and plan
+        kickoff = partial(kickoff_intake, workspace=workspace, request=request, outputs=outputs, reuse_similar=replay)
+    elif request is not None:
+        # Agent-written stages also record their tool calls, to replay on data with the same schema
+        kickoff = partial(kickoff_recipe, stage=stage, workspace=workspace, inputs=inputs, outputs=outputs,
+                          request=request, replay_saved=replay)
+    st.session_state.jobs[stage] = runner.submit(label, build_crew, kickoff).id
+    # The job may save a recipe or intake that the cached lookups don't know about
+    st.session_state.lookups = {}
+
+def cached_lookup(key, lookup):
+    """
+    lookup() once per key and session: recipe and intake lookups read files, and the page
+    reruns on every interaction.
+    """
+    lookups = st.session_state.setdefault("lookups", {})
+    if key not in lookups:
+        lookups[key] = lookup()
+    return lookups[key]
+
+def offer_replay(stage, inputs):
+    """True if the user chose to replay the saved recipe for these inputs instead of running the agents."""
+    request = st.session_state.project_request
+    # file_hash is memoized per path, size and mtime, so keying on the content is cheap
+    hashes = tuple(file_hash(workspace.path(name)) if workspace.exists(name) else None for name in inputs)
+    recipe = cached_lookup(("recipe", stage, request, hashes),
+                           partial(find_recipe, stage, workspace, inputs, request))
+    if recipe is None:
+        return False
+    st.info(f"Code saved from an earlier run on data with the same columns ({len(recipe['steps'])} step(s)) "
+            "can be replayed without calling the agents.")
+    return st.button("Replay Saved Code", key=f"replay_{stage}")
+
+def offer_intake(request):
+    """True if the user chose to reuse the intake of a similar earlier request instead of running the agents."""
+    match = cached_lookup(("intake", request), partial(find_intake, request))
+    if match is None:
+        return False
+    similarity, entry = match
+    st.info(f"An earlier request is {similarity:.0%} similar: \"{entry['request']}\". "
+            "Its approved ticket and plan can be reused without calling the agents.")
+    return st.button("Reuse Similar Plan")
+
+def render_drafts(job, chars=2000):
+    # Streamed output of the LLM calls still in flight, one block per agent
+    for role, text in job.drafts().items():
+        st.caption(f"✍️ {role} is writing...")
+        st.text(text[-chars:])
+
+def render_events(job, limit=50):
+    lines = [f"[{e['time'] - job.submitted_at:6.1f}s] {e['source']} · {e['kind']}: {e['message']}"
+             for e in job.events()[-limit:]]
+    st.text("\n".join(lines))
+
+@st.fragment(run_every=0.5)
+def job_progress(stage):
+    job = runner.get(st.session_state.jobs.get(stage))
+    if job is None or job.finished:
+        # Rerun the whole page so the tab can render the finished job's results
+        st.rerun()
+    st.info(f"{job.label} ({job.status}, {job.elapsed:.0f}s)")
+    render_events(job)
+    render_drafts(job)
+
+def show_job(stage):
+    job = runner.get(st.session_state.jobs.get(stage))
+    if job is None:
+        return None
+    if not job.finished:
+        job_progress(stage)
+    else:
+        if job.status == "failed":
+            st.error(f"{job.label} failed: {job.error}")
+        with st.expander(f"Activity log ({job.elapsed:.0f}s)"):
+            render_events(job)
+    return job
+
+@st.cache_data(max_entries=16)
+def preview(path, version, rows=20, sample=False):
+    # Keyed on the file's size and mtime, so the preview is computed once per file, not on every rerun
+    if sample:
+        from sample_mode import sample_frame
+
+        return sample_frame(path, rows=1000)[1]
+    return read_head(path, rows)
+
+def render_trace(path):
+    """Timeline of every recorded stage, task, LLM call and tool call, plus the biggest totals."""
+    import altair as alt
+    import pandas as pd
+
+    spans = load_spans(path)
+    if not spans:
+        st.info("No spans recorded yet. Run a stage first.")
+        return
+    df = pd.DataFrame(spans)
+    stages = {s["trace_id"]: s["name"] for s in spans if s["kind"] == "stage"}
+    df["stage"] = df["trace_id"].map(stages).fillna("running")
+    df["agent"] = [a.get("agent", "") for a in df["attributes"]]
+    df["start"] = pd.to_datetime(df["start_time_unix_nano"], unit="ns")
+    df["end"] = pd.to_datetime(df["end_time_unix_nano"], unit="ns")
+    df["seconds"] = (df["end_time_unix_nano"] - df["start_time_unix_nano"]) / 1e9
+    df["lane"] = df["stage"] + " · " + df["kind"] + df["agent"].map(lambda a: f" · {a}" if a else "")
+    df["details"] = df["attributes"].map(lambda a: ", ".join(f"{k}={v}" for k, v in a.items() if k != "description"))
+
+    stage = st.selectbox("Stage", ["All"] + sorted(df["stage"].unique()))
+    if stage != "All":
+        df = df[df["stage"] == stage]
+    chart = alt.Chart(df).mark_bar().encode(
+        x="start:T", x2="end:T", y=alt.Y("lane:N", sort=None, title=None), color="kind:N",
+        tooltip=["name", "stage", "agent", alt.Tooltip("seconds:Q", format=".2f"), "status", "details"],
+    )
+    st.altair_chart(chart, width="stretch")
+    hot = (df[df["kind"].isin(["llm", "tool"])]
+           .groupby(["stage", "kind", "name"])["seconds"].agg(["count", "sum", "max"])
+           .sort_values("sum", ascending=False))
+    st.dataframe(hot)
 
 # Tabs
 tab1, tab2, tab3, tab4 = st.tabs(["1. Intake & Scope", "2. Data Engineering", "3. Analysis", "4. Reporting"])
@@ -33,29 +195,31 @@ with tab1:
     project_request = st.text_area("Describe your data science project request:", 
                                    value="Build a churn model to see why users leave")
     
-    if st.button("Submit Request"):
+    reuse = offer_intake(project_request)
+    if st.button("Submit Request") or reuse:
         st.session_state.project_request = project_request
-        with st.spinner("Intake Manager & Scrum Master are working..."):
-            crew = get_intake_crew(api_key, project_request)
-            result = crew.kickoff()
-            st.success("Project Processed!")
-            st.write(result)
-            
-            # Check for Jira ticket
-            if os.path.exists("jira_ticket.txt"):
-                with open("jira_ticket.txt", "r") as f:
-                    st.session_state.jira_ticket = f.read()
-                st.subheader("Jira Ticket Created")
-                st.code(st.session_state.jira_ticket)
-            
-            # Check for Project Plan
-            if os.path.exists("project_plan.md"):
-                with open("project_plan.md", "r") as f:
-                    st.session_state.project_plan = f.read()
-                st.subheader("Project Plan Created")
-                st.markdown(st.session_state.project_plan)
-                
-            st.session_state.project_approved = True
+        start_job("intake", "Reusing a similar plan..." if reuse else "Intake Manager & Scrum Master are working...",
+                  partial(get_intake_crew, api_key, project_request, workspace=workspace, stream=True),
+                  outputs=[JIRA_TICKET, PROJECT_PLAN], request=project_request, replay=reuse)
+
+    job = show_job("intake")
+    if job and job.status == "succeeded":
+        st.success("Project Processed!")
+        st.write(job.result)
+
+        # Check for Jira ticket
+        if workspace.exists(JIRA_TICKET):
+            st.session_state.jira_ticket = workspace.read_text(JIRA_TICKET)
+            st.subheader("Jira Ticket Created")
+            st.code(st.session_state.jira_ticket)
+
+        # Check for Project Plan
+        if workspace.exists(PROJECT_PLAN):
+            st.session_state.project_plan = workspace.read_text(PROJECT_PLAN)
+            st.subheader("Project Plan Created")
+            st.markdown(st.session_state.project_plan)
+
+        st.session_state.project_approved = True
 
 # --- TAB 2: DATA ENGINEERING ---
 with tab2:
@@ -65,32 +229,63 @@ with tab2:
         st.warning("Please complete the Intake step first.")
     else:
         uploaded_file = st.file_uploader("Upload CSV Data", type=["csv"])
-        
+        server_path = ""
+        if DATA_DIR:
+            # Only files inside DATA_DIR can be named, so users can't read other files on the server
+            server_path = st.text_input("...or the name of a CSV file in the server's data directory",
+                                        help="For files too large to upload; the file is linked, not copied.")
+
+        # Spool the upload to disk once per file, without parsing it; reruns of the page reuse it
+        source = server_path.strip()
         if uploaded_file:
-            # Save uploaded file temporarily
-            temp_path = "uploaded_data.csv"
-            df = pd.read_csv(uploaded_file)
-            df.to_csv(temp_path, index=False)
-            st.dataframe(df.head())
-            
-            if st.button("Clean Data"):
-                with st.spinner("Data Engineer is cleaning the dataset..."):
-                    # In a real app, we'd pass the temp_path to the agent
-                    # For this demo, the agent uses its internal tool logic or we guide it
-                    # Here we'll just let the agent 'create_data' which mocks cleaning
-                    # To make it dynamic, we'd update the tool to read 'uploaded_data.csv'
-                    
-                    # Pass the project request so the agent knows how to clean the data
-                    crew = get_data_crew(api_key, temp_path, st.session_state.project_request) 
-                    result = crew.kickoff()
-                    
-                    st.success("Data Cleaned!")
-                    st.write(result)
-                    st.session_state.cleaned_data_path = "cleaned_data.csv"
-                    
-                    if os.path.exists("cleaned_data.csv"):
-                        clean_df = pd.read_csv("cleaned_data.csv")
-                        st.dataframe(clean_df.head())
+            source = getattr(uploaded_file, "file_id", None) or f"{uploaded_file.name}:{uploaded_file.size}"
+        if source and st.session_state.get("upload_source") != source:
+            try:
+                if uploaded_file:
+                    workspace.import_upload(uploaded_file, UPLOADED_DATA)
+                else:
+                    workspace.import_file(resolve_data_file(source), UPLOADED_DATA)
+                st.session_state.upload_source = source
+            except (OSError, ValueError) as e:
+                st.error(f"Could not load the file: {e}")
+
+        if source and st.session_state.get("upload_source") == source:
+            path = workspace.path(UPLOADED_DATA)
+            stat = os.stat(path)
+            st.caption(f"{stat.st_size / 1024 ** 2:,.1f} MB")
+            version = (stat.st_size, stat.st_mtime_ns)
+            st.dataframe(preview(path, version))
+            if st.checkbox("Preview a random sample", help="Reads the whole file once, in chunks."):
+                st.dataframe(preview(path, version, sample=True))
+
+            replay = offer_replay("data", [UPLOADED_DATA])
+            if st.button("Clean Data") or replay:
+                # Pass the project request so the agent knows how to clean the data
+                start_job("data", "Replaying saved cleaning code..." if replay else "Data Engineer is cleaning the dataset...",
+                          partial(get_data_crew, api_key, UPLOADED_DATA, st.session_state.project_request,
+                                  kernel=kernel, workspace=workspace, sample_rows=sample_rows, stream=True),
+                          inputs=[UPLOADED_DATA], outputs=[CLEANED_DATA_PATH],
+                          request=st.session_state.project_request, replay=replay)
+
+        job = show_job("data")
+        if job and job.status == "succeeded":
+            st.success("Data Cleaned!")
+            st.write(job.result)
+
+            if workspace.exists(CLEANED_DATA_PATH):
+                st.session_state.cleaned_data_path = CLEANED_DATA_PATH
+            elif workspace.exists(CLEANED_CSV_PATH):
+                # The agent fell back to CSV; downstream tools read either format
+                st.session_state.cleaned_data_path = CLEANED_CSV_PATH
+
+        if st.session_state.cleaned_data_path and workspace.exists(st.session_state.cleaned_data_path):
+            st.dataframe(read_head(workspace.path(st.session_state.cleaned_data_path)))
+            if st.session_state.cleaned_data_path.endswith(".parquet"):
+                if st.button("Export Cleaned Data as CSV"):
+                    csv_path = export_csv(workspace.path(st.session_state.cleaned_data_path),
+                                          workspace.path(CLEANED_CSV_PATH))
+                    with open(csv_path, "rb") as f:
+                        st.download_button(label="Download CSV", data=f, file_name=os.path.basename(csv_path), mime="text/csv")
 
 # --- TAB 3: ANALYSIS ---
 with tab3:
@@ -101,14 +296,19 @@ with tab3:
     else:
         st.write(f"Using dataset: `{st.session_state.cleaned_data_path}`")
         
-        if st.button("Run Analysis"):
-            with st.spinner("Senior Data Scientist is training the model..."):
-                crew = get_analysis_crew(api_key, st.session_state.cleaned_data_path, st.session_state.project_request)
-                result = crew.kickoff()
-                
-                st.success("Analysis Complete!")
-                st.session_state.analysis_result = str(result)
-                st.markdown(st.session_state.analysis_result)
+        replay = offer_replay("analysis", [st.session_state.cleaned_data_path])
+        if st.button("Run Analysis") or replay:
+            start_job("analysis", "Replaying saved analysis code..." if replay else "Senior Data Scientist is training the model...",
+                      partial(get_analysis_crew, api_key, st.session_state.cleaned_data_path,
+                              st.session_state.project_request, kernel=kernel, workspace=workspace, stream=True),
+                      inputs=[st.session_state.cleaned_data_path],
+                      request=st.session_state.project_request, replay=replay)
+
+        job = show_job("analysis")
+        if job and job.status == "succeeded":
+            st.success("Analysis Complete!")
+            st.session_state.analysis_result = str(job.result)
+            st.markdown(st.session_state.analysis_result)
 
 # --- TAB 4: REPORTING ---
 with tab4:
@@ -120,18 +320,27 @@ with tab4:
         st.write("Generating presentation based on analysis results...")
         
         if st.button("Generate Presentation"):
-            with st.spinner("Presentation Designer is building the deck..."):
-                crew = get_reporting_crew(api_key, st.session_state.analysis_result)
-                result = crew.kickoff()
-                
-                st.success("Presentation Ready!")
-                st.write(result)
-                
-                if os.path.exists("churn_presentation.pptx"):
-                    with open("churn_presentation.pptx", "rb") as f:
-                        st.download_button(
-                            label="Download PowerPoint",
-                            data=f,
-                            file_name="churn_presentation.pptx",
-                            mime="application/vnd.openxmlformats-officedocument.presentationml.presentation"
-                        )
+            start_job("reporting", "Presentation Designer is building the deck...",
+                      partial(get_reporting_crew, api_key, st.session_state.analysis_result, workspace=workspace, stream=True),
+                      outputs=[PRESENTATION])
+
+        job = show_job("reporting")
+        if job and job.status == "succeeded":
+            st.success("Presentation Ready!")
+            st.write(job.result)
+
+            if workspace.exists(PRESENTATION):
+                with open(workspace.path(PRESENTATION), "rb") as f:
+                    st.download_button(
+                        label="Download PowerPoint",
+                        data=f,
+                        file_name=PRESENTATION,
+                        mime="application/vnd.openxmlformats-officedocument.presentationml.presentation"
+                    )
+
+# --- TRACE PANEL ---
+if st.sidebar.checkbox("Show trace timeline", value=False,
+                       help="Where each stage's time went: LLM round-trips, tool calls and agent code."):
+    st.divider()
+    st.header("Trace")
+    render_trace(workspace.path(TRACE_FILE))
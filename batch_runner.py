@@ -0,0 +1,198 @@
+import argparse
+import json
+import os
+import re
+import sys
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dotenv import load_dotenv
+
+# ==============================================================================
+# 1. PIPELINE STAGES
+# ==============================================================================
+
+STAGES = ["intake", "data", "analysis", "reporting"]
+STATE_FILE = "batch_state.json"
+# Entry ids name their workspace directory under --runs-dir
+ENTRY_ID_PATTERN = re.compile(r"[A-Za-z0-9._-]+")
+
+
+def _load_state(workspace):
+    if workspace.exists(STATE_FILE):
+        return json.loads(workspace.read_text(STATE_FILE))
+    return {}
+
+
+def _save_state(workspace, state):
+    tmp_path = workspace.path(STATE_FILE + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, workspace.path(STATE_FILE))
+
+
+def _run_stage(stage, api_key, entry, workspace, state):
+    """Runs one stage and returns its text output; raises if the expected artifact is missing."""
+    # Imported here so the parent process stays light; each worker loads crewai once
+    from crew_modules import get_intake_crew, get_data_crew, get_analysis_crew, get_reporting_crew
+    from data_io import CLEANED_DATA_PATH
+    from workspace import JIRA_TICKET, PROJECT_PLAN, PRESENTATION
+    from stage_cache import kickoff_stage
+    from code_cache import kickoff_recipe
+    from intake_cache import kickoff_intake
+
+    request = entry["request"]
+    inputs = []
+    if stage == "intake":
+        crew = get_intake_crew(api_key, request, workspace=workspace)
+        expected = [JIRA_TICKET, PROJECT_PLAN]
+    elif stage == "data":
+        csv_name = os.path.basename(entry["csv_path"])
+        workspace.import_file(entry["csv_path"], csv_name)
+        crew = get_data_crew(api_key, csv_name, request, workspace=workspace)
+        inputs, expected = [csv_name], [CLEANED_DATA_PATH]
+    elif stage == "analysis":
+        crew = get_analysis_crew(api_key, CLEANED_DATA_PATH, request, workspace=workspace)
+        inputs, expected = [CLEANED_DATA_PATH], []
+    else:
+        crew = get_reporting_crew(api_key, state["analysis"]["output"], workspace=workspace)
+        expected = [PRESENTATION]
+
+    # Entries sharing a request and CSV reuse each other's stage results; with CODE_CACHE=auto,
+    # entries whose data has the same columns replay each other's agent code, and with
+    # INTAKE_CACHE=auto entries with similar requests reuse each other's ticket and plan
+    if stage == "intake":
+        result = kickoff_intake(crew, workspace, request, expected)
+    elif stage in ("data", "analysis"):
+        result = kickoff_recipe(crew, stage, workspace, inputs, expected, request=request)
+    else:
+        result = kickoff_stage(crew, stage, workspace, inputs, expected)
+    missing = [name for name in expected if not workspace.exists(name)]
+    if missing:
+        raise RuntimeError(f"Stage '{stage}' finished without creating: {', '.join(missing)}")
+    return result
+
+
+def run_entry(entry, api_key, runs_dir):
+    """
+    Runs every unfinished stage for one manifest entry inside its own workspace.
+    Per-stage status is checkpointed to the workspace, so a re-run resumes at the
+    first stage that has not succeeded yet.
+    """
+    from workspace import Workspace
+
+    workspace = Workspace(os.path.join(runs_dir, entry["id"]))
+    state = _load_state(workspace)
+    record = {"id": entry["id"], "workspace": workspace.root, "status": "succeeded", "stages": {}}
+    start = time.perf_counter()
+    try:
+        for stage in STAGES:
+            if state.get(stage, {}).get("status") == "succeeded":
+                record["stages"][stage] = {"status": "skipped", "seconds": 0.0}
+                continue
+
+            stage_start = time.perf_counter()
+            try:
+                output = _run_stage(stage, api_key, entry, workspace, state)
+            except Exception as e:
+                seconds = time.perf_counter() - stage_start
+                state[stage] = {"status": "failed", "seconds": seconds, "error": str(e)}
+                _save_state(workspace, state)
+                record["stages"][stage] = state[stage]
+                record["status"] = "failed"
+                break
+
+            state[stage] = {"status": "succeeded", "seconds": time.perf_counter() - stage_start,
+                            "output": str(output), "cached": output.cached,
+                            "replayed": getattr(output, "replayed", False),
+                            "reused": getattr(output, "reused", None)}
+            _save_state(workspace, state)
+            record["stages"][stage] = {"status": "succeeded", "seconds": state[stage]["seconds"], "cached": output.cached}
+    finally:
+        workspace.close()
+    record["seconds"] = time.perf_counter() - start
+    return record
+
+
+# ==============================================================================
+# 2. MANIFEST & DRIVER
+# ==============================================================================
+
+def load_manifest(path):
+    entries = []
+    with open(path, "r") as f:
+        for line_no, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if "request" not in entry or "csv_path" not in entry:
+                raise ValueError(f"{path}:{line_no}: entries need 'request' and 'csv_path'")
+            entry.setdefault("id", f"request-{line_no:05d}")
+            entry["id"] = str(entry["id"])
+            if not ENTRY_ID_PATTERN.fullmatch(entry["id"]) or ".." in entry["id"] or entry["id"] == ".":
+                raise ValueError(f"{path}:{line_no}: entry id {entry['id']!r} must be letters, digits, '.', '_' "
+                                 f"or '-' (and not '..'), since it names the entry's workspace")
+            entries.append(entry)
+    ids = [entry["id"] for entry in entries]
+    if len(ids) != len(set(ids)):
+        raise ValueError(f"{path}: duplicate entry ids")
+    return entries
+
+
+def _init_worker(workers):
+    # Workers split the quota evenly and queue behind interactive sessions in other processes
+    from llm_scheduler import configure_scheduler
+
+    configure_scheduler(priority="batch", share=1.0 / workers)
+
+
+def run_batch(manifest_path, results_path, runs_dir, workers, api_key):
+    entries = load_manifest(manifest_path)
+    os.makedirs(runs_dir, exist_ok=True)
+    print(f"Running {len(entries)} request(s) with {workers} worker(s); workspaces in {runs_dir}")
+
+    failures = 0
+    # spawn: each worker gets a clean interpreter (crewai starts threads, which fork would copy badly)
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                             initializer=_init_worker, initargs=(workers,)) as pool, open(results_path, "a") as results:
+        futures = {pool.submit(run_entry, entry, api_key, runs_dir): entry for entry in entries}
+        for future in as_completed(futures):
+            entry = futures[future]
+            try:
+                record = future.result()
+            except Exception as e:
+                # The worker process itself died; nothing was checkpointed for the failing stage
+                record = {"id": entry["id"], "status": "failed", "error": str(e), "stages": {}}
+            failures += record["status"] != "succeeded"
+            results.write(json.dumps(record) + "\n")
+            results.flush()
+            mark = "✅" if record["status"] == "succeeded" else "❌"
+            print(f"{mark} {record['id']} ({record.get('seconds', 0.0):.1f}s)")
+
+    print(f"Done: {len(entries) - failures} succeeded, {failures} failed. Results appended to {results_path}")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the intake → data → analysis → reporting pipeline for every entry of a JSONL manifest.")
+    parser.add_argument("manifest", help='JSONL file; one {"id", "request", "csv_path"} object per line ("id" is optional).')
+    parser.add_argument("--results", default="batch_results.jsonl", help="Where per-request result records are appended.")
+    parser.add_argument("--runs-dir", default=os.path.join("runs", "batch"), help="Base directory for per-request workspaces.")
+    parser.add_argument("--workers", type=int, default=4, help="Maximum number of requests processed concurrently.")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    api_key = os.getenv("GOOGLE_API_KEY")
+    # Replayed and stubbed runs never reach the provider, so they need no key
+    if (not api_key and os.getenv("LLM_CACHE", "on").lower() != "replay"
+            and os.getenv("LLM_BACKEND", "gemini").lower() != "stub"):
+        print("Error: GOOGLE_API_KEY not found in .env")
+        return 1
+
+    failures = run_batch(args.manifest, args.results, args.runs_dir, max(1, args.workers), api_key)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,59 @@
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+# Modules the app and crew factories must not pull in at import time; the tools load them on first use
+HEAVY_MODULES = ["pandas", "sklearn", "pptx", "pyarrow"]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(module, runs):
+    """Imports `module` in `runs` fresh interpreters and returns the timings and heavy modules seen."""
+    timings, loaded = [], set()
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY_MODULES)],
+            capture_output=True, text=True, check=True,
+        )
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        timings.append(result["seconds"])
+        loaded.update(result["loaded"])
+    return timings, sorted(loaded)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cold-start import benchmark for the crew modules.")
+    parser.add_argument("--module", default="crew_modules")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-seconds", type=float, default=None,
+                        help="Fail if the median import time exceeds this budget.")
+    args = parser.parse_args(argv)
+
+    timings, loaded = measure(args.module, args.runs)
+    median = statistics.median(timings)
+    print(json.dumps({"module": args.module, "runs": args.runs, "median_seconds": round(median, 3),
+                      "min_seconds": round(min(timings), 3), "heavy_modules_loaded": loaded}))
+
+    failed = False
+    if loaded:
+        print(f"❌ {args.module} imports heavy modules eagerly: {', '.join(loaded)}")
+        failed = True
+    if args.max_seconds is not None and median > args.max_seconds:
+        print(f"❌ Median import time {median:.2f}s exceeds the {args.max_seconds:.2f}s budget")
+        failed = True
+    if not failed:
+        print("✅ Import time within budget")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+# Must be set before crew_modules is imported (here and in the spawned stage workers)
+os.environ["LLM_BACKEND"] = "stub"
+
+STAGES = ["intake", "data", "analysis", "reporting"]
+REQUEST = "Build a churn model to see why users leave"
+DATASET_CHUNK_ROWS = 1_000_000
+
+# ==============================================================================
+# 1. SYNTHETIC DATA (same schema as sample_churn_data.csv)
+# ==============================================================================
+
+def generate_churn_data(rows, path, seed=42):
+    """Writes a churn dataset of `rows` rows in chunks, so 10M rows never sit in memory at once."""
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    written = 0
+    with open(path, "w", newline="") as f:
+        while written < rows:
+            n = min(DATASET_CHUNK_ROWS, rows - written)
+            age = rng.integers(18, 80, n)
+            balance = np.where(rng.random(n) < 0.35, 0.0, rng.normal(95_000, 40_000, n).clip(0)).round(2)
+            active = rng.integers(0, 2, n)
+            products = rng.choice([1, 2, 3, 4], n, p=[0.5, 0.42, 0.06, 0.02])
+            logit = -2.0 + 0.04 * (age - 40) - 0.8 * active + 0.9 * (products >= 3)
+            chunk = pd.DataFrame({
+                "customer_id": np.arange(15_000_000 + written, 15_000_000 + written + n),
+                "credit_score": rng.integers(350, 851, n),
+                "geography": rng.choice(["France", "Spain", "Germany"], n, p=[0.5, 0.25, 0.25]),
+                "gender": rng.choice(["Female", "Male"], n),
+                "age": age,
+                "tenure": rng.integers(0, 11, n),
+                "balance": balance,
+                "num_of_products": products,
+                "has_cr_card": rng.integers(0, 2, n),
+                "is_active_member": active,
+                "estimated_salary": rng.uniform(1_000, 200_000, n).round(2),
+                "exited": (rng.random(n) < 1 / (1 + np.exp(-logit))).astype(int),
+            })
+            chunk.to_csv(f, index=False, header=written == 0)
+            written += n
+    return path
+
+
+# ==============================================================================
+# 2. STAGE WORKER (one fresh process per stage, so peak RSS is per stage)
+# ==============================================================================
+
+def _peak_rss_mb():
+    # ru_maxrss is KiB on Linux and bytes on macOS; children covers the kernel worker
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(own, children) / scale
+
+
+def run_stage(stage, workspace_root, csv_name, analysis_result):
+    from crew_modules import get_intake_crew, get_data_crew, get_analysis_crew, get_reporting_crew
+    from data_io import CLEANED_DATA_PATH
+    from kernel import shutdown_pool
+    from workspace import Workspace
+
+    workspace = Workspace(workspace_root)
+    if stage == "intake":
+        crew = get_intake_crew(None, REQUEST, workspace=workspace)
+    elif stage == "data":
+        crew = get_data_crew(None, csv_name, REQUEST, workspace=workspace)
+    elif stage == "analysis":
+        crew = get_analysis_crew(None, CLEANED_DATA_PATH, REQUEST, workspace=workspace)
+    else:
+        crew = get_reporting_crew(None, analysis_result, workspace=workspace)
+
+    tool_calls = Counter()
+
+    def count_tools(step):
+        if getattr(step, "tool", None):
+            tool_calls[step.tool] += 1
+
+    for agent in crew.agents:
+        agent.step_callback = count_tools
+    llms = {id(agent.llm): agent.llm for agent in crew.agents}.values()
+
+    start = time.perf_counter()
+    status, output = "succeeded", ""
+    try:
+        output = str(crew.kickoff())
+    except Exception as e:
+        status, output = "failed", str(e)
+    seconds = time.perf_counter() - start
+    # Shut the kernels down first so their peak shows up in RUSAGE_CHILDREN
+    workspace.close()
+    shutdown_pool()
+    return {
+        "status": status,
+        "seconds": round(seconds, 4),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "tool_calls": dict(tool_calls),
+        # A routed LLM spreads its calls over both model tiers
+        "llm_calls": sum(sum(tier.calls.values()) for llm in llms
+                         for tier in getattr(llm, "tiers", {"": llm}).values()),
+        "output": output,
+    }
+
+
+# ==============================================================================
+# 3. DRIVER
+# ==============================================================================
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+def run_benchmark(sizes, data_dir, runs_dir):
+    from workspace import Workspace
+
+    os.makedirs(data_dir, exist_ok=True)
+    results = []
+    ctx = multiprocessing.get_context("spawn")
+    for rows in sizes:
+        csv_path = os.path.join(data_dir, f"churn_{rows}.csv")
+        if not os.path.exists(csv_path):
+            print(f"Generating {rows:,} rows -> {csv_path}")
+            generate_churn_data(rows, csv_path)
+        workspace = Workspace.create(f"bench-{rows}", base=runs_dir)
+        csv_name = "churn_data.csv"
+        workspace.import_file(csv_path, csv_name)
+
+        analysis_result = ""
+        for stage in STAGES:
+            with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+                record = pool.submit(run_stage, stage, workspace.root, csv_name, analysis_result).result()
+            if stage == "analysis":
+                analysis_result = record["output"]
+            record.pop("output")
+            record.update(rows=rows, stage=stage)
+            results.append(record)
+            print(f"{rows:>10,} rows  {stage:<10} {record['status']:<9} {record['seconds']:8.2f}s  "
+                  f"{record['peak_rss_mb']:8.1f} MB  tools={record['tool_calls']}")
+            if record["status"] != "succeeded":
+                break
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline per-stage latency/memory benchmark using the stub LLM.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000, 100_000, 1_000_000],
+                        help="Dataset sizes to benchmark (e.g. 1000 100000 1000000 10000000).")
+    parser.add_argument("--output", default="bench_results.json", help="Machine-readable results file.")
+    parser.add_argument("--data-dir", default=os.path.join("runs", "bench-data"), help="Cache for generated datasets.")
+    parser.add_argument("--runs-dir", default=os.path.join("runs", "bench"), help="Base directory for stage workspaces.")
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(args.rows, args.data_dir, args.runs_dir)
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+    return 0 if all(r["status"] == "succeeded" for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+import argparse
+import json
+import statistics
+import sys
+import threading
+import time
+
+# Interactive sessions and batch workers hammer a stub LLM that enforces a provider-style
+# quota, once through the shared scheduler and once with every caller retrying on its own.
+
+PROMPT = [{"role": "system", "content": "You are Senior Project Manager. "},
+          {"role": "user", "content": "Current Task: Write the plan to 'project_plan.md'."}]
+
+
+def _independent_call(llm, max_retries, retry_base):
+    """What each crew did before the scheduler: retry its own 429s on a fixed backoff."""
+    from llm_scheduler import is_rate_limit
+
+    for attempt in range(max_retries + 1):
+        try:
+            return llm.call(PROMPT)
+        except Exception as e:
+            if not is_rate_limit(e) or attempt == max_retries:
+                raise
+            time.sleep(retry_base * 2 ** attempt)
+
+
+def run(mode, callers, calls, quota_rpm, window, concurrency, max_retries, retry_base):
+    import stub_llm
+    from llm_scheduler import LLMScheduler
+
+    stub_llm.quota = stub_llm._Quota(window)
+    llm = stub_llm.ScriptedLLM(quota_rpm=quota_rpm)
+    scheduler = LLMScheduler(rpm=quota_rpm, tpm=0, max_concurrency=concurrency, max_retries=max_retries,
+                             retry_base=retry_base, retry_max=window, burst=max(1, quota_rpm * window / 60))
+    latencies = {"interactive": [], "batch": []}
+    failures = []
+    lock = threading.Lock()
+
+    def caller(priority):
+        for _ in range(calls):
+            start = time.perf_counter()
+            try:
+                if mode == "scheduled":
+                    scheduler.call(lambda: llm.call(PROMPT), priority)
+                else:
+                    _independent_call(llm, max_retries, retry_base)
+            except Exception as e:
+                with lock:
+                    failures.append(str(e))
+                continue
+            with lock:
+                latencies[priority].append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=caller, args=(priority,))
+               for priority, count in callers.items() for _ in range(count)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+
+    def summary(values):
+        if not values:
+            return {"calls": 0}
+        values = sorted(values)
+        return {"calls": len(values), "p50_seconds": round(statistics.median(values), 3),
+                "p95_seconds": round(values[int(0.95 * (len(values) - 1))], 3)}
+
+    completed = sum(len(values) for values in latencies.values())
+    return {"mode": mode, "seconds": round(seconds, 2), "completed": completed, "failed": len(failures),
+            "rate_limited": stub_llm.quota.rejected, "calls_per_second": round(completed / seconds, 2),
+            "interactive": summary(latencies["interactive"]), "batch": summary(latencies["batch"])}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rate-limit benchmark: shared LLM scheduler vs independent retries.")
+    parser.add_argument("--interactive", type=int, default=2, help="Concurrent interactive callers.")
+    parser.add_argument("--batch", type=int, default=8, help="Concurrent batch callers.")
+    parser.add_argument("--calls", type=int, default=10, help="LLM calls per caller.")
+    parser.add_argument("--quota-rpm", type=float, default=1200, help="Requests per minute the stub provider accepts.")
+    parser.add_argument("--window", type=float, default=1.0, help="Quota window in seconds (shrinks the run; 60 = a real minute).")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--max-retries", type=int, default=6)
+    parser.add_argument("--retry-base", type=float, default=0.1)
+    args = parser.parse_args(argv)
+
+    callers = {"interactive": args.interactive, "batch": args.batch}
+    results = [run(mode, callers, args.calls, args.quota_rpm, args.window, args.concurrency,
+                   args.max_retries, args.retry_base)
+               for mode in ("independent", "scheduled")]
+    for result in results:
+        print(json.dumps(result))
+
+    independent, scheduled = results
+    failed = scheduled["failed"] > 0
+    print(f"{'❌' if failed else '✅'} scheduled: {scheduled['completed']} calls, {scheduled['rate_limited']} 429s, "
+          f"{scheduled['failed']} failed; independent: {independent['completed']} calls, "
+          f"{independent['rate_limited']} 429s, {independent['failed']} failed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
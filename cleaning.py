@@ -0,0 +1,468 @@
+import json
+import os
+import time
+import numpy as np
+import pandas as pd
+from data_io import FrameWriter, iter_chunks
+from profiler import merge_numeric, merge_top, numeric_stats
+from tracing import annotate
+
+# ==============================================================================
+# 1. CONFIGURATION
+# ==============================================================================
+
+# Files with more rows than this are cleaned in chunks; smaller ones in one vectorized pass
+CLEAN_CHUNKSIZE = int(os.getenv("CLEAN_CHUNKSIZE", 500_000))
+
+TRUE_STRINGS = {"true", "t", "yes", "y", "1"}
+FALSE_STRINGS = {"false", "f", "no", "n", "0"}
+
+
+class PlanError(ValueError):
+    """A cleaning plan that cannot be run as written (unknown op, missing column, bad option)."""
+
+
+# ==============================================================================
+# 2. STEPS
+# ==============================================================================
+
+# A plan is a list of steps, e.g.
+#   [{"op": "dedupe"},
+#    {"op": "coerce", "columns": {"age": "int", "signup": "datetime"}},
+#    {"op": "impute", "columns": ["age"], "strategy": "median"},
+#    {"op": "clip_outliers", "columns": ["balance"], "method": "iqr"}]
+# Steps that need statistics over the whole file (means, quantiles, category counts)
+# are fitted on the output of the steps before them before anything is written.
+
+class Step:
+    op = None
+    needs_fit = False
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.changed = 0
+
+    def columns(self, df, default="all"):
+        columns = self.spec.get("columns")
+        if columns is None:
+            if default == "numeric":
+                return [c for c in df.columns if _is_numeric(df[c])]
+            if default == "categorical":
+                return [c for c in df.columns if _is_categorical(df[c])]
+            return list(df.columns)
+        if isinstance(columns, dict):
+            columns = list(columns)
+        missing = [c for c in columns if c not in df.columns]
+        if missing:
+            raise PlanError(f"{self.op}: unknown column(s) {missing}")
+        return columns
+
+    def start_pass(self):
+        """Resets state carried from one chunk to the next within a pass."""
+
+    def fit(self, chunk):
+        """Accumulates statistics from one chunk."""
+
+    def finish_fit(self):
+        pass
+
+    def apply(self, df):
+        raise NotImplementedError
+
+    def describe(self):
+        return f"{self.op}: {self.changed} values changed"
+
+
+def _is_numeric(col):
+    return pd.api.types.is_numeric_dtype(col) and not pd.api.types.is_bool_dtype(col)
+
+
+def _is_categorical(col):
+    # Labels only: object, string and category columns, never datetimes or booleans
+    return pd.api.types.is_object_dtype(col) or isinstance(col.dtype, (pd.StringDtype, pd.CategoricalDtype))
+
+
+class Dedupe(Step):
+    """Drops repeated rows (optionally judged on a subset of columns), across chunks too."""
+    op = "dedupe"
+
+    def start_pass(self):
+        # 64-bit hashes of the rows seen so far (8 bytes per distinct row), as sorted runs that
+        # each hold more than the runs after them. A chunk's run is merged into the last one
+        # only while it is at least as big, like a binary counter, so each hash is merged
+        # O(log n) times over a pass instead of the whole set being re-sorted every chunk.
+        self.seen = []
+
+    def _is_seen(self, hashes):
+        # Sorted lookups walk each run in order instead of jumping around it
+        found = np.zeros(len(hashes), dtype=bool)
+        for run in self.seen:
+            pos = np.searchsorted(run, hashes).clip(max=len(run) - 1)
+            found |= run[pos] == hashes
+        return found
+
+    def _add(self, run):
+        while self.seen and len(self.seen[-1]) <= len(run):
+            # A stable sort of two sorted runs is a linear merge (timsort)
+            run = np.sort(np.concatenate([self.seen.pop(), run]), kind="stable")
+        self.seen.append(run)
+
+    def apply(self, df):
+        subset = self.spec.get("subset") or list(df.columns)
+        missing = [c for c in subset if c not in df.columns]
+        if missing:
+            raise PlanError(f"dedupe: unknown column(s) {missing}")
+        hashes = pd.util.hash_pandas_object(df[subset], index=False).to_numpy()
+        order = np.argsort(hashes, kind="stable")
+        ordered = hashes[order]
+        # First of each repeated hash within the chunk, and not seen in earlier chunks
+        new = np.ones(len(ordered), dtype=bool)
+        new[1:] = ordered[1:] != ordered[:-1]
+        new &= ~self._is_seen(ordered)
+        if new.any():
+            self._add(ordered[new])
+        keep = np.zeros(len(hashes), dtype=bool)
+        keep[order] = new
+        self.changed += int((~keep).sum())
+        return df[keep]
+
+    def describe(self):
+        return f"dedupe: removed {self.changed} duplicate rows"
+
+
+class Coerce(Step):
+    """Casts columns to int, float, bool, str or datetime; unparseable values become missing."""
+    op = "coerce"
+    TYPES = ("int", "float", "bool", "str", "datetime")
+
+    def __init__(self, spec):
+        super().__init__(spec)
+        if not isinstance(spec.get("columns"), dict):
+            raise PlanError('coerce: "columns" must map column names to types, e.g. {"age": "int"}')
+        bad = {c: t for c, t in spec["columns"].items() if t not in self.TYPES}
+        if bad:
+            raise PlanError(f"coerce: unsupported type(s) {bad}; use one of {self.TYPES}")
+
+    def apply(self, df):
+        df = df.copy()
+        for name in self.columns(df):
+            col = df[name]
+            before = col.notna().sum()
+            kind = self.spec["columns"][name]
+            if kind in ("int", "float"):
+                col = pd.to_numeric(col, errors="coerce")
+                col = col.round().astype("Int64") if kind == "int" else col.astype("float64")
+            elif kind == "bool":
+                text = col.astype("string").str.strip().str.lower()
+                col = pd.Series(pd.NA, index=col.index, dtype="boolean")
+                col[text.isin(TRUE_STRINGS).fillna(False).astype(bool)] = True
+                col[text.isin(FALSE_STRINGS).fillna(False).astype(bool)] = False
+            elif kind == "str":
+                col = col.astype("string")
+            else:
+                col = pd.to_datetime(col, errors="coerce", format=self.spec.get("format"))
+            self.changed += int(before - col.notna().sum())
+            df[name] = col
+        return df
+
+    def describe(self):
+        return f"coerce: {self.changed} unparseable values set to missing"
+
+
+class ParseDates(Step):
+    """Parses the given text columns as datetimes, with an optional strftime format."""
+    op = "parse_dates"
+
+    def __init__(self, spec):
+        super().__init__(spec)
+        # Every text column by default would turn names and codes into all-missing dates
+        if not isinstance(spec.get("columns"), list) or not spec["columns"]:
+            raise PlanError('parse_dates: "columns" must list the date columns, e.g. ["signup_date"]')
+
+    def apply(self, df):
+        df = df.copy()
+        for name in self.columns(df):
+            before = df[name].notna().sum()
+            df[name] = pd.to_datetime(df[name], errors="coerce", format=self.spec.get("format"),
+                                      dayfirst=bool(self.spec.get("dayfirst", False)))
+            self.changed += int(before - df[name].notna().sum())
+        return df
+
+    def describe(self):
+        return f"parse_dates: {self.changed} unparseable values set to missing"
+
+
+class Impute(Step):
+    """Fills missing values with the column mean, median, mode or a constant."""
+    op = "impute"
+    STRATEGIES = ("mean", "median", "mode", "constant")
+
+    def __init__(self, spec):
+        super().__init__(spec)
+        self.strategy = spec.get("strategy", "median")
+        if self.strategy not in self.STRATEGIES:
+            raise PlanError(f"impute: strategy must be one of {self.STRATEGIES}")
+        if self.strategy == "constant" and "value" not in spec:
+            raise PlanError('impute: strategy "constant" needs a "value"')
+        self.needs_fit = self.strategy != "constant"
+        self.stats = {}
+        self.counts = {}
+        self.fill = {}
+        self.chunks = 0
+
+    def fit(self, chunk):
+        rng = np.random.default_rng(self.chunks)
+        self.chunks += 1
+        for name in self.columns(chunk):
+            values = chunk[name].dropna()
+            if self.strategy == "mode" or not _is_numeric(chunk[name]):
+                # Text columns fall back to the most frequent value
+                self.counts[name] = merge_top(self.counts.get(name, {}), values.value_counts().to_dict())
+            else:
+                stats = numeric_stats(values.to_numpy(dtype=float), rng)
+                self.stats[name] = merge_numeric(self.stats[name], stats) if name in self.stats else stats
+
+    def finish_fit(self):
+        for name, stats in self.stats.items():
+            if stats["n"]:
+                self.fill[name] = stats["mean"] if self.strategy == "mean" else float(np.quantile(stats["sample"], 0.5))
+        for name, counts in self.counts.items():
+            if counts:
+                self.fill[name] = max(counts.items(), key=lambda item: item[1])[0]
+
+    def apply(self, df):
+        df = df.copy()
+        for name in self.columns(df):
+            value = self.spec["value"] if self.strategy == "constant" else self.fill.get(name)
+            if value is None:
+                continue  # a column with no values at all has nothing to impute from
+            missing = df[name].isna()
+            if missing.any():
+                if pd.api.types.is_integer_dtype(df[name]) and isinstance(value, float):
+                    value = round(value)
+                df[name] = df[name].fillna(value)
+                self.changed += int(missing.sum())
+        return df
+
+    def describe(self):
+        fills = ", ".join(f"{k}={_short(v)}" for k, v in self.fill.items()) or _short(self.spec.get("value"))
+        return f"impute ({self.strategy}): filled {self.changed} missing values [{fills}]"
+
+
+class ClipOutliers(Step):
+    """Clips numeric columns to IQR fences, quantiles or mean +/- z standard deviations."""
+    op = "clip_outliers"
+    needs_fit = True
+    METHODS = ("iqr", "quantile", "zscore")
+
+    def __init__(self, spec):
+        super().__init__(spec)
+        self.method = spec.get("method", "iqr")
+        if self.method not in self.METHODS:
+            raise PlanError(f"clip_outliers: method must be one of {self.METHODS}")
+        self.stats = {}
+        self.bounds = {}
+        self.chunks = 0
+
+    def fit(self, chunk):
+        rng = np.random.default_rng(self.chunks)
+        self.chunks += 1
+        for name in self.columns(chunk, "numeric"):
+            if not _is_numeric(chunk[name]):
+                raise PlanError(f"clip_outliers: column {name!r} is not numeric; coerce it first")
+            stats = numeric_stats(chunk[name].dropna().to_numpy(dtype=float), rng)
+            self.stats[name] = merge_numeric(self.stats[name], stats) if name in self.stats else stats
+
+    def finish_fit(self):
+        for name, s in self.stats.items():
+            if not s["n"]:
+                continue
+            if self.method == "iqr":
+                q1, q3 = np.quantile(s["sample"], [0.25, 0.75])
+                k = float(self.spec.get("k", 1.5))
+                self.bounds[name] = (q1 - k * (q3 - q1), q3 + k * (q3 - q1))
+            elif self.method == "quantile":
+                self.bounds[name] = tuple(np.quantile(s["sample"], [float(self.spec.get("lower", 0.01)),
+                                                                    float(self.spec.get("upper", 0.99))]))
+            else:
+                std = np.sqrt(s["m2"] / (s["n"] - 1)) if s["n"] > 1 else 0.0
+                z = float(self.spec.get("z", 3.0))
+                self.bounds[name] = (s["mean"] - z * std, s["mean"] + z * std)
+
+    def apply(self, df):
+        df = df.copy()
+        for name, (low, high) in self.bounds.items():
+            col = df[name]
+            if pd.api.types.is_integer_dtype(col):
+                low, high = int(np.ceil(low)), int(np.floor(high))
+            outside = (col < low) | (col > high)
+            self.changed += int(outside.sum())
+            df[name] = col.clip(low, high)
+        return df
+
+    def describe(self):
+        bounds = ", ".join(f"{k} to [{_short(lo)}, {_short(hi)}]" for k, (lo, hi) in self.bounds.items())
+        return f"clip_outliers ({self.method}): clipped {self.changed} values [{bounds}]"
+
+
+class NormalizeCategories(Step):
+    """Strips, re-cases and maps category labels; optionally folds rare labels into one."""
+    op = "normalize_categories"
+
+    def __init__(self, spec):
+        super().__init__(spec)
+        self.min_count = spec.get("min_count")
+        self.needs_fit = bool(self.min_count)
+        self.counts = {}
+        self.rare = {}
+
+    def _normalize(self, col):
+        text = col.astype("string")
+        if self.spec.get("strip", True):
+            text = text.str.strip().str.replace(r"\s+", " ", regex=True)
+        case = self.spec.get("case", "none")
+        if case in ("lower", "upper", "title"):
+            text = getattr(text.str, case)()
+        mapping = self.spec.get("mapping")
+        if mapping:
+            text = text.replace(mapping)
+        return text
+
+    def columns(self, df, default="categorical"):
+        columns = super().columns(df, default)
+        bad = [name for name in columns if not _is_categorical(df[name])]
+        if bad:
+            raise PlanError(f"normalize_categories: column(s) {bad} do not hold text labels")
+        return columns
+
+    def fit(self, chunk):
+        for name in self.columns(chunk):
+            counts = self._normalize(chunk[name]).value_counts().to_dict()
+            self.counts[name] = merge_top(self.counts.get(name, {}), counts)
+
+    def finish_fit(self):
+        for name, counts in self.counts.items():
+            self.rare[name] = {value for value, count in counts.items() if count < self.min_count}
+
+    def apply(self, df):
+        df = df.copy()
+        for name in self.columns(df):
+            before = df[name].astype("string")
+            after = self._normalize(df[name])
+            if self.rare.get(name):
+                after = after.mask(after.isin(self.rare[name]), self.spec.get("other_label", "Other"))
+            self.changed += int((before.fillna("") != after.fillna("")).sum())
+            df[name] = after
+        return df
+
+
+class DropNulls(Step):
+    """Drops rows with a missing value in any (or the given) columns."""
+    op = "drop_nulls"
+
+    def apply(self, df):
+        before = len(df)
+        df = df.dropna(subset=self.columns(df))
+        self.changed += before - len(df)
+        return df
+
+    def describe(self):
+        return f"drop_nulls: removed {self.changed} rows"
+
+
+class DropColumns(Step):
+    op = "drop_columns"
+
+    def apply(self, df):
+        columns = self.columns(df)
+        self.changed = len(columns)
+        return df.drop(columns=columns)
+
+    def describe(self):
+        return f"drop_columns: dropped {self.spec.get('columns')}"
+
+
+STEPS = {cls.op: cls for cls in (Dedupe, Coerce, ParseDates, Impute, ClipOutliers,
+                                 NormalizeCategories, DropNulls, DropColumns)}
+
+
+def _short(value):
+    return f"{value:.4g}" if isinstance(value, (float, np.floating)) else repr(value)
+
+
+def parse_plan(plan):
+    """Accepts a plan as a list of step dicts or as its JSON text."""
+    if isinstance(plan, str):
+        try:
+            plan = json.loads(plan)
+        except ValueError as e:
+            raise PlanError(f"The plan is not valid JSON: {e}") from e
+    if isinstance(plan, dict):
+        plan = plan.get("steps", [plan])
+    steps = []
+    for spec in plan:
+        if not isinstance(spec, dict) or spec.get("op") not in STEPS:
+            raise PlanError(f"Unknown step {spec!r}; ops are {sorted(STEPS)}")
+        steps.append(STEPS[spec["op"]](spec))
+    return steps
+
+
+# ==============================================================================
+# 3. EXECUTION
+# ==============================================================================
+
+def _transform(chunk, steps):
+    for step in steps:
+        chunk = step.apply(chunk)
+    return chunk
+
+
+def run_plan(src, dest, plan, chunksize=CLEAN_CHUNKSIZE):
+    """
+    Runs a cleaning plan over src and writes the result to dest (CSV, Parquet or Arrow).
+    Each step is vectorized over a whole chunk. A step that needs file-wide statistics
+    costs one extra read of the file; files of a single chunk are read once.
+    Returns a short report of what every step did.
+    """
+    start = time.perf_counter()
+    steps = parse_plan(plan)
+    chunks = iter_chunks(src, chunksize)
+    first = next(chunks, None)
+    second = next(chunks, None)
+    rows_in = 0
+
+    if second is None:
+        df = first if first is not None else pd.DataFrame()
+        rows_in = len(df)
+        for step in steps:
+            step.start_pass()
+            if step.needs_fit:
+                step.fit(df)
+                step.finish_fit()
+            df = step.apply(df)
+        with FrameWriter(dest) as writer:
+            writer.write(df)
+        rows_out = len(df)
+    else:
+        for i, step in enumerate(steps):
+            if not step.needs_fit:
+                continue
+            for earlier in steps[:i]:
+                earlier.start_pass()
+            for chunk in iter_chunks(src, chunksize):
+                step.fit(_transform(chunk, steps[:i]))
+            step.finish_fit()
+        for step in steps:
+            step.start_pass()
+            step.changed = 0
+        with FrameWriter(dest) as writer:
+            for chunk in iter_chunks(src, chunksize):
+                rows_in += len(chunk)
+                writer.write(_transform(chunk, steps))
+            rows_out = writer.rows
+
+    seconds = time.perf_counter() - start
+    annotate(rows_in=rows_in, rows_out=rows_out, steps=len(steps))
+    lines = [f"Cleaned {rows_in} rows -> {rows_out} rows in {seconds:.2f}s; saved to '{os.path.basename(str(dest))}'."]
+    lines += [f"- {step.describe()}" for step in steps]
+    return "\n".join(lines)
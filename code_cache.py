@@ -0,0 +1,254 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+from stage_cache import StageResult, kickoff_stage
+from tracing import TRACE_FILE, instrument
+
+# ==============================================================================
+# 1. CONFIGURATION
+# ==============================================================================
+
+# Recurring extracts have the same columns every time, so the tool calls that cleaned or
+# analysed last week's file usually work on this week's. CODE_CACHE=on records them and
+# lets the app offer a replay; "auto" also replays without asking (batch and CLI runs);
+# "off" does neither.
+CODE_CACHE_MODE = os.getenv("CODE_CACHE", "on").lower()
+CODE_CACHE_DIR = os.getenv("CODE_CACHE_DIR", ".code_cache")
+CODE_CACHE_VERSION = 1
+# Rows read to infer an input's column types
+SCHEMA_SAMPLE_ROWS = 1000
+
+# Tools whose successful calls produce the stage's work; read-only tools are not replayed
+RECORDED_TOOLS = ("Execute Python Code", "Clean Data", "Apply Cleaning Code", "Train Model", "Score Data")
+
+
+class ReplayError(RuntimeError):
+    """A saved recipe did not reproduce the outputs it was recorded with."""
+
+
+def _failed(output):
+    # Tools report failures as text rather than raising (see kernel._format_result)
+    text = str(output).lstrip()
+    if text.startswith("(Started a new kernel session"):
+        text = text.split("\n", 1)[-1]
+    return text.startswith("Error")
+
+
+def schema_fingerprint(path):
+    """Column names and dtype kinds (int/float/str/...) of a data file, from its first rows."""
+    from data_io import read_head
+
+    head = read_head(path, SCHEMA_SAMPLE_ROWS)
+    return [[str(name), dtype.kind] for name, dtype in head.dtypes.items()]
+
+
+def normalize_request(request):
+    return " ".join(re.findall(r"[a-z0-9]+", (request or "").lower()))
+
+
+def recipe_key(stage, schema, request):
+    payload = {"version": CODE_CACHE_VERSION, "stage": stage, "schema": schema, "request": normalize_request(request)}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()[:24]
+
+
+# ==============================================================================
+# 2. RECORDING
+# ==============================================================================
+
+class Recorder:
+    """Wraps a crew's recorded tools so every successful call is kept, in order."""
+
+    def __init__(self):
+        self.steps = []
+
+    def _wrap(self, tool):
+        func = getattr(tool, "func", None)
+        if func is None or tool.name not in RECORDED_TOOLS:
+            return tool
+
+        def recorded(*args, **kwargs):
+            output = func(*args, **kwargs)
+            if not _failed(output):
+                self.steps.append({"tool": tool.name, "args": list(args), "kwargs": kwargs})
+            return output
+
+        # Tools may be shared between crews (TeamTools), so the crew gets its own copy
+        return tool.model_copy(update={"func": recorded})
+
+    def instrument(self, crew):
+        for agent in crew.agents:
+            agent.tools = [self._wrap(t) for t in agent.tools or []]
+        for task in crew.tasks:
+            # Tasks take a copy of their agent's tools when they are built, and crewai prefers those
+            task.tools = [self._wrap(t) for t in task.tools or []]
+        return self
+
+
+# ==============================================================================
+# 3. RECIPE STORE
+# ==============================================================================
+
+class CodeCache:
+    """Recipes (recorded tool calls plus the schemas of the outputs they made) as JSON files under `path`."""
+
+    def __init__(self, path=CODE_CACHE_DIR):
+        self.path = path
+
+    def _entry_path(self, key):
+        return os.path.join(self.path, f"{key}.json")
+
+    def get(self, key):
+        try:
+            with open(self._entry_path(key), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, recipe):
+        os.makedirs(self.path, exist_ok=True)
+        # Write to a temp file and rename, so readers never see half a recipe
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump({**recipe, "created": time.time()}, f, indent=2, default=str)
+        os.replace(tmp, self._entry_path(key))
+
+    def discard(self, key):
+        try:
+            os.remove(self._entry_path(key))
+        except OSError:
+            pass
+
+
+def code_cache_from_env():
+    if CODE_CACHE_MODE == "off":
+        return None
+    return CodeCache()
+
+
+def _key(stage, workspace, inputs, request):
+    if not inputs or not workspace.exists(inputs[0]):
+        return None
+    try:
+        return recipe_key(stage, schema_fingerprint(workspace.path(inputs[0])), request)
+    except (OSError, ValueError):
+        return None
+
+
+def find_recipe(stage, workspace, inputs, request, cache=None):
+    """The saved recipe for this stage, input schema and request, or None."""
+    cache = cache or code_cache_from_env()
+    key = _key(stage, workspace, inputs, request) if cache is not None else None
+    return cache.get(key) if key else None
+
+
+# ==============================================================================
+# 4. REPLAY
+# ==============================================================================
+
+def _rename_inputs(value, renames):
+    """
+    Swaps recorded input file names for this run's: whole string arguments, and names quoted
+    inside code ('data.csv' or "data.csv"), never a name that merely contains another.
+    """
+    if isinstance(value, dict):
+        return {k: _rename_inputs(v, renames) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_rename_inputs(v, renames) for v in value]
+    if not isinstance(value, str) or not renames:
+        return value
+    if value in renames:
+        return renames[value]
+    pattern = re.compile(r"""(?<=['"])(%s)(?=['"])""" % "|".join(re.escape(old) for old in sorted(renames, key=len, reverse=True)))
+    return pattern.sub(lambda m: renames[m.group(1)], value)
+
+
+# Train Model ends its report with the id it saved the model under
+MODEL_ID_PATTERN = re.compile(r"Model id: ([0-9a-f]+)")
+
+
+def _use_model(step, args, kwargs, model):
+    """Points a recorded Score Data call at the model this replay trained, not the recorded run's."""
+    if model is None or step["tool"] != "Score Data":
+        return args, kwargs
+    if "model_id" in kwargs or len(args) < 2:
+        return args, {**kwargs, "model_id": model}
+    return [args[0], model] + list(args[2:]), kwargs
+
+
+def replay(recipe, crew, stage, workspace, inputs=()):
+    """
+    Re-runs a recipe's tool calls with the crew's own (workspace-bound) tools, without any
+    LLM call, then checks every output exists with the recorded schema. Input file names
+    from the recorded run are swapped for this run's, and Score Data uses the model this
+    replay's Train Model step saved. Returns this replay's tool outputs (the recorded
+    summary described the other run's data); raises ReplayError if a step fails or an
+    output does not match.
+    """
+    renames = {old: new for old, new in zip(recipe["inputs"], inputs) if old != new}
+    outputs = []
+    model = None
+    start = time.perf_counter()
+    with instrument(crew, workspace.path(TRACE_FILE), f"{stage} (replay)"):
+        tools = {t.name: t for agent in crew.agents for t in agent.tools or []}
+        for i, step in enumerate(recipe["steps"], start=1):
+            tool = tools.get(step["tool"])
+            if tool is None:
+                raise ReplayError(f"Step {i}: the crew has no '{step['tool']}' tool")
+            args, kwargs = _use_model(step, _rename_inputs(step["args"], renames),
+                                      _rename_inputs(step["kwargs"], renames), model)
+            output = tool.func(*args, **kwargs)
+            if _failed(output):
+                raise ReplayError(f"Step {i} ({step['tool']}) failed: {str(output)[:500]}")
+            if step["tool"] == "Train Model":
+                found = MODEL_ID_PATTERN.search(str(output))
+                model = found.group(1) if found else model
+            outputs.append(f"### {step['tool']}\n{output}")
+
+    for name, schema in recipe["outputs"].items():
+        if not workspace.exists(name):
+            raise ReplayError(f"Replay did not create '{name}'")
+        if schema_fingerprint(workspace.path(name)) != schema:
+            raise ReplayError(f"'{name}' does not have the columns and types it had when the recipe was saved")
+    header = (f"Replayed {len(recipe['steps'])} saved step(s) from an earlier run on data with the same schema "
+              f"in {time.perf_counter() - start:.1f}s, without LLM calls. The tool output below is from this data.")
+    return "\n\n".join([header] + outputs)
+
+
+# ==============================================================================
+# 5. PUBLIC API
+# ==============================================================================
+
+def kickoff_recipe(crew, stage, workspace, inputs=(), outputs=(), request="", replay_saved=None, cache=None):
+    """
+    kickoff_stage() that also records the stage's successful tool calls as a recipe keyed by
+    the first input's schema and the request. With replay_saved (default: CODE_CACHE=auto)
+    a matching recipe is replayed instead of running the crew; if the replay fails, the
+    recipe is dropped and the crew runs as usual.
+    """
+    cache = cache if cache is not None else code_cache_from_env()
+    key = _key(stage, workspace, inputs, request) if cache is not None else None
+    if key is None:
+        return kickoff_stage(crew, stage, workspace, inputs, outputs)
+
+    if replay_saved is None:
+        replay_saved = CODE_CACHE_MODE == "auto"
+    recipe = cache.get(key) if replay_saved else None
+    if recipe is not None:
+        try:
+            result = StageResult(replay(recipe, crew, stage, workspace, inputs))
+            result.replayed = True
+            return result
+        except ReplayError:
+            # The data changed in a way the schema doesn't show; let the agents work it out again
+            cache.discard(key)
+
+    recorder = Recorder().instrument(crew)
+    result = kickoff_stage(crew, stage, workspace, inputs, outputs)
+    if not result.cached and recorder.steps and all(workspace.exists(name) for name in outputs):
+        cache.put(key, {"stage": stage, "request": request, "inputs": list(inputs), "steps": recorder.steps,
+                        "outputs": {name: schema_fingerprint(workspace.path(name)) for name in outputs},
+                        "result": str(result)})
+    return result
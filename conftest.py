@@ -0,0 +1,2 @@
+# test_pipeline.py is an end-to-end script that calls the real crews, not a pytest module
+collect_ignore = ["test_pipeline.py"]
@@ -1,13 +1,20 @@
 import os
-import sys
-import pandas as pd
-from io import StringIO
-from pptx import Presentation
-from crewai import Agent, Task, Crew, Process, LLM
+from crewai import Agent, Task, Crew, Process
+from crewai.tasks.conditional_task import ConditionalTask
 from crewai.tools import tool
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import accuracy_score
+from llm_cache import CachedLLM, cache_from_env
+from llm_pool import get_llm
+from llm_router import LLM_FAST_MODEL, LLM_STRONG_MODEL, route
+from llm_scheduler import schedule
+from data_io import CLEANED_DATA_PATH
+from scoring import PREDICTIONS_PATH
+from kernel import get_pool
+from workspace import Workspace, JIRA_TICKET, PROJECT_PLAN, PRESENTATION, resolve_inside
+from token_budget import HANDOFF_TOKEN_BUDGET, TOOL_TOKEN_BUDGET, fit, read_page
+from tracing import annotate
+
+# pandas, sklearn, pptx and the profiler are imported by the tools that need them,
+# on first use, so importing this module only pays for crewai.
 
 # ==============================================================================
 # 1. DEFINE TOOLS (The Skills)
@@ -25,19 +32,68 @@ class TeamTools:
     @tool("Inspect CSV")
     def inspect_csv(file_path: str):
         """
-        Reads the first 5 rows and data types of a CSV file.
+        Reads the first 5 rows, data types and summary statistics of a CSV, Parquet or Arrow file.
         Useful for understanding the dataset structure before cleaning or analysis.
         Input: file_path (str)
         """
         try:
-            df = pd.read_csv(file_path)
-            buffer = StringIO()
-            df.info(buf=buffer)
-            info_str = buffer.getvalue()
-            return f"First 5 rows:\n{df.head().to_string()}\n\nData Info:\n{info_str}\n\nDescription:\n{df.describe().to_string()}"
+            from profiler import profile_for_prompt
+            # Streams the file in chunks so large extracts don't have to fit in memory;
+            # wide tables come back summarized, with the full profile spilled to a file
+            return profile_for_prompt(file_path)
         except Exception as e:
             return f"Error reading CSV: {e}"
 
+    @tool("Read File Page")
+    def read_file_page(file_path: str, page: int = 1):
+        """
+        Reads one page of a long text file, such as a full data profile or tool output that
+        was too large to return at once. Pages are numbered from 1.
+        Inputs: file_path (str), page (int)
+        """
+        try:
+            # Only files under the working directory, so an agent can't page through the host
+            return read_page(resolve_inside(file_path, os.getcwd(), "the working directory"), page)
+        except Exception as e:
+            return f"Error reading file: {e}"
+
+    @tool("Clean Data")
+    def clean_data(file_path: str, plan: str, output_path: str = CLEANED_DATA_PATH):
+        """
+        Cleans a CSV, Parquet or Arrow file in one call by running a plan of vectorized steps,
+        and saves the result (Parquet by default). The plan is a JSON list of steps run in order:
+          {"op": "dedupe", "subset": [cols]}
+          {"op": "coerce", "columns": {"col": "int|float|bool|str|datetime"}}
+          {"op": "parse_dates", "columns": [cols], "format": "%Y-%m-%d"}
+          {"op": "impute", "columns": [cols], "strategy": "mean|median|mode|constant", "value": 0}
+          {"op": "clip_outliers", "columns": [cols], "method": "iqr|quantile|zscore"}
+          {"op": "normalize_categories", "columns": [cols], "case": "lower|upper|title", "mapping": {}, "min_count": 10}
+          {"op": "drop_nulls", "columns": [cols]}
+          {"op": "drop_columns", "columns": [cols]}
+        "columns" may be omitted (except for parse_dates) to apply a step to every suitable column.
+        Inputs: file_path (str), plan (str, JSON), output_path (str)
+        """
+        try:
+            from cleaning import run_plan
+            return fit(run_plan(file_path, output_path, plan), TOOL_TOKEN_BUDGET, "clean")
+        except Exception as e:
+            return f"Error cleaning data: {e}"
+
+    @tool("Apply Cleaning Code")
+    def apply_cleaning_code(code: str, sample_path: str, file_path: str, output_path: str = CLEANED_DATA_PATH):
+        """
+        Sample mode: checks Python code that defines clean(df) on the sample file, then applies it
+        to every chunk of the full file in parallel and saves the result (Parquet by default).
+        clean(df) must take a DataFrame and return the cleaned DataFrame without reading or
+        writing files, and must give the same rows whether it sees the whole file or one chunk.
+        Inputs: code (str), sample_path (str), file_path (str), output_path (str)
+        """
+        try:
+            from sample_mode import apply_transform
+            return apply_transform(code, sample_path, file_path, output_path)
+        except Exception as e:
+            return f"Error applying cleaning code: {e}"
+
     @tool("Execute Python Code")
     def execute_python_code(code: str):
         """
@@ -45,68 +101,301 @@ class TeamTools:
         The code must be valid Python. 
         Standard output (print statements) is captured and returned.
         Variables created in the code are NOT persisted between calls unless saved to files.
+        read_frame(path) loads a CSV, Parquet or Arrow file into a DataFrame with compact dtypes
+        (small ints, float32, category for repeated text: use .astype(str) before adding new labels);
+        memory_note(df) reports its size and compact_frame(df) shrinks other frames the same way.
         Useful for dynamic data cleaning, analysis, and plotting.
         Input: code (str)
         """
-        old_stdout = sys.stdout
-        redirected_output = sys.stdout = StringIO()
+        # Runs in a worker from the shared kernel pool: output is captured per call, a runaway
+        # loop hits the timeout, and agent code cannot clobber this process's globals
+        return get_pool().run(code, os.getcwd())
+
+    @tool("Train Model")
+    def train_model(file_path: str, target: str = ""):
+        """
+        Trains a model on a CSV, Parquet or Arrow file using every core: a Random Forest whose
+        hyperparameters are tuned by a budgeted search that drops poor settings early, or, for
+        files too large for memory, linear models trained chunk by chunk. Returns the held-out
+        accuracy (R2 for numeric targets), the top feature importances and the model id for Score Data.
+        Leave target empty to use the churn/label-like column.
+        Inputs: file_path (str), target (str)
+        """
+        try:
+            from training import train_model as train
+            return train(file_path, target or None)
+        except Exception as e:
+            return f"Error training model: {e}"
+
+    @tool("Score Data")
+    def score_data(file_path: str, model_id: str, output_path: str = PREDICTIONS_PATH):
+        """
+        Scores a CSV, Parquet or Arrow file with a model saved by Train Model, streaming it in
+        chunks across worker processes, and saves the predictions (Parquet by default).
+        model_id is the id Train Model reported for the model to use.
+        Inputs: file_path (str), model_id (str), output_path (str)
+        """
         try:
-            # Pre-import common libraries for convenience
-            import pandas as pd
-            import numpy as np
-            import sklearn
-            
-            exec(code, globals())
-            sys.stdout = old_stdout
-            return f"Code executed successfully.\nOutput:\n{redirected_output.getvalue()}"
+            # The registry is shared by every run, so its newest model may be another run's
+            if model_id.strip().lower() in ("", "latest"):
+                raise ValueError("pass the model id that Train Model reported")
+            from scoring import score_file
+            return score_file(model_id, file_path, output_path)
         except Exception as e:
-            sys.stdout = old_stdout
-            return f"Error executing code: {e}"
+            return f"Error scoring data: {e}"
 
     @tool("Generate PowerPoint")
     def create_pptx(title: str, summary: str, findings: str):
         """Creates a .pptx slide deck. Inputs: Title, Summary, Findings."""
-        prs = Presentation()
-
-        # Slide 1: Title
-        slide = prs.slides.add_slide(prs.slide_layouts[0])
-        slide.shapes.title.text = "Project Update: Data Analysis"
-        slide.placeholders[1].text = title
-
-        # Slide 2: Summary
-        slide = prs.slides.add_slide(prs.slide_layouts[1])
-        slide.shapes.title.text = "Executive Summary"
-        slide.placeholders[1].text = summary
-
-        # Slide 3: Model Findings
-        slide = prs.slides.add_slide(prs.slide_layouts[1])
-        slide.shapes.title.text = "Model Insights"
-        slide.placeholders[1].text = findings
-
-        prs.save('churn_presentation.pptx')
-        return "Presentation saved as 'churn_presentation.pptx'"
+        return build_presentation(title, summary, findings, PRESENTATION)
+
+def build_presentation(title, summary, findings, output_path):
+    from pptx import Presentation
+
+    prs = Presentation()
+
+    # Slide 1: Title
+    slide = prs.slides.add_slide(prs.slide_layouts[0])
+    slide.shapes.title.text = "Project Update: Data Analysis"
+    slide.placeholders[1].text = title
+
+    # Slide 2: Summary
+    slide = prs.slides.add_slide(prs.slide_layouts[1])
+    slide.shapes.title.text = "Executive Summary"
+    slide.placeholders[1].text = summary
+
+    # Slide 3: Model Findings
+    slide = prs.slides.add_slide(prs.slide_layouts[1])
+    slide.shapes.title.text = "Model Insights"
+    slide.placeholders[1].text = findings
+
+    prs.save(output_path)
+    annotate(bytes_written=os.path.getsize(output_path))
+    return f"Presentation saved as '{os.path.basename(output_path)}'"
+
+class WorkspaceTools:
+    """
+    The TeamTools skills bound to one run's Workspace: relative file names resolve
+    inside it and agent code runs in a kernel whose CWD is the workspace.
+    """
+
+    def __init__(self, workspace, kernel=None, request=""):
+        self.workspace = workspace
+        self.execute_python_code = (kernel or workspace.kernel(persistent=False)).tool()
+
+        @tool("Save File")
+        def save_file(filename: str, content: str):
+            """Saves text content to a file. Useful for reports, plans, and tickets."""
+            with open(workspace.path(filename), 'w') as f:
+                f.write(content)
+            return f"File saved: {filename}"
+
+        @tool("Inspect CSV")
+        def inspect_csv(file_path: str):
+            """
+            Reads the first 5 rows, data types and summary statistics of a CSV, Parquet or Arrow file.
+            Useful for understanding the dataset structure before cleaning or analysis.
+            Input: file_path (str)
+            """
+            try:
+                from profiler import profile_for_prompt
+                # Columns are ranked against the request when the table is too wide for the budget
+                return profile_for_prompt(workspace.path(file_path), request, base_dir=workspace.root)
+            except Exception as e:
+                return f"Error reading CSV: {e}"
+
+        @tool("Read File Page")
+        def read_file_page(file_path: str, page: int = 1):
+            """
+            Reads one page of a long text file, such as a full data profile or tool output that
+            was too large to return at once. Pages are numbered from 1.
+            Inputs: file_path (str), page (int)
+            """
+            try:
+                return read_page(workspace.confined_path(file_path), page)
+            except Exception as e:
+                return f"Error reading file: {e}"
+
+        @tool("Clean Data")
+        def clean_data(file_path: str, plan: str, output_path: str = CLEANED_DATA_PATH):
+            """
+            Cleans a CSV, Parquet or Arrow file in one call by running a plan of vectorized steps,
+            and saves the result (Parquet by default). The plan is a JSON list of steps run in order:
+              {"op": "dedupe", "subset": [cols]}
+              {"op": "coerce", "columns": {"col": "int|float|bool|str|datetime"}}
+              {"op": "parse_dates", "columns": [cols], "format": "%Y-%m-%d"}
+              {"op": "impute", "columns": [cols], "strategy": "mean|median|mode|constant", "value": 0}
+              {"op": "clip_outliers", "columns": [cols], "method": "iqr|quantile|zscore"}
+              {"op": "normalize_categories", "columns": [cols], "case": "lower|upper|title", "mapping": {}, "min_count": 10}
+              {"op": "drop_nulls", "columns": [cols]}
+              {"op": "drop_columns", "columns": [cols]}
+            "columns" may be omitted (except for parse_dates) to apply a step to every suitable column.
+            Inputs: file_path (str), plan (str, JSON), output_path (str)
+            """
+            try:
+                from cleaning import run_plan
+                report = run_plan(workspace.path(file_path), workspace.path(output_path), plan)
+                return fit(report, TOOL_TOKEN_BUDGET, "clean", base_dir=workspace.root)
+            except Exception as e:
+                return f"Error cleaning data: {e}"
+
+        @tool("Apply Cleaning Code")
+        def apply_cleaning_code(code: str, sample_path: str, file_path: str, output_path: str = CLEANED_DATA_PATH):
+            """
+            Sample mode: checks Python code that defines clean(df) on the sample file, then applies it
+            to every chunk of the full file in parallel and saves the result (Parquet by default).
+            clean(df) must take a DataFrame and return the cleaned DataFrame without reading or
+            writing files, and must give the same rows whether it sees the whole file or one chunk.
+            Inputs: code (str), sample_path (str), file_path (str), output_path (str)
+            """
+            try:
+                from sample_mode import apply_transform
+                return apply_transform(code, workspace.path(sample_path), workspace.path(file_path),
+                                       workspace.path(output_path))
+            except Exception as e:
+                return f"Error applying cleaning code: {e}"
+
+        @tool("Train Model")
+        def train_model(file_path: str, target: str = ""):
+            """
+            Trains a model on a CSV, Parquet or Arrow file using every core: a Random Forest whose
+            hyperparameters are tuned by a budgeted search that drops poor settings early, or, for
+            files too large for memory, linear models trained chunk by chunk. Returns the held-out
+            accuracy (R2 for numeric targets), the top feature importances and the model id for Score Data.
+            Leave target empty to use the churn/label-like column.
+            Inputs: file_path (str), target (str)
+            """
+            try:
+                from training import train_model as train
+                return train(workspace.path(file_path), target or None)
+            except Exception as e:
+                return f"Error training model: {e}"
+
+        @tool("Score Data")
+        def score_data(file_path: str, model_id: str, output_path: str = PREDICTIONS_PATH):
+            """
+            Scores a CSV, Parquet or Arrow file with a model saved by Train Model, streaming it in
+            chunks across worker processes, and saves the predictions (Parquet by default).
+            model_id is the id Train Model reported for the model to use.
+            Inputs: file_path (str), model_id (str), output_path (str)
+            """
+            try:
+                # The registry is shared by every run, so its newest model may be another run's
+                if model_id.strip().lower() in ("", "latest"):
+                    raise ValueError("pass the model id that Train Model reported")
+                from scoring import score_file
+                return score_file(model_id, workspace.path(file_path), workspace.path(output_path))
+            except Exception as e:
+                return f"Error scoring data: {e}"
+
+        @tool("Generate PowerPoint")
+        def create_pptx(title: str, summary: str, findings: str):
+            """Creates a .pptx slide deck. Inputs: Title, Summary, Findings."""
+            return build_presentation(title, summary, findings, workspace.path(PRESENTATION))
+
+        self.save_file = save_file
+        self.inspect_csv = inspect_csv
+        self.read_file_page = read_file_page
+        self.clean_data = clean_data
+        self.apply_cleaning_code = apply_cleaning_code
+        self.train_model = train_model
+        self.score_data = score_data
+        self.create_pptx = create_pptx
+
+def team_tools(workspace=None, kernel=None, request=""):
+    """TeamTools, bound to a run workspace and/or a persistent PythonKernel when given."""
+    if workspace is None and kernel is None:
+        return TeamTools
+    return WorkspaceTools(workspace or Workspace(os.getcwd()), kernel, request)
 
 # ==============================================================================
 # 2. AGENT INITIALIZATION
 # ==============================================================================
 
-def init_llms(api_key):
-    gemini_pro = LLM(
-        model="gemini/gemini-2.5-flash",
-        verbose=True,
-        temperature=0.7,
-        api_key=api_key
-    )
-    gemini_flash = LLM(
-        model="gemini/gemini-2.5-flash",
-        verbose=True,
-        temperature=0.5,
-        api_key=api_key
-    )
+# LLM_BACKEND=stub swaps Gemini for a deterministic local script (offline runs and benchmarks)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini").lower()
+
+def init_llms(api_key, stream=False):
+    """
+    Returns (gemini_pro, gemini_flash): the LLMs of the agents doing technical work and of the
+    clerical ones. Unless LLM_ROUTING=static, both route every call between the fast and the
+    strong model tier (see llm_router.py) and differ only in temperature; static keeps both on
+    the fast model, as before routing existed. stream=True makes
+    the clients publish their output as it is generated (see streaming.py).
+    """
+    cache = None
+    if LLM_BACKEND == "stub":
+        from stub_llm import ScriptedLLM
+
+        def client(model, temperature):
+            return ScriptedLLM(model=f"stub/{model.split('/')[-1]}", temperature=temperature, stream=stream)
+    else:
+        cache = cache_from_env()
+        if cache is not None and cache.replay_only:
+            # Replay never reaches the provider, but the client still insists on a key
+            api_key = api_key or "replay-only"
+
+        def client(model, temperature):
+            # Clients come from a process-wide pool, so every crew reuses the same HTTP connections
+            return get_llm(model=model, verbose=True, temperature=temperature, api_key=api_key, stream=stream)
+
+    # Every crew's calls share one process-wide quota; the cache sits in front so hits don't spend it
+    pro_fast, pro_strong = (schedule(client(model, 0.7)) for model in (LLM_FAST_MODEL, LLM_STRONG_MODEL))
+    flash_fast, flash_strong = (schedule(client(model, 0.5)) for model in (LLM_FAST_MODEL, LLM_STRONG_MODEL))
+    # Static keeps the pre-routing mapping: every agent on the fast model, at its own temperature
+    gemini_pro = route(pro_fast, pro_strong) or pro_fast
+    gemini_flash = route(flash_fast, flash_strong) or flash_fast
+
+    if cache is not None:
+        gemini_pro = CachedLLM(gemini_pro, cache)
+        gemini_flash = CachedLLM(gemini_flash, cache)
     return gemini_pro, gemini_flash
 
-def get_intake_crew(api_key, request):
-    gemini_pro, gemini_flash = init_llms(api_key)
+def _dependencies(task, tasks):
+    # Explicit context lists the inputs; otherwise Process.sequential feeds a task every earlier output
+    if isinstance(task.context, list):
+        return {id(t) for t in task.context}
+    return {id(t) for t in tasks[:tasks.index(task)]}
+
+def schedule_by_context(tasks):
+    """
+    Marks tasks for async execution based on the dependency graph given by Task.context.
+    Consecutive tasks that don't depend on each other form a wave and run concurrently.
+    crewai joins async tasks at the next synchronous task, so a wave is only parallelized
+    when a later task follows it (join_task() adds one that makes no LLM call).
+    """
+    start = 0
+    while start < len(tasks):
+        end = start + 1
+        while end < len(tasks):
+            wave_ids = {id(t) for t in tasks[start:end]}
+            if _dependencies(tasks[end], tasks) & wave_ids:
+                break
+            end += 1
+        if end - start > 1 and end < len(tasks):
+            for task in tasks[start:end]:
+                task.async_execution = True
+        start = end
+    return tasks
+
+def join_task(agent, tasks):
+    """
+    A task that only waits for `tasks`. crewai starts a synchronous task only after every
+    pending async one, so it is the join point; a ConditionalTask whose condition is false
+    is then skipped without calling its agent. The skipped output is empty, so the crew's
+    final output stays that of the last task before the wave.
+    """
+    return ConditionalTask(
+        description="Wait for the previous tasks to finish.",
+        expected_output="Nothing; this task is skipped.",
+        agent=agent,
+        context=tasks,
+        condition=lambda output: False
+    )
+
+def get_intake_crew(api_key, request, workspace=None, stream=False):
+    gemini_pro, gemini_flash = init_llms(api_key, stream)
+    tools = team_tools(workspace)
 
     intake = Agent(
         role='Project Intake Manager',
@@ -120,7 +409,7 @@ def get_intake_crew(api_key, request):
         role='Scrum Master',
         goal='Manage project flow and Jira tickets.',
         backstory="You keep the team organized. You create ticket files for tracking.",
-        tools=[TeamTools.save_file],
+        tools=[tools.save_file],
         verbose=True,
         llm=gemini_flash
     )
@@ -129,44 +418,54 @@ def get_intake_crew(api_key, request):
         role='Senior Project Manager',
         goal='Create a comprehensive project plan.',
         backstory="You are an experienced PM who translates business needs into technical tasks. You ensure the Data Engineer and Data Scientist have clear instructions.",
-        tools=[TeamTools.save_file],
+        tools=[tools.save_file],
         verbose=True,
         llm=gemini_pro
     )
 
     task_intake = Task(
         description=f"Review request: '{request}'. Approve if valid.",
-        expected_output="Approval decision.",
+        expected_output="Approval decision: 'Approved' or 'Rejected' as the first word, then the reasons.",
         agent=intake
     )
 
+    # The ticket and the plan only need the approval, so they run side by side
     task_scrum = Task(
-        description="Create a 'jira_ticket.txt' with project scope and timeline.",
+        description=f"Create a '{JIRA_TICKET}' with project scope and timeline.",
         expected_output="Confirmation of file creation.",
-        agent=scrum
+        agent=scrum,
+        context=[task_intake]
     )
 
     task_pm = Task(
-        description=f"Create a detailed 'project_plan.md' based on the request: '{request}'. Outline specific technical steps for data cleaning and analysis.",
+        description=f"Create a detailed '{PROJECT_PLAN}' based on the request: '{request}'. Outline specific technical steps for data cleaning and analysis.",
         expected_output="Confirmation of file creation.",
-        agent=pm
+        agent=pm,
+        context=[task_intake]
     )
 
+    # Joins the two without another agent call, and leaves the approval as the crew's output
+    task_join = join_task(intake, [task_scrum, task_pm])
+
     return Crew(
         agents=[intake, scrum, pm],
-        tasks=[task_intake, task_scrum, task_pm],
+        tasks=schedule_by_context([task_intake, task_scrum, task_pm, task_join]),
         process=Process.sequential,
         verbose=True
     )
 
-def get_data_crew(api_key, csv_path, request):
-    gemini_pro, _ = init_llms(api_key)
+def get_data_crew(api_key, csv_path, request, kernel=None, workspace=None, sample_rows=None, stream=False):
+    gemini_pro, _ = init_llms(api_key, stream)
+    tools = team_tools(workspace, kernel, request)
+
+    if sample_rows:
+        return _sample_data_crew(gemini_pro, tools, csv_path, request, sample_rows, workspace)
 
     engineer = Agent(
         role='Data Engineer',
         goal='Prepare clean datasets based on requirements.',
-        backstory="You are an expert Python programmer. You inspect data and write custom code to clean it.",
-        tools=[TeamTools.inspect_csv, TeamTools.execute_python_code],
+        backstory="You are an expert Python programmer. You inspect data, clean it with a declarative cleaning plan and write custom code only for what the plan cannot express.",
+        tools=[tools.inspect_csv, tools.clean_data, tools.execute_python_code, tools.read_file_page],
         verbose=True,
         llm=gemini_pro
     )
@@ -174,11 +473,54 @@ def get_data_crew(api_key, csv_path, request):
     task_eng = Task(
         description=f"""
         1. Inspect the dataset at '{csv_path}'.
-        2. Write and execute Python code to clean the data based on this request: '{request}'.
-        3. Ensure the cleaned data is saved to 'cleaned_data.csv'.
+        2. Clean the data based on this request: '{request}'. Prefer one Clean Data call with a plan covering
+           duplicates, types, missing values, outliers and category labels, writing to '{CLEANED_DATA_PATH}'.
+        3. Only for cleaning the plan cannot express, write and execute Python code: load the data with
+           read_frame('{csv_path}') and save it with df.to_parquet('{CLEANED_DATA_PATH}', index=False), so column types are preserved.
         4. Verify the file exists.
         """,
-        expected_output="Confirmation that 'cleaned_data.csv' has been created and cleaned.",
+        expected_output=f"Confirmation that '{CLEANED_DATA_PATH}' has been created and cleaned.",
+        agent=engineer
+    )
+
+    return Crew(
+        agents=[engineer],
+        tasks=[task_eng],
+        process=Process.sequential,
+        verbose=True
+    )
+
+def _sample_data_crew(llm, tools, csv_path, request, sample_rows, workspace=None):
+    """
+    Plan-on-sample variant of the data crew: the agent only ever loads a stratified sample,
+    and its final clean(df) is applied to the full file in parallel chunks by the tool.
+    """
+    from sample_mode import DATA_SAMPLE, write_sample
+
+    resolve = workspace.path if workspace is not None else (lambda name: name)
+    write_sample(resolve(csv_path), resolve(DATA_SAMPLE), rows=sample_rows)
+
+    engineer = Agent(
+        role='Data Engineer',
+        goal='Prepare clean datasets based on requirements.',
+        backstory="You are an expert Python programmer. You work out the cleaning on a small sample, then run it once at full scale.",
+        tools=[tools.inspect_csv, tools.execute_python_code, tools.apply_cleaning_code, tools.clean_data, tools.read_file_page],
+        verbose=True,
+        llm=llm
+    )
+
+    task_eng = Task(
+        description=f"""
+        1. Inspect the stratified sample at '{DATA_SAMPLE}' (a sample of the full dataset '{csv_path}').
+        2. Work out how to clean the data based on this request: '{request}'. Experiment with Python code on the
+           sample only, loading it with read_frame('{DATA_SAMPLE}'); never load '{csv_path}' yourself.
+        3. When done, write the cleaning as a function `def clean(df):` that returns the cleaned DataFrame and pass it to
+           Apply Cleaning Code with sample_path '{DATA_SAMPLE}', file_path '{csv_path}' and output_path '{CLEANED_DATA_PATH}'.
+           Steps that need statistics over the whole file (dedupe, median imputation, outlier fences) cannot go in
+           clean(df); if the request needs them, clean '{csv_path}' with one Clean Data plan instead.
+        4. Verify '{CLEANED_DATA_PATH}' exists.
+        """,
+        expected_output=f"Confirmation that '{CLEANED_DATA_PATH}' has been created and cleaned.",
         agent=engineer
     )
 
@@ -189,14 +531,15 @@ def get_data_crew(api_key, csv_path, request):
         verbose=True
     )
 
-def get_analysis_crew(api_key, csv_path, request):
-    gemini_pro, _ = init_llms(api_key)
+def get_analysis_crew(api_key, csv_path, request, kernel=None, workspace=None, stream=False):
+    gemini_pro, _ = init_llms(api_key, stream)
+    tools = team_tools(workspace, kernel, request)
 
     scientist = Agent(
         role='Senior Data Scientist',
         goal='Analyze data, perform statistical analyses and build predictive models if needed.',
-        backstory="You are an expert Data Scientist. You write custom Python code (sklearn, pandas) to solve problems.",
-        tools=[TeamTools.inspect_csv, TeamTools.execute_python_code],
+        backstory="You are an expert Data Scientist. You train predictive models with the Train Model tool and write custom Python code (sklearn, pandas) for any other analysis.",
+        tools=[tools.inspect_csv, tools.train_model, tools.score_data, tools.execute_python_code, tools.read_file_page],
         verbose=True,
         llm=gemini_pro
     )
@@ -204,8 +547,9 @@ def get_analysis_crew(api_key, csv_path, request):
     task_sci = Task(
         description=f"""
         1. Inspect the cleaned dataset at '{csv_path}'.
-        2. Based on the request '{request}', write and execute Python code to perform the analysis or train a model.
-        3. If training a model, report accuracy/metrics.
+        2. Based on the request '{request}', train a predictive model with the Train Model tool on '{csv_path}', and write and
+           execute Python code for any other analysis. Load the data with read_frame('{csv_path}').
+        3. If training a model, report accuracy/metrics, the most important features and the model id.
         4. If performing analysis, report key insights.
         """,
         expected_output="A summary of the analysis results, model performance, or key insights.",
@@ -219,20 +563,38 @@ def get_analysis_crew(api_key, csv_path, request):
         verbose=True
     )
 
-def get_reporting_crew(api_key, analysis_result):
-    _, gemini_flash = init_llms(api_key)
+ANALYSIS_RESULT = "analysis_result.md"
+
+def budget_handoff(text, workspace=None, name=ANALYSIS_RESULT):
+    """
+    Caps a previous stage's output before it is inlined into a task description. The full
+    text is saved as `name` in the workspace so the next agent can page through it.
+    """
+    if workspace is None:
+        return fit(text, HANDOFF_TOKEN_BUDGET)
+    with open(workspace.path(name), "w") as f:
+        f.write(text)
+    fitted = fit(text, HANDOFF_TOKEN_BUDGET)
+    if fitted != text:
+        fitted += f"\n(The full text is in '{name}'; read it with Read File Page if you need more detail.)"
+    return fitted
+
+def get_reporting_crew(api_key, analysis_result, workspace=None, stream=False):
+    _, gemini_flash = init_llms(api_key, stream)
+    tools = team_tools(workspace)
+    summary = budget_handoff(analysis_result, workspace)
 
     slide_maker = Agent(
         role='Presentation Designer',
         goal='Create visual slide decks.',
         backstory="You take technical results and turn them into PowerPoint files.",
-        tools=[TeamTools.create_pptx],
+        tools=[tools.create_pptx, tools.read_file_page],
         verbose=True,
         llm=gemini_flash
     )
 
     task_ppt = Task(
-        description=f"Create a PowerPoint. Title: 'Project Analysis Results'. Use this summary: {analysis_result}",
+        description=f"Create a PowerPoint. Title: 'Project Analysis Results'. Use this summary: {summary}",
         expected_output="Confirmation that .pptx is saved.",
         agent=slide_maker
     )
@@ -0,0 +1,309 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from tracing import annotate
+
+# ==============================================================================
+# 1. FORMATS
+# ==============================================================================
+
+# Stages hand data to each other as Parquet: typed, columnar and memory-mappable.
+# CSV is only written on request as a final export.
+CLEANED_DATA_PATH = "cleaned_data.parquet"
+CLEANED_CSV_PATH = "cleaned_data.csv"
+
+# read_frame dtypes: "compact" downcasts numbers and loads repeated text as categories,
+# "arrow" uses Arrow-backed dtypes and "default" keeps pandas' int64/float64/object.
+DATA_DTYPES = os.getenv("DATA_DTYPES", "compact").lower()
+# Text columns become categories with at most this many distinct values, and at most this share of rows
+CATEGORY_MAX_VALUES = 10_000
+CATEGORY_MAX_RATIO = 0.5
+READ_CHUNKSIZE = 500_000
+
+PARQUET_EXTENSIONS = (".parquet", ".pq")
+ARROW_EXTENSIONS = (".arrow", ".feather", ".ipc")
+
+
+def _format(path):
+    ext = os.path.splitext(str(path))[1].lower()
+    if ext in PARQUET_EXTENSIONS:
+        return "parquet"
+    if ext in ARROW_EXTENSIONS:
+        return "arrow"
+    return "csv"
+
+
+# ==============================================================================
+# 2. READERS / WRITERS
+# ==============================================================================
+
+# pandas and pyarrow are imported inside each function: this module is imported
+# for its constants by code paths that never touch data.
+
+def read_frame(path, columns=None, dtypes=None):
+    """
+    Loads a CSV, Parquet or Arrow IPC file into a DataFrame. Columnar files are memory-mapped.
+    With compact dtypes (the default, see DATA_DTYPES) CSVs are parsed in chunks that are
+    compacted as they arrive, so the default-dtype frame never exists in full;
+    df.attrs["memory"] records the size before and after.
+    """
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    dtypes = dtypes or DATA_DTYPES
+    fmt = _format(path)
+    if fmt == "csv":
+        if dtypes == "arrow":
+            return pd.read_csv(path, usecols=columns, engine="pyarrow", dtype_backend="pyarrow")
+        if dtypes != "compact":
+            return pd.read_csv(path, usecols=columns)
+        return _read_csv_compact(path, columns)
+
+    if fmt == "parquet":
+        table = pq.read_table(path, columns=columns, memory_map=True)
+    else:
+        with pa.memory_map(str(path)) as source:
+            table = pa.ipc.open_file(source).read_all()
+        if columns is not None:
+            table = table.select(columns)
+    if dtypes == "arrow":
+        return table.to_pandas(types_mapper=pd.ArrowDtype)
+    df = table.to_pandas()
+    if dtypes != "compact":
+        return df
+    before = df.memory_usage(deep=True).sum()
+    return _with_memory(compact_frame(df), before)
+
+
+def compact_frame(df, categories=None):
+    """
+    Returns df with integers downcast to the smallest type that holds them, floats as
+    float32 where that loses nothing, and text columns as categories: those named in
+    `categories`, or by default any with few distinct values.
+    """
+    import numpy as np
+    import pandas as pd
+
+    if df.columns.has_duplicates:
+        return df
+    out = {}
+    for name in df.columns:
+        col = df[name]
+        if isinstance(col.dtype, np.dtype) and col.dtype.kind in "iu":
+            col = pd.to_numeric(col, downcast="integer" if col.dtype.kind == "i" else "unsigned")
+        elif isinstance(col.dtype, np.dtype) and col.dtype.kind == "f" and col.dtype.itemsize > 4:
+            narrow = col.astype(np.float32)
+            if np.array_equal(narrow.to_numpy(dtype=np.float64), col.to_numpy(), equal_nan=True):
+                col = narrow
+        elif pd.api.types.is_object_dtype(col):
+            if categories is not None:
+                if name in categories:
+                    col = col.astype("category")
+            elif _few_values(col):
+                col = col.astype("category")
+        out[name] = col
+    return pd.DataFrame(out, index=df.index)
+
+
+def _few_values(col):
+    distinct = col.nunique(dropna=True)
+    return distinct <= CATEGORY_MAX_VALUES and distinct <= CATEGORY_MAX_RATIO * max(len(col), 1)
+
+
+def _read_csv_compact(path, columns=None):
+    import pandas as pd
+    from pandas.api.types import union_categoricals
+
+    chunks, before, categories = [], 0, None
+    for chunk in pd.read_csv(path, usecols=columns, chunksize=READ_CHUNKSIZE):
+        before += chunk.memory_usage(deep=True).sum()
+        if categories is None:
+            # The first chunk decides which columns are categorical, so every chunk agrees
+            categories = {name for name in chunk.columns if pd.api.types.is_object_dtype(chunk[name])
+                          and _few_values(chunk[name])}
+        chunks.append(compact_frame(chunk, categories))
+    if not chunks:
+        return pd.read_csv(path, usecols=columns)
+    if len(chunks) > 1:
+        for name in categories:
+            # Chunks see different labels; give them all the union so concat keeps the category dtype
+            try:
+                dtype = pd.CategoricalDtype(union_categoricals([c[name] for c in chunks], ignore_order=True).categories)
+            except TypeError:
+                continue
+            for chunk in chunks:
+                chunk[name] = chunk[name].astype(dtype)
+    df = pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0]
+    return _with_memory(df, before)
+
+
+def _with_memory(df, before):
+    after = df.memory_usage(deep=True).sum()
+    df.attrs["memory"] = {"default_mb": round(before / 1024 ** 2, 2), "mb": round(after / 1024 ** 2, 2)}
+    annotate(frame_mb=df.attrs["memory"]["mb"], frame_default_mb=df.attrs["memory"]["default_mb"])
+    return df
+
+
+def memory_note(df):
+    """One line on the frame's size, and the default-dtype size when read_frame compacted it."""
+    memory = df.attrs.get("memory")
+    size = memory["mb"] if memory else round(df.memory_usage(deep=True).sum() / 1024 ** 2, 2)
+    note = f"{len(df)} rows x {df.shape[1]} columns in {size} MB"
+    if memory and memory["default_mb"] > memory["mb"]:
+        note += f" ({memory['default_mb']} MB with default dtypes)"
+    return note
+
+
+def read_head(path, n=5):
+    """First n rows without reading the rest of the file."""
+    import pandas as pd
+
+    fmt = _format(path)
+    if fmt == "csv":
+        return pd.read_csv(path, nrows=n)
+    for chunk in iter_chunks(path, chunksize=n):
+        return chunk
+    return read_frame(path, dtypes="default").head(n)
+
+
+def iter_chunks(path, chunksize):
+    """Yields DataFrames of at most chunksize rows, in file order."""
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    fmt = _format(path)
+    if fmt == "parquet":
+        for batch in pq.ParquetFile(path, memory_map=True).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    elif fmt == "arrow":
+        with pa.memory_map(str(path)) as source:
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                batch = reader.get_batch(i)
+                for offset in range(0, batch.num_rows, chunksize):
+                    yield batch.slice(offset, chunksize).to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunksize)
+
+
+def write_frame(df, path):
+    fmt = _format(path)
+    if fmt == "parquet":
+        df.to_parquet(path, index=False)
+    elif fmt == "arrow":
+        df.reset_index(drop=True).to_feather(path)
+    else:
+        df.to_csv(path, index=False)
+    return path
+
+
+def export_csv(src_path, dest_path=CLEANED_CSV_PATH, chunksize=100_000):
+    """Streams a Parquet/Arrow hand-off file out as CSV, one chunk at a time."""
+    header = True
+    with open(dest_path, "w", newline="") as f:
+        for chunk in iter_chunks(src_path, chunksize):
+            chunk.to_csv(f, index=False, header=header)
+            header = False
+    return dest_path
+
+
+class FrameWriter:
+    """
+    Appends DataFrames to one CSV, Parquet or Arrow IPC file, so a large result can be
+    written chunk by chunk. The first frame fixes the columns and their types.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.format = _format(path)
+        self.rows = 0
+        self._writer = None
+        self._schema = None
+        self._file = None
+
+    def write(self, df):
+        if self.format == "csv":
+            if self._file is None:
+                self._file = open(self.path, "w", newline="")
+                df.to_csv(self._file, index=False)
+            else:
+                df.to_csv(self._file, index=False, header=False)
+        else:
+            self._write_arrow(df)
+        self.rows += len(df)
+
+    def _write_arrow(self, df):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if self._schema is None:
+            schema = pa.Table.from_pandas(df, preserve_index=False).schema
+            # All-null columns in the first chunk would pin the type to null; assume text
+            for i, field in enumerate(schema):
+                if pa.types.is_null(field.type):
+                    schema = schema.set(i, field.with_type(pa.string()))
+            self._schema = schema
+            if self.format == "parquet":
+                self._writer = pq.ParquetWriter(self.path, schema)
+            else:
+                self._writer = pa.ipc.new_file(self.path, schema)
+        try:
+            table = pa.Table.from_pandas(df, schema=self._schema, preserve_index=False)
+        except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+            raise ValueError(f"A chunk does not match the types of the first chunk ({e}). "
+                             "Coerce the column to one type before writing.") from e
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ==============================================================================
+# 3. PARALLEL CHUNK PROCESSING
+# ==============================================================================
+
+def map_chunks(func, chunks, workers, *args, initializer=None):
+    """
+    Yields func(*args, chunk) for every chunk, in input order. With more than one worker
+    the calls run in a process pool, with at most 2 * workers chunks running or finished
+    but not yet yielded, so neither a fast reader nor one slow chunk lets memory grow;
+    func must be a picklable module-level function.
+    With an initializer (run once in each worker) the calls never run in this process.
+    """
+    if initializer is None and (not workers or workers <= 1):
+        for chunk in chunks:
+            yield func(*args, chunk)
+        return
+    workers = max(workers or 1, 1)
+    # spawn rather than fork: the parent runs crewai/streamlit threads
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=initializer) as pool:
+        pending, done, next_index = {}, {}, 0
+        for i, chunk in enumerate(chunks):
+            # Results held back behind a slow earlier chunk count against the limit too
+            while len(pending) + len(done) >= workers * 2:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    done[pending.pop(future)] = future.result()
+                while next_index in done:
+                    yield done.pop(next_index)
+                    next_index += 1
+            pending[pool.submit(func, *args, chunk)] = i
+        for future in list(pending):
+            done[pending.pop(future)] = future.result()
+            while next_index in done:
+                yield done.pop(next_index)
+                next_index += 1
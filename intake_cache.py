@@ -0,0 +1,265 @@
+import hashlib
+import json
+import math
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import Counter
+from code_cache import normalize_request
+from stage_cache import StageResult, kickoff_stage
+from tracing import TRACE_FILE, annotate, instrument
+from workspace import JIRA_TICKET, PROJECT_PLAN
+
+# ==============================================================================
+# 1. CONFIGURATION
+# ==============================================================================
+
+# Many intake requests restate an earlier one ("predict churn", "build a churn model to see
+# why users leave"). INTAKE_CACHE=on keeps every approved intake (its summary, ticket and
+# plan) in a local similarity index and lets the app offer the closest match; "auto" also
+# reuses it without asking (batch and CLI runs); "off" does neither.
+INTAKE_CACHE_MODE = os.getenv("INTAKE_CACHE", "on").lower()
+INTAKE_CACHE_DIR = os.getenv("INTAKE_CACHE_DIR", ".intake_cache")
+# Cosine similarity (0-1) of the requests' TF-IDF vectors needed to reuse an intake
+INTAKE_MATCH_THRESHOLD = float(os.getenv("INTAKE_MATCH_THRESHOLD", 0.7))
+INTAKE_CACHE_MAX_ENTRIES = int(os.getenv("INTAKE_CACHE_MAX_ENTRIES", 1000))
+INTAKE_ARTIFACTS = (JIRA_TICKET, PROJECT_PLAN)
+# The Intake Manager's decision, as the first of these words in its task output
+DECISION_PATTERN = re.compile(r"\b(not approved|approved|rejected|denied|declined)\b", re.I)
+
+# Words that say nothing about what a request is for
+STOP_WORDS = frozenset("""
+a an and are as at be by can could do for from how i in into is it its me my of on or our
+please so that the their them this to us using want we what which who why will with would
+you your need needs like some any all help make build create develop see find know figure out
+understand get
+""".split())
+_SUFFIXES = ("ations", "ation", "ions", "ion", "ing", "ers", "er", "ed", "es", "s")
+
+# Words that ask for the same thing, so "predict churn" meets "a churn model to see why
+# users leave". Each word is counted as its group's name.
+SYNONYMS = {
+    "churn": "churn attrition leave leaving cancel cancellation quit retention retain unsubscribe lapse defect",
+    "predict": "predict prediction predictive forecast model classifier classify classification estimate projection",
+    "customer": "customer user client subscriber member account",
+    "revenue": "revenue sales income turnover",
+    "segment": "segment segmentation cluster clustering cohort",
+    "report": "report dashboard presentation deck summary summarize",
+    "analyze": "analyze analyse analysis explore exploration investigate insight insights",
+}
+# A clause is cut off from its first negation on: "do not predict churn, forecast revenue"
+NEGATIONS = frozenset("not no without never don dont nor except instead".split())
+
+
+def _stem(word):
+    # Just enough stemming that "predict"/"prediction" and "leave"/"leaving" meet
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+            word = word[:-len(suffix)]
+            break
+    return word[:-1] if len(word) > 4 and word.endswith("e") else word
+
+
+_CONCEPTS = {_stem(word): concept for concept, words in SYNONYMS.items() for word in words.split()}
+
+
+def terms(request):
+    found = []
+    for clause in re.split(r"[.,;:!?]|\bbut\b|\brather than\b", request or ""):
+        for word in normalize_request(clause).split():
+            if word in NEGATIONS:
+                break
+            if word not in STOP_WORDS:
+                stem = _stem(word)
+                found.append(_CONCEPTS.get(stem, stem))
+    return found
+
+
+# ==============================================================================
+# 2. SIMILARITY INDEX
+# ==============================================================================
+
+class IntakeCache:
+    """
+    Approved intakes as JSON files under `path`, one per distinct request. Lookups rank
+    them by TF-IDF cosine similarity to the new request, with idf taken over the stored
+    requests, so words every request shares ("data", "analyze") count for little.
+    """
+
+    def __init__(self, path=INTAKE_CACHE_DIR, max_entries=INTAKE_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        # file name -> (mtime, entry); files are re-read only when they change
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _entry_path(self, request):
+        key = hashlib.sha256(normalize_request(request).encode("utf-8")).hexdigest()[:24]
+        return os.path.join(self.path, f"{key}.json")
+
+    def entries(self):
+        try:
+            names = [name for name in os.listdir(self.path) if name.endswith(".json")]
+        except OSError:
+            names = []
+        with self._lock:
+            loaded = {}
+            for name in names:
+                try:
+                    mtime = os.path.getmtime(os.path.join(self.path, name))
+                    if name in self._entries and self._entries[name][0] == mtime:
+                        loaded[name] = self._entries[name]
+                        continue
+                    with open(os.path.join(self.path, name), "r") as f:
+                        entry = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                entry["terms"] = Counter(terms(entry["request"]))
+                loaded[name] = (mtime, entry)
+            self._entries = loaded
+            return [entry for _, entry in loaded.values()]
+
+    def match(self, request):
+        """(similarity, entry) of the most similar stored request, or (0.0, None)."""
+        entries = self.entries()
+        query = Counter(terms(request))
+        if not entries or not query:
+            return 0.0, None
+        # Document frequencies count the query too, so none of its words is unknown
+        documents = Counter(term for entry in entries for term in entry["terms"])
+        documents.update(query.keys())
+        n = len(entries) + 1
+
+        def vector(counts):
+            weights = {term: (1 + math.log(count)) * (math.log((1 + n) / (1 + documents[term])) + 1)
+                       for term, count in counts.items()}
+            norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+            return {term: w / norm for term, w in weights.items()}
+
+        query_vector = vector(query)
+        best, best_entry = 0.0, None
+        for entry in entries:
+            # Entries saved before decisions were recorded may be rejected intakes
+            if entry.get("decision") != "approved":
+                continue
+            entry_vector = vector(entry["terms"])
+            similarity = sum(w * entry_vector.get(term, 0.0) for term, w in query_vector.items())
+            if similarity > best:
+                best, best_entry = similarity, entry
+        return min(best, 1.0), best_entry
+
+    def put(self, request, result, workspace, artifacts=INTAKE_ARTIFACTS, decision="approved"):
+        os.makedirs(self.path, exist_ok=True)
+        entry = {"request": request, "result": str(result), "decision": decision, "created": time.time(),
+                 "artifacts": {name: workspace.read_text(name) for name in artifacts}}
+        # Write to a temp file and rename, so readers never see half an entry
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(entry, f, indent=2)
+        os.replace(tmp, self._entry_path(request))
+        self.evict()
+
+    def evict(self):
+        files = []
+        for name in os.listdir(self.path):
+            try:
+                files.append((os.path.getmtime(os.path.join(self.path, name)), name))
+            except OSError:
+                continue
+        for _, name in sorted(files)[:max(0, len(files) - self.max_entries)]:
+            try:
+                os.remove(os.path.join(self.path, name))
+            except OSError:
+                pass
+
+
+_cache = None
+
+
+def intake_cache_from_env():
+    global _cache
+    if INTAKE_CACHE_MODE == "off":
+        return None
+    # One instance per process, so its parsed entries are shared between lookups
+    if _cache is None:
+        _cache = IntakeCache()
+    return _cache
+
+
+def find_intake(request, threshold=INTAKE_MATCH_THRESHOLD, cache=None):
+    """(similarity, entry) of a stored intake similar enough to reuse for this request, or None."""
+    cache = cache or intake_cache_from_env()
+    if cache is None:
+        return None
+    similarity, entry = cache.match(request)
+    return (similarity, entry) if entry is not None and similarity >= threshold else None
+
+
+def intake_decision(crew):
+    """"approved" or "rejected" from the intake crew's first (review) task, or None if it has no decision."""
+    output = getattr(crew.tasks[0], "output", None) if crew.tasks else None
+    found = DECISION_PATTERN.search(str(getattr(output, "raw", "") or ""))
+    if found is None:
+        return None
+    return "approved" if found.group(1).lower() == "approved" else "rejected"
+
+
+# ==============================================================================
+# 3. REUSE
+# ==============================================================================
+
+def adapt(text, old_request, request, note=None):
+    """Stored intake text for the new request: the old request's wording swapped out, and a note on top."""
+    if old_request.strip():
+        text = text.replace(old_request.strip(), request.strip())
+    return f"{note}\n\n{text}" if note else text
+
+
+def reuse(match, crew, workspace, request):
+    """Writes a stored intake's ticket and plan into the workspace, adapted to this request."""
+    similarity, entry = match
+    old = entry["request"]
+    start = time.perf_counter()
+    with instrument(crew, workspace.path(TRACE_FILE), "intake (similar request)"):
+        annotate(intake_match=old, intake_similarity=round(similarity, 3))
+        for name, text in entry["artifacts"].items():
+            comment = "> " if name.endswith(".md") else ""
+            note = (f"{comment}Reused from the intake of an earlier request ({similarity:.0%} similar): \"{old}\". "
+                    f"This request: \"{request}\".")
+            with open(workspace.path(name), "w") as f:
+                f.write(adapt(text, old, request, note))
+    header = (f"Reused the approved intake of a similar earlier request ({similarity:.0%} similar: \"{old}\") "
+              f"in {time.perf_counter() - start:.1f}s, without LLM calls.")
+    return f"{header}\n\n{adapt(entry['result'], old, request)}"
+
+
+# ==============================================================================
+# 4. PUBLIC API
+# ==============================================================================
+
+def kickoff_intake(crew, workspace, request, outputs=INTAKE_ARTIFACTS, reuse_similar=None, cache=None):
+    """
+    kickoff_stage() for the intake crew that also indexes the intake by its request, if it was approved.
+    With reuse_similar (default: INTAKE_CACHE=auto) the ticket and plan of a stored request at
+    least INTAKE_MATCH_THRESHOLD similar are reused instead of running the three agents.
+    """
+    cache = cache if cache is not None else intake_cache_from_env()
+    if cache is None:
+        return kickoff_stage(crew, "intake", workspace, outputs=outputs)
+
+    if reuse_similar is None:
+        reuse_similar = INTAKE_CACHE_MODE == "auto"
+    match = find_intake(request, cache=cache) if reuse_similar else None
+    if match is not None:
+        result = StageResult(reuse(match, crew, workspace, request))
+        result.reused = match[0]
+        return result
+
+    result = kickoff_stage(crew, "intake", workspace, outputs=outputs)
+    # Only intakes the Intake Manager approved are offered again; a stage-cache hit has no
+    # task outputs to tell, but its request was indexed when it first ran
+    if intake_decision(crew) == "approved" and all(workspace.exists(name) for name in outputs):
+        cache.put(request, result, workspace, outputs, decision="approved")
+    return result
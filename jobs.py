@@ -0,0 +1,156 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from streaming import streaming
+
+# ==============================================================================
+# 1. CONFIGURATION
+# ==============================================================================
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 4))
+# Finished jobs are dropped from memory after this many seconds
+JOB_RETENTION = float(os.getenv("JOB_RETENTION", 3600))
+EVENT_PREVIEW_CHARS = 500
+
+
+def _preview(text):
+    text = str(text).strip()
+    return text if len(text) <= EVENT_PREVIEW_CHARS else text[:EVENT_PREVIEW_CHARS] + "..."
+
+
+# ==============================================================================
+# 2. JOBS
+# ==============================================================================
+
+class Job:
+    """One crew kickoff running in the background, with a thread-safe event log."""
+
+    def __init__(self, label):
+        self.id = uuid.uuid4().hex
+        self.label = label
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._events = []
+        # Text each agent is generating right now, for crews built with stream=True
+        self._drafts = {}
+        self._lock = threading.Lock()
+
+    @property
+    def finished(self):
+        return self.status in ("succeeded", "failed")
+
+    @property
+    def elapsed(self):
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+    def add_event(self, kind, source, message):
+        with self._lock:
+            self._events.append({"time": time.time(), "kind": kind, "source": source, "message": message})
+
+    def events(self, since=0):
+        with self._lock:
+            return list(self._events[since:])
+
+    def on_chunk(self, role, chunk):
+        with self._lock:
+            self._drafts[role] = self._drafts.get(role, "") + chunk
+
+    def drafts(self):
+        with self._lock:
+            return dict(self._drafts)
+
+    # --- crewai callbacks -----------------------------------------------------
+
+    def step_callback(self, role):
+        def on_step(step):
+            # The finished step is in the event log now; the agent's next output starts a new draft
+            with self._lock:
+                self._drafts.pop(role, None)
+            tool = getattr(step, "tool", None)
+            if tool:
+                self.add_event("tool", role, f"{tool}: {_preview(getattr(step, 'tool_input', ''))}")
+                if getattr(step, "result", None):
+                    self.add_event("tool_result", role, _preview(step.result))
+            elif hasattr(step, "output"):
+                self.add_event("answer", role, _preview(step.output))
+            else:
+                self.add_event("step", role, _preview(getattr(step, "text", step)))
+        return on_step
+
+    def task_callback(self, output):
+        self.add_event("task", getattr(output, "agent", ""), f"Task finished: {_preview(getattr(output, 'raw', output))}")
+
+    def attach(self, crew):
+        """Routes a crew's agent steps and task completions into this job's event log."""
+        for agent in crew.agents:
+            agent.step_callback = self.step_callback(agent.role)
+        crew.task_callback = self.task_callback
+
+
+class JobRunner:
+    """Runs crew kickoffs on a thread pool so the Streamlit script thread never blocks."""
+
+    def __init__(self, max_workers=JOB_WORKERS):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="crew-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, label, build_crew, kickoff=None):
+        """
+        Queues build_crew() + kickoff and returns the Job immediately. `kickoff(crew)`
+        replaces crew.kickoff(), e.g. to trace the run or reuse a stored result.
+        """
+        job = Job(label)
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        job.add_event("status", "runner", "Queued")
+        self._pool.submit(self._run, job, build_crew, kickoff)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _prune(self):
+        cutoff = time.time() - JOB_RETENTION
+        for job_id, job in list(self._jobs.items()):
+            if job.finished and job.finished_at < cutoff:
+                del self._jobs[job_id]
+
+    def _run(self, job, build_crew, kickoff=None):
+        job.status = "running"
+        job.started_at = time.time()
+        job.add_event("status", "runner", "Started")
+        try:
+            crew = build_crew()
+            job.attach(crew)
+            with streaming(crew, job.on_chunk):
+                result = kickoff(crew) if kickoff else crew.kickoff()
+            if getattr(result, "cached", False):
+                job.add_event("status", "runner", "Inputs unchanged since an earlier run; reused its result")
+            elif getattr(result, "replayed", False):
+                job.add_event("status", "runner", "Replayed code saved from an earlier run on data with the same schema")
+            elif getattr(result, "reused", None):
+                job.add_event("status", "runner", f"Reused the intake of a similar earlier request ({result.reused:.0%} similar)")
+        except Exception as e:
+            job.finished_at = time.time()
+            job.error = str(e)
+            job.add_event("error", "runner", f"Failed after {job.elapsed:.1f}s: {e}")
+            job.status = "failed"
+            return
+        # Status flips last so pollers never see a finished job without its result
+        job.finished_at = time.time()
+        job.result = result
+        with job._lock:
+            job._drafts.clear()
+        job.add_event("status", "runner", f"Finished in {job.elapsed:.1f}s")
+        job.status = "succeeded"
@@ -0,0 +1,437 @@
+import atexit
+import io
+import multiprocessing
+import os
+import threading
+import time
+import traceback
+from contextlib import contextmanager, redirect_stdout, redirect_stderr
+from token_budget import TOOL_TOKEN_BUDGET, fit
+from tracing import annotate, peak_rss_mb
+
+# ==============================================================================
+# 1. CONFIGURATION
+# ==============================================================================
+
+# Limits for every call of agent code; 0 disables a limit. A call that runs past the
+# wall-clock timeout has its worker killed (persistent variables are lost with it).
+KERNEL_TIMEOUT = float(os.getenv("KERNEL_TIMEOUT", 600))
+KERNEL_MEMORY_MB = int(os.getenv("KERNEL_MEMORY_MB", 8192))
+KERNEL_CPU_SECONDS = int(os.getenv("KERNEL_CPU_SECONDS", 0))
+# Stateless workers shared by every run in the process; also the number of calls that run at once
+KERNEL_POOL_SIZE = int(os.getenv("KERNEL_POOL_SIZE", min(8, os.cpu_count() or 1)))
+
+
+class CpuLimitExceeded(BaseException):
+    """Raised inside agent code at the CPU limit; a BaseException so `except Exception` cannot swallow it."""
+
+
+# ==============================================================================
+# 2. WORKER PROCESS
+# ==============================================================================
+
+try:
+    import resource
+except ImportError:  # Windows: calls still get the wall-clock timeout
+    resource = None
+
+
+def _limit_memory(memory_mb):
+    if resource is None or not memory_mb:
+        return
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    limit = memory_mb * 1024 * 1024
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    # Allocations past the limit raise MemoryError in the agent code instead of swapping the host
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+
+def _on_cpu_limit(signum, frame):
+    raise CpuLimitExceeded("CPU time limit exceeded")
+
+
+def _limit_cpu(cpu_seconds):
+    """Sets the CPU limit to `cpu_seconds` more than this process has used so far, or lifts it."""
+    if resource is None:
+        return
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    if cpu_seconds:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        soft = int(usage.ru_utime + usage.ru_stime + cpu_seconds) + 1
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+    else:
+        soft = hard
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def limit_worker(memory_mb=KERNEL_MEMORY_MB, cpu_seconds=KERNEL_CPU_SECONDS):
+    """Applies the kernel's limits to this (worker) process; usable as a process-pool initializer."""
+    _limit_memory(memory_mb)
+    if cpu_seconds and resource is not None:
+        import signal
+        signal.signal(signal.SIGXCPU, _on_cpu_limit)
+
+
+def _on_timeout(signum, frame):
+    raise TimeoutError("Wall-clock time limit exceeded")
+
+
+@contextmanager
+def call_limits(timeout=KERNEL_TIMEOUT, cpu_seconds=KERNEL_CPU_SECONDS):
+    """
+    Bounds one call of agent code in a limit_worker() process that has no parent watching
+    it (e.g. a process-pool worker): wall-clock seconds via SIGALRM, and the CPU limit.
+    """
+    import signal
+
+    timed = bool(timeout) and hasattr(signal, "setitimer") and threading.current_thread() is threading.main_thread()
+    if timed:
+        previous = signal.signal(signal.SIGALRM, _on_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    if cpu_seconds:
+        _limit_cpu(cpu_seconds)
+    try:
+        yield
+    finally:
+        if cpu_seconds:
+            _limit_cpu(0)
+        if timed:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
+
+
+def _fresh_namespace():
+    # Same convenience imports the stateless Execute Python Code tool offers
+    import pandas as pd
+    import numpy as np
+    import sklearn
+    from data_io import compact_frame, memory_note, read_frame
+    return {"__name__": "__main__", "pd": pd, "np": np, "sklearn": sklearn, "read_frame": read_frame,
+            "compact_frame": compact_frame, "memory_note": memory_note}
+
+
+def _kernel_main(conn, cwd=None, memory_mb=0, cpu_seconds=0):
+    # Import first: the project modules are found relative to the parent's directory
+    namespace = _fresh_namespace()
+    if cwd:
+        os.chdir(cwd)
+    limit_worker(memory_mb, cpu_seconds)
+    while True:
+        try:
+            command, payload = conn.recv()
+        except EOFError:
+            break
+
+        if command == "exec":
+            stdout, stderr = io.StringIO(), io.StringIO()
+            error = None
+            start = time.perf_counter()
+            try:
+                if cpu_seconds:
+                    _limit_cpu(cpu_seconds)
+                with redirect_stdout(stdout), redirect_stderr(stderr):
+                    exec(payload, namespace)
+            except MemoryError:
+                error = f"Memory limit exceeded ({memory_mb} MB); process the data in chunks or load fewer columns"
+                stderr.write(traceback.format_exc())
+            except BaseException as e:
+                error = str(e) or type(e).__name__
+                stderr.write(traceback.format_exc())
+            finally:
+                if cpu_seconds:
+                    _limit_cpu(0)
+            conn.send({
+                "error": error,
+                "stdout": stdout.getvalue(),
+                "stderr": stderr.getvalue(),
+                "seconds": time.perf_counter() - start,
+                "peak_rss_mb": peak_rss_mb(),
+            })
+        elif command == "reset":
+            namespace = _fresh_namespace()
+            conn.send({"error": None})
+        elif command == "chdir":
+            os.chdir(payload)
+            conn.send({"error": None})
+        elif command == "shutdown":
+            conn.send({"error": None})
+            break
+
+
+# ==============================================================================
+# 3. KERNEL HANDLE
+# ==============================================================================
+
+class PythonKernel:
+    """
+    A long-lived worker process that keeps one Python namespace for a pipeline run,
+    so DataFrames and imports survive between Execute Python Code calls.
+    Call reset() to clear the namespace and shutdown() when the run is finished.
+    With persistent=False the namespace is cleared before every call (imports stay warm).
+    The worker runs with `cwd` as its working directory. Every call is bounded by a
+    wall-clock timeout, and the worker by memory and CPU limits (see KERNEL_* above).
+    """
+
+    def __init__(self, cwd=None, persistent=True, timeout=KERNEL_TIMEOUT,
+                 memory_mb=KERNEL_MEMORY_MB, cpu_seconds=KERNEL_CPU_SECONDS):
+        self.cwd = cwd
+        self.persistent = persistent
+        self.timeout = timeout
+        self.memory_mb = memory_mb
+        self.cpu_seconds = cpu_seconds
+        self._lock = threading.Lock()
+        self._process = None
+        self._conn = None
+        self._sessions = 0
+        self._worker_cwd = None
+
+    def _ensure_started(self):
+        if self._process is not None and self._process.is_alive():
+            return False
+        # spawn rather than fork: the parent runs crewai/streamlit threads
+        ctx = multiprocessing.get_context("spawn")
+        self._conn, child_conn = ctx.Pipe()
+        self._process = ctx.Process(target=_kernel_main, daemon=True,
+                                    args=(child_conn, self.cwd, self.memory_mb, self.cpu_seconds))
+        self._process.start()
+        child_conn.close()
+        self._sessions += 1
+        self._worker_cwd = self.cwd
+        return True
+
+    def _request(self, command, payload=None, timeout=None):
+        self._conn.send((command, payload))
+        if timeout and not self._conn.poll(timeout):
+            raise TimeoutError
+        return self._conn.recv()
+
+    def _kill(self):
+        self._process.kill()
+        self._process.join(timeout=5)
+        self._conn.close()
+        self._process = None
+        self._conn = None
+
+    def execute(self, code, cwd=None):
+        """Runs code in the worker; `cwd` overrides the working directory for this call."""
+        with self._lock:
+            restarted = self._ensure_started() and self._sessions > 1 and self.persistent
+            try:
+                if not self.persistent:
+                    self._request("reset")
+                cwd = cwd or self.cwd
+                if cwd and cwd != self._worker_cwd:
+                    self._request("chdir", cwd)
+                    self._worker_cwd = cwd
+                return self._request("exec", code, self.timeout), restarted
+            except TimeoutError:
+                self._kill()
+                lost = " The kernel was restarted and its variables were lost." if self.persistent else ""
+                return {"error": f"Timed out after {self.timeout:.0f}s.{lost}",
+                        "stdout": "", "stderr": "", "seconds": self.timeout}, False
+            except (EOFError, OSError):
+                # The worker died mid-call (e.g. os._exit or a segfault in a C extension); reap it
+                # and close the pipe, so crashed workers don't pile up as zombies and open fds
+                self._kill()
+                return {"error": "Python kernel process exited; its variables were lost.",
+                        "stdout": "", "stderr": "", "seconds": 0.0}, False
+
+    def run(self, code, cwd=None):
+        """Runs code in the kernel and formats the result for the agent."""
+        result, restarted = self.execute(code, cwd)
+        return _format_result(result, restarted, cwd or self.cwd)
+
+    def reset(self):
+        with self._lock:
+            if self._process is not None and self._process.is_alive():
+                self._request("reset")
+
+    def shutdown(self):
+        with self._lock:
+            if self._process is None:
+                return
+            if self._process.is_alive():
+                try:
+                    self._request("shutdown")
+                except (EOFError, OSError):
+                    pass
+                self._process.join(timeout=5)
+                if self._process.is_alive():
+                    self._process.kill()
+            self._conn.close()
+            self._process = None
+            self._conn = None
+
+    def tool(self):
+        """Builds an Execute Python Code tool bound to this kernel."""
+        return _build_tool(self.run, self.persistent)
+
+
+def _format_result(result, restarted, cwd):
+    annotate(kernel_seconds=round(result.get("seconds", 0.0), 4), kernel_peak_rss_mb=result.get("peak_rss_mb"))
+    note = "(Started a new kernel session; earlier variables are not available.)\n" if restarted else ""
+    output = result["stdout"]
+    if result["error"]:
+        detail = f"\nOutput before error:\n{output}" if output else ""
+        text = f"{note}Error executing code after {result['seconds']:.2f}s: {result['error']}{detail}"
+    else:
+        text = f"{note}Code executed successfully in {result['seconds']:.2f}s.\nOutput:\n{output}"
+    # A print(df) of a wide frame must not flood every later prompt of the agent
+    return fit(text, TOOL_TOKEN_BUDGET, "python", cwd)
+
+
+def _build_tool(run, persistent):
+    """An Execute Python Code tool that calls `run(code)`."""
+    from crewai.tools import tool
+
+    if not persistent:
+        @tool("Execute Python Code")
+        def execute_python_code(code: str):
+            """
+            Executes the given Python code.
+            The code must be valid Python.
+            Standard output (print statements) is captured and returned.
+            Variables created in the code are NOT persisted between calls unless saved to files.
+            read_frame(path) loads a CSV, Parquet or Arrow file into a DataFrame with compact dtypes
+            (small ints, float32, category for repeated text: use .astype(str) before adding new labels);
+            memory_note(df) reports its size and compact_frame(df) shrinks other frames the same way.
+            Useful for dynamic data cleaning, analysis, and plotting.
+            Input: code (str)
+            """
+            return run(code)
+
+        return execute_python_code
+
+    @tool("Execute Python Code")
+    def execute_python_code(code: str):
+        """
+        Executes the given Python code in a persistent session.
+        The code must be valid Python.
+        Standard output (print statements) is captured and returned, with the run time.
+        Variables, imports and DataFrames created in one call are still available in later calls,
+        so load data once and reuse it. pandas (pd), numpy (np) and sklearn are pre-imported.
+        read_frame(path) loads a CSV, Parquet or Arrow file into a DataFrame with compact dtypes
+        (small ints, float32, category for repeated text: use .astype(str) before adding new labels);
+        memory_note(df) reports its size and compact_frame(df) shrinks other frames the same way.
+        Useful for dynamic data cleaning, analysis, and plotting.
+        Input: code (str)
+        """
+        return run(code)
+
+    return execute_python_code
+
+
+# ==============================================================================
+# 4. PER-RUN REGISTRY
+# ==============================================================================
+
+_kernels = {}
+_kernels_lock = threading.Lock()
+
+
+def get_kernel(run_id, cwd=None, persistent=True):
+    """Returns the kernel for a pipeline run, creating it on first use."""
+    with _kernels_lock:
+        if run_id not in _kernels:
+            _kernels[run_id] = PythonKernel(cwd=cwd, persistent=persistent)
+        return _kernels[run_id]
+
+
+def shutdown_kernel(run_id):
+    with _kernels_lock:
+        kernel = _kernels.pop(run_id, None)
+    if kernel is not None:
+        kernel.shutdown()
+
+
+# ==============================================================================
+# 5. SHARED STATELESS POOL
+# ==============================================================================
+
+class KernelPool:
+    """
+    Stateless kernels shared by every run in the process. Each call borrows an idle worker,
+    which switches to the caller's directory and starts from a fresh namespace, so calls from
+    several agents or pipelines run in parallel (up to `size` at once) without sharing state.
+    """
+
+    def __init__(self, size=KERNEL_POOL_SIZE):
+        self.size = max(1, size)
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+        self._idle = []
+        self._kernels = []
+
+    def execute(self, code, cwd=None):
+        """Runs code in an idle worker; returns the raw result dict (error, stdout, stderr, seconds)."""
+        with self._slots:
+            with self._lock:
+                if self._idle:
+                    kernel = self._idle.pop()
+                else:
+                    kernel = PythonKernel(persistent=False)
+                    self._kernels.append(kernel)
+            try:
+                return kernel.execute(code, cwd or os.getcwd())[0]
+            finally:
+                with self._lock:
+                    self._idle.append(kernel)
+
+    def run(self, code, cwd=None):
+        cwd = cwd or os.getcwd()
+        return _format_result(self.execute(code, cwd), False, cwd)
+
+    def shutdown(self):
+        with self._lock:
+            kernels, self._kernels, self._idle = self._kernels, [], []
+        for kernel in kernels:
+            kernel.shutdown()
+
+
+class PooledKernel:
+    """The stateless Execute Python Code of one directory, served by the shared KernelPool."""
+    persistent = False
+
+    def __init__(self, cwd=None):
+        self.cwd = cwd
+
+    def run(self, code):
+        return get_pool().run(code, self.cwd)
+
+    def reset(self):
+        pass  # every call already starts from a fresh namespace
+
+    def shutdown(self):
+        pass  # the workers belong to the pool
+
+    def tool(self):
+        return _build_tool(self.run, persistent=False)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = KernelPool()
+        return _pool
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown()
+
+
+@atexit.register
+def shutdown_all():
+    for run_id in list(_kernels):
+        shutdown_kernel(run_id)
+    shutdown_pool()
@@ -0,0 +1,242 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from crewai.llms.base_llm import BaseLLM
+from token_budget import estimate_tokens
+
+# ==============================================================================
+# 1. CONFIGURATION
+# ==============================================================================
+
+# LLM_CACHE: "on" (read/write, default), "replay" (serve from disk, fail on miss) or "off"
+LLM_CACHE_MODE = os.getenv("LLM_CACHE", "on").lower()
+LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", ".llm_cache")
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+LLM_CACHE_MAX_AGE = float(os.getenv("LLM_CACHE_MAX_AGE", 7 * 24 * 3600))
+# Writes between full scans of the store; in between, eviction runs only when the running
+# size total crosses max_bytes (expired entries are also dropped when read)
+CACHE_SCAN_EVERY = 500
+
+
+class CacheMissError(LookupError):
+    """Raised in replay-only mode when a request has no recorded response."""
+
+
+# ==============================================================================
+# 2. DISK STORE
+# ==============================================================================
+
+def _normalize_messages(messages):
+    if isinstance(messages, str):
+        messages = [{"role": "user", "content": messages}]
+    normalized = []
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            content = "\n".join(line.rstrip() for line in content.strip().splitlines())
+        normalized.append({"role": message.get("role"), "content": content})
+    return normalized
+
+
+def cache_key(model, temperature, messages):
+    payload = json.dumps(
+        {"model": model, "temperature": temperature, "messages": _normalize_messages(messages)},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    Content-addressed response store on local disk.
+    Entries live at <path>/<key[:2]>/<key>.json. A hit refreshes the file's mtime, so
+    eviction drops entries unused for longer than max_age first, then the least
+    recently used ones until the store fits in max_bytes.
+    """
+
+    def __init__(self, path=LLM_CACHE_DIR, max_bytes=LLM_CACHE_MAX_BYTES,
+                 max_age=LLM_CACHE_MAX_AGE, replay_only=False):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.replay_only = replay_only
+        # Bytes in the store at the last scan plus this process's writes since; None until scanned
+        self._total = None
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def _entry_path(self, key):
+        return os.path.join(self.path, key[:2], f"{key}.json")
+
+    def get(self, key):
+        entry_path = self._entry_path(key)
+        try:
+            if time.time() - os.path.getmtime(entry_path) > self.max_age:
+                os.remove(entry_path)
+                return None
+            with open(entry_path, "r") as f:
+                response = json.load(f)["response"]
+            os.utime(entry_path)
+            return response
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def put(self, key, response):
+        entry_path = self._entry_path(key)
+        os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+        # Write to a temp file and rename so concurrent readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(entry_path), suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump({"created": time.time(), "response": response}, f)
+        os.replace(tmp_path, entry_path)
+        if self._count_write(os.path.getsize(entry_path)):
+            self.evict()
+
+    def _count_write(self, size):
+        """Adds a write to the running total; True when it is time for a full scan."""
+        with self._lock:
+            self._writes += 1
+            if self._total is not None:
+                self._total += size
+            return self._total is None or self._total > self.max_bytes or self._writes % CACHE_SCAN_EVERY == 0
+
+    def evict(self):
+        now = time.time()
+        entries = []
+        for root, _, files in os.walk(self.path):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                entry_path = os.path.join(root, name)
+                try:
+                    stat = os.stat(entry_path)
+                except OSError:
+                    continue
+                if now - stat.st_mtime > self.max_age:
+                    self._remove(entry_path)
+                else:
+                    entries.append((stat.st_mtime, stat.st_size, entry_path))
+
+        total = sum(size for _, size, _ in entries)
+        # Once over the limit, free a tenth of it, so a full store isn't rescanned on every write
+        target = self.max_bytes if total <= self.max_bytes else 0.9 * self.max_bytes
+        for _, size, entry_path in sorted(entries):
+            if total <= target:
+                break
+            self._remove(entry_path)
+            total -= size
+        with self._lock:
+            self._total = total
+
+    @staticmethod
+    def _remove(entry_path):
+        try:
+            os.remove(entry_path)
+        except OSError:
+            pass
+
+
+_cache = None
+
+
+def cache_from_env():
+    global _cache
+    if LLM_CACHE_MODE == "off":
+        return None
+    # One instance per process, so the running size total covers every crew's writes
+    if _cache is None:
+        _cache = LLMCache(replay_only=LLM_CACHE_MODE == "replay")
+    return _cache
+
+
+# ==============================================================================
+# 3. LLM WRAPPERS
+# ==============================================================================
+
+class DelegatingLLM(BaseLLM):
+    """Base for wrappers around an LLM: forwards every call and attribute to `self.llm`."""
+
+    def __init__(self, llm):
+        self.llm = llm
+        # Pass the current stop words through: the wrapped LLM may be shared by other crews
+        super().__init__(model=llm.model, temperature=llm.temperature, provider=llm.provider, stop=llm.stop)
+        self.is_litellm = llm.is_litellm
+
+    def __getattr__(self, name):
+        llm = self.__dict__.get("llm")
+        if llm is None:
+            raise AttributeError(name)
+        return getattr(llm, name)
+
+    @property
+    def stop(self):
+        return self.llm.stop
+
+    @stop.setter
+    def stop(self, value):
+        # The agent executor appends its stop words here; the wrapped LLM must see them
+        self.llm.stop = value
+
+    def call(self, messages, *args, **kwargs):
+        return self.llm.call(messages, *args, **kwargs)
+
+    def supports_function_calling(self):
+        return self.llm.supports_function_calling()
+
+    def supports_stop_words(self):
+        return self.llm.supports_stop_words()
+
+    def get_context_window_size(self):
+        return self.llm.get_context_window_size()
+
+    def get_token_usage_summary(self):
+        return self.llm.get_token_usage_summary()
+
+
+class CachedLLM(DelegatingLLM):
+    """Serves repeated prompts from an LLMCache instead of calling the provider."""
+
+    def __init__(self, llm, cache):
+        super().__init__(llm)
+        self.cache = cache
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None, **kwargs):
+        # Native function calling executes tools inside the provider call, so a cached
+        # string could not reproduce its side effects; only plain completions are cached.
+        if tools or available_functions or kwargs.get("response_model"):
+            return self.llm.call(messages, tools=tools, callbacks=callbacks,
+                                 available_functions=available_functions, **kwargs)
+
+        key = cache_key(self.model, self.temperature, messages)
+        response = self.cache.get(key)
+        if response is not None:
+            return response
+        if self.cache.replay_only:
+            raise CacheMissError(f"No cached response for {self.model} (key {key[:12]}) in replay-only mode")
+
+        response = self.llm.call(messages, callbacks=callbacks, **kwargs)
+        if isinstance(response, str) and response:
+            self.cache.put(key, response)
+        return response
+
+
+class TracedLLM(DelegatingLLM):
+    """Records every completion as an llm span with estimated tokens in and out."""
+
+    def __init__(self, llm, tracer, role):
+        super().__init__(llm)
+        self.tracer = tracer
+        self.role = role
+
+    def call(self, messages, *args, **kwargs):
+        self.tracer.enter_task(kwargs.get("from_task"))
+        prompt = messages if isinstance(messages, str) else "".join(str(m.get("content", "")) for m in messages)
+        with self.tracer.span(f"llm: {self.model}", "llm", agent=self.role, model=self.model,
+                              input_tokens_est=estimate_tokens(prompt)) as span:
+            response = self.llm.call(messages, *args, **kwargs)
+            span.set(output_tokens_est=estimate_tokens(str(response or "")))
+            return response
@@ -0,0 +1,34 @@
+import hashlib
+import threading
+from crewai import LLM
+
+# ==============================================================================
+# PROCESS-WIDE LLM CLIENT POOL
+# ==============================================================================
+
+# Building an LLM creates a provider client with its own HTTP connection pool.
+# Crews are rebuilt for every kickoff, so clients are shared per configuration instead.
+_pool = {}
+_pool_lock = threading.Lock()
+
+
+def _pool_key(kwargs):
+    api_key = kwargs.get("api_key") or ""
+    # Keep raw keys out of the pool's dict keys
+    fingerprint = hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+    return tuple(sorted((name, repr(value)) for name, value in kwargs.items() if name != "api_key")) + (fingerprint,)
+
+
+def get_llm(**kwargs):
+    """Returns the shared LLM for these settings, constructing it on first use."""
+    key = _pool_key(kwargs)
+    with _pool_lock:
+        llm = _pool.get(key)
+        if llm is None:
+            llm = _pool[key] = LLM(**kwargs)
+        return llm
+
+
+def clear_pool():
+    with _pool_lock:
+        _pool.clear()
@@ -0,0 +1,240 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from llm_cache import DelegatingLLM
+from token_budget import estimate_tokens
+from tracing import annotate
+
+# ==============================================================================
+# 1. CONFIGURATION
+# ==============================================================================
+
+# Two model tiers. LLM_ROUTING=cascade picks one per call (fast first, escalating to
+# strong when the fast answer fails validation); "fast" or "strong" pins a tier, and
+# "static" keeps the fixed per-agent assignment.
+LLM_ROUTING = os.getenv("LLM_ROUTING", "cascade").lower()
+LLM_FAST_MODEL = os.getenv("LLM_FAST_MODEL", "gemini/gemini-2.5-flash")
+LLM_STRONG_MODEL = os.getenv("LLM_STRONG_MODEL", "gemini/gemini-2.5-pro")
+# Prompts longer than this (estimated tokens) skip the fast tier
+LLM_ROUTE_LONG_PROMPT = int(os.getenv("LLM_ROUTE_LONG_PROMPT", 24_000))
+# Calls per agent role before its statistics can send it straight to the strong tier
+LLM_ROUTE_MIN_SAMPLES = int(os.getenv("LLM_ROUTE_MIN_SAMPLES", 5))
+# Every n-th call of a role tries the cascade anyway, so the fast tier's stats stay current
+LLM_ROUTE_EXPLORE_EVERY = int(os.getenv("LLM_ROUTE_EXPLORE_EVERY", 10))
+
+TIERS = ("fast", "strong")
+# Weight of the newest latency in the moving average
+LATENCY_ALPHA = 0.2
+
+_ROLE_PATTERN = re.compile(r"You are (.+?)\. ")
+_TOOL_NAME_PATTERN = re.compile(r"^Tool Name: (.+?)\s*$", re.M)
+_ACTION_PATTERN = re.compile(r"^Action:\s*(.+?)\s*$", re.M)
+# How kernel.py reports code that raised (see _format_result)
+CODE_ERROR_MARKER = "Error executing code"
+
+
+def _text(messages, roles=("system", "user")):
+    if isinstance(messages, str):
+        return messages
+    return "\n".join(str(m.get("content", "")) for m in messages if m.get("role") in roles)
+
+
+def _assistant_turns(messages):
+    if isinstance(messages, str):
+        return []
+    return [str(m.get("content", "")) for m in messages if m.get("role") == "assistant"]
+
+
+def _role(messages, agent=None):
+    role = getattr(agent, "role", None)
+    if role:
+        return role
+    match = _ROLE_PATTERN.search(_text(messages))
+    return match.group(1) if match else "unknown"
+
+
+def validate(response, messages):
+    """
+    Checks a ReAct-format completion; returns why it is unusable, or None if it is fine.
+    Catches the failures the fast tier makes most: malformed steps, invented tools, and
+    final answers given before the agent ever used one of its tools.
+    """
+    if not isinstance(response, str):
+        return None
+    text = response.strip()
+    if not text:
+        return "empty response"
+    tools = _TOOL_NAME_PATTERN.findall(_text(messages, ("system",)))
+    action = _ACTION_PATTERN.search(text)
+    if action:
+        if tools and action.group(1) not in tools:
+            return f"unknown tool '{action.group(1)}'"
+        if "Action Input:" not in text:
+            return "action without input"
+        return None
+    if "Final Answer:" in text:
+        if tools and not any("Observation:" in turn for turn in _assistant_turns(messages)):
+            return "final answer without a tool call"
+        return None
+    return "neither an action nor a final answer"
+
+
+# ==============================================================================
+# 2. ROUTING STATISTICS
+# ==============================================================================
+
+class RouteStats:
+    """
+    Per (agent role, tier) call counts, failures and a moving average of latency, shared
+    by every router in the process. Also remembers which tier wrote recent responses, so
+    code that later fails in the kernel is charged to the tier that wrote it.
+    """
+
+    def __init__(self, recent=1024):
+        self.entries = {}
+        self._recent = OrderedDict()
+        self._recent_limit = recent
+        self._explore = {}
+        self._lock = threading.Lock()
+
+    def _entry(self, role, tier):
+        return self.entries.setdefault((role, tier), {"calls": 0, "failures": 0, "latency": None})
+
+    def record(self, role, tier, seconds, response=None):
+        with self._lock:
+            entry = self._entry(role, tier)
+            entry["calls"] += 1
+            latency = entry["latency"]
+            entry["latency"] = seconds if latency is None else (1 - LATENCY_ALPHA) * latency + LATENCY_ALPHA * seconds
+            if isinstance(response, str) and response.strip():
+                self._recent[response.strip()[:200]] = (role, tier)
+                while len(self._recent) > self._recent_limit:
+                    self._recent.popitem(last=False)
+
+    def fail(self, role, tier):
+        with self._lock:
+            self._entry(role, tier)["failures"] += 1
+
+    def blame_code_error(self, messages):
+        """
+        True if the agent's last tool call ran code that raised. The failure is charged once,
+        to the tier whose response contained the code.
+        """
+        turns = _assistant_turns(messages)
+        if not turns or "Observation:" not in turns[-1]:
+            return False
+        step, observation = turns[-1].split("Observation:", 1)
+        if CODE_ERROR_MARKER not in observation[:300]:
+            return False
+        with self._lock:
+            author = self._recent.pop(step.strip()[:200], None)
+        if author is not None:
+            self.fail(*author)
+        return True
+
+    def pick(self, role):
+        """
+        Cascades through the fast tier unless its record for this role makes the expected
+        cascade latency (fast, plus strong whenever fast fails) worse than going to strong.
+        """
+        with self._lock:
+            count = self._explore[role] = self._explore.get(role, 0) + 1
+            fast = dict(self._entry(role, "fast"))
+            strong = dict(self._entry(role, "strong"))
+        if (fast["calls"] < LLM_ROUTE_MIN_SAMPLES or strong["latency"] is None
+                or count % LLM_ROUTE_EXPLORE_EVERY == 0):
+            return "fast", "cascade"
+        failure_rate = fast["failures"] / fast["calls"]
+        if fast["latency"] + failure_rate * strong["latency"] < strong["latency"]:
+            return "fast", "cascade"
+        return "strong", f"fast tier fails {failure_rate:.0%} of calls"
+
+    def snapshot(self):
+        with self._lock:
+            return {f"{role} / {tier}": dict(entry) for (role, tier), entry in self.entries.items()}
+
+
+route_stats = RouteStats()
+
+
+# ==============================================================================
+# 3. ROUTED LLM
+# ==============================================================================
+
+class RoutedLLM(DelegatingLLM):
+    """
+    Sends each completion to the fast or the strong tier. In cascade mode the fast answer
+    is validated and the call is repeated on the strong tier when it fails; the step
+    after a Python code error always goes to the strong tier.
+    """
+
+    def __init__(self, fast, strong, mode=LLM_ROUTING, stats=None):
+        super().__init__(fast)
+        self.tiers = {"fast": fast, "strong": strong}
+        self.mode = mode
+        self.stats = stats or route_stats
+        # Stage fingerprints include the model, so both tiers must show up in it
+        self.model = f"{fast.model}>{strong.model}"
+
+    @property
+    def stop(self):
+        return self.llm.stop
+
+    @stop.setter
+    def stop(self, value):
+        # Also called from BaseLLM.__init__, before the tiers are set
+        for llm in self.__dict__.get("tiers", {"fast": self.llm}).values():
+            llm.stop = value
+
+    def choose(self, role, messages):
+        """Returns (tier, reason)."""
+        code_error = self.stats.blame_code_error(messages)
+        if self.mode in TIERS:
+            return self.mode, "pinned"
+        if code_error:
+            return "strong", "code error"
+        if estimate_tokens(_text(messages)) > LLM_ROUTE_LONG_PROMPT:
+            return "strong", "long prompt"
+        return self.stats.pick(role)
+
+    def _call(self, tier, role, messages, args, kwargs):
+        start = time.perf_counter()
+        response = self.tiers[tier].call(messages, *args, **kwargs)
+        self.stats.record(role, tier, time.perf_counter() - start, response)
+        return response
+
+    def call(self, messages, *args, **kwargs):
+        role = _role(messages, kwargs.get("from_agent"))
+        tier, reason = self.choose(role, messages)
+        annotate(route_tier=tier, route_reason=reason)
+        if tier == "strong":
+            return self._call("strong", role, messages, args, kwargs)
+
+        start = time.perf_counter()
+        try:
+            response = self._call("fast", role, messages, args, kwargs)
+            # Native function calling runs the tools inside the call; there is nothing to retry
+            native = kwargs.get("tools") or kwargs.get("available_functions")
+            problem = None if self.mode == "fast" or native else validate(response, messages)
+        except Exception as e:
+            from llm_scheduler import is_rate_limit
+
+            # Quota errors already had their retries in the scheduler; the strong tier shares the quota
+            if self.mode == "fast" or is_rate_limit(e):
+                raise
+            self.stats.record(role, "fast", time.perf_counter() - start)
+            response, problem = None, f"error: {e}"
+        if problem is None:
+            return response
+        self.stats.fail(role, "fast")
+        annotate(route_tier="strong", route_escalated=problem)
+        return self._call("strong", role, messages, args, kwargs)
+
+
+def route(fast, strong, mode=LLM_ROUTING):
+    """A RoutedLLM over the two tiers, or None when routing is static."""
+    if mode == "static":
+        return None
+    return RoutedLLM(fast, strong, mode)
@@ -0,0 +1,242 @@
+import heapq
+import itertools
+import os
+import random
+import re
+import threading
+import time
+from llm_cache import DelegatingLLM
+from token_budget import estimate_tokens
+from tracing import annotate
+
+# ==============================================================================
+# 1. CONFIGURATION
+# ==============================================================================
+
+# One scheduler per process sits between every crew's LLM and the provider, so all
+# crews share one quota instead of each backing off on its own. 0 disables a limit.
+LLM_SCHEDULER_MODE = os.getenv("LLM_SCHEDULER", "on").lower()
+LLM_RPM = float(os.getenv("LLM_RPM", 1_000))
+LLM_TPM = float(os.getenv("LLM_TPM", 1_000_000))
+# Requests admitted back to back before the RPM refill rate applies; providers that
+# enforce per-second windows need less than a minute's worth. 0 = one minute's worth.
+LLM_BURST = float(os.getenv("LLM_BURST", 0))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 8))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 6))
+LLM_RETRY_BASE = float(os.getenv("LLM_RETRY_BASE", 1.0))
+LLM_RETRY_MAX = float(os.getenv("LLM_RETRY_MAX", 60.0))
+# Tokens reserved for the completion before its real length is known
+OUTPUT_TOKENS_ESTIMATE = 500
+
+# Lower runs first: Streamlit sessions are served before batch runs
+PRIORITIES = {"interactive": 0, "batch": 1}
+LLM_PRIORITY = os.getenv("LLM_PRIORITY", "interactive").lower()
+
+_RATE_LIMIT_PATTERN = re.compile(r"\b429\b|rate.?limit|resource.?exhausted|quota", re.I)
+_RETRY_AFTER_PATTERN = re.compile(r"retry(?:[ _-]after| in)?\W{0,3}([\d.]+)\s*s", re.I)
+
+
+def is_rate_limit(error):
+    """True for provider quota errors (HTTP 429), however the client library wraps them."""
+    if getattr(error, "status_code", None) == 429 or type(error).__name__ == "RateLimitError":
+        return True
+    return bool(_RATE_LIMIT_PATTERN.search(str(error)))
+
+
+def retry_after(error):
+    """Seconds the provider asked us to wait, if it said."""
+    value = getattr(error, "retry_after", None)
+    if value is None:
+        match = _RETRY_AFTER_PATTERN.search(str(error))
+        value = match.group(1) if match else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+# ==============================================================================
+# 2. TOKEN BUCKETS
+# ==============================================================================
+
+class TokenBucket:
+    """
+    Refills at `per_minute` / 60 units per second up to `burst` (default one minute's
+    worth). Not locked: the scheduler only touches it while holding its own lock.
+    """
+
+    def __init__(self, per_minute, clock=time.monotonic, burst=None):
+        self.rate = per_minute / 60.0
+        self.capacity = burst or per_minute
+        self.level = self.capacity
+        self.clock = clock
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        """Seconds until `amount` units are available (0 if they are now)."""
+        if not self.rate:
+            return 0.0
+        self._refill()
+        # A request bigger than the bucket waits for a full bucket rather than forever
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing / self.rate)
+
+    def take(self, amount):
+        if self.rate:
+            self._refill()
+            # May go negative: a long completion is paid for by the requests after it
+            self.level -= amount
+
+
+# ==============================================================================
+# 3. SCHEDULER
+# ==============================================================================
+
+class LLMScheduler:
+    """
+    Admits LLM calls in priority order (then arrival order) when a concurrency slot is
+    free and the request and token buckets allow it. A 429 from the provider pauses
+    every caller for a jittered, exponentially growing delay (or the provider's
+    retry-after), and the failed call is retried, so all crews back off together.
+    """
+
+    def __init__(self, rpm=LLM_RPM, tpm=LLM_TPM, max_concurrency=LLM_MAX_CONCURRENCY,
+                 max_retries=LLM_MAX_RETRIES, retry_base=LLM_RETRY_BASE, retry_max=LLM_RETRY_MAX,
+                 burst=LLM_BURST, clock=time.monotonic):
+        self.requests = TokenBucket(rpm, clock, burst)
+        self.tokens = TokenBucket(tpm, clock)
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.clock = clock
+        self._cond = threading.Condition()
+        self._queue = []
+        self._seq = itertools.count()
+        self._active = 0
+        self._paused_until = 0.0
+        self.stats = {"calls": 0, "rate_limited": 0, "retries": 0, "queued_seconds": 0.0}
+
+    def _acquire(self, ticket, tokens):
+        start = self.clock()
+        with self._cond:
+            heapq.heappush(self._queue, ticket)
+            while True:
+                now = self.clock()
+                timeout = None
+                if self._queue[0] == ticket and self._active < self.max_concurrency:
+                    timeout = max(self._paused_until - now, self.requests.wait_time(1), self.tokens.wait_time(tokens))
+                    if timeout <= 0:
+                        heapq.heappop(self._queue)
+                        self.requests.take(1)
+                        self.tokens.take(tokens)
+                        self._active += 1
+                        self.stats["calls"] += 1
+                        # The next ticket may be admissible right away
+                        self._cond.notify_all()
+                        break
+                self._cond.wait(timeout)
+            queued = self.clock() - start
+            self.stats["queued_seconds"] += queued
+        return queued
+
+    def _release(self, output_tokens=0):
+        with self._cond:
+            self._active -= 1
+            self.tokens.take(output_tokens)
+            self._cond.notify_all()
+
+    def _back_off(self, attempt, hint=None):
+        """Pauses every caller; returns the delay."""
+        delay = min(self.retry_max, self.retry_base * 2 ** attempt)
+        # Full jitter keeps the crews that resume together from hitting the quota together
+        delay = random.uniform(delay / 2, delay)
+        if hint:
+            delay = max(delay, hint)
+        with self._cond:
+            self._paused_until = max(self._paused_until, self.clock() + delay)
+            self.stats["rate_limited"] += 1
+            self.stats["retries"] += 1
+            self._cond.notify_all()
+        return delay
+
+    def call(self, fn, priority="interactive", tokens=0):
+        """Runs fn() under the limits, retrying it on rate-limit errors. Returns its result."""
+        rank = PRIORITIES.get(priority, priority) if isinstance(priority, str) else priority
+        # A retried call keeps its place in the queue
+        ticket = (rank, next(self._seq))
+        queued = 0.0
+        for attempt in range(self.max_retries + 1):
+            queued += self._acquire(ticket, tokens + OUTPUT_TOKENS_ESTIMATE)
+            output_tokens = 0
+            try:
+                response = fn()
+                output_tokens = estimate_tokens(str(response or "")) - OUTPUT_TOKENS_ESTIMATE
+                annotate(llm_queued_seconds=round(queued, 3), llm_attempts=attempt + 1)
+                return response
+            except Exception as e:
+                if not is_rate_limit(e) or attempt == self.max_retries:
+                    raise
+                self._back_off(attempt, retry_after(e))
+            finally:
+                self._release(output_tokens)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = LLMScheduler()
+        return _scheduler
+
+
+def configure_scheduler(priority=None, share=1.0, **limits):
+    """
+    Replaces the process-wide scheduler. `share` scales the default rate limits, for
+    worker processes that split one quota (e.g. batch_runner's pool); `priority` sets
+    the class of LLMs wrapped from now on.
+    """
+    global _scheduler, LLM_PRIORITY
+    if priority is not None:
+        LLM_PRIORITY = priority
+    limits.setdefault("rpm", LLM_RPM * share)
+    limits.setdefault("tpm", LLM_TPM * share)
+    limits.setdefault("max_concurrency", max(1, round(LLM_MAX_CONCURRENCY * share)))
+    limits.setdefault("burst", max(1, LLM_BURST * share) if LLM_BURST else 0)
+    with _scheduler_lock:
+        _scheduler = LLMScheduler(**limits)
+        return _scheduler
+
+
+# ==============================================================================
+# 4. LLM WRAPPER
+# ==============================================================================
+
+class ScheduledLLM(DelegatingLLM):
+    """Sends every completion through the shared LLMScheduler at a fixed priority class."""
+
+    def __init__(self, llm, scheduler=None, priority=None):
+        super().__init__(llm)
+        self.scheduler = scheduler or get_scheduler()
+        self.priority = priority or LLM_PRIORITY
+
+    def call(self, messages, *args, **kwargs):
+        prompt = messages if isinstance(messages, str) else "".join(str(m.get("content", "")) for m in messages)
+        return self.scheduler.call(lambda: self.llm.call(messages, *args, **kwargs),
+                                   self.priority, estimate_tokens(prompt))
+
+
+def schedule(llm):
+    """Wraps llm with the process-wide scheduler unless LLM_SCHEDULER=off."""
+    if LLM_SCHEDULER_MODE == "off":
+        return llm
+    return ScheduledLLM(llm)
@@ -0,0 +1,124 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+# ==============================================================================
+# 1. CONFIGURATION
+# ==============================================================================
+
+# Trained models outlive the run that trained them, so they live next to the stage
+# cache rather than in a run workspace. MODEL_REGISTRY=off disables saving and reuse.
+MODEL_REGISTRY_MODE = os.getenv("MODEL_REGISTRY", "on").lower()
+MODEL_REGISTRY_DIR = os.getenv("MODEL_REGISTRY_DIR", ".model_registry")
+MODEL_REGISTRY_VERSION = 2
+
+MODEL_FILE = "model.joblib"
+SCHEMA_FILE = "schema.json"
+
+
+def model_id(dataset_hash, config):
+    """Models are keyed by the content of their training data and everything that shaped the fit."""
+    payload = {"version": MODEL_REGISTRY_VERSION, "dataset": dataset_hash, "config": config}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+# ==============================================================================
+# 2. REGISTRY
+# ==============================================================================
+
+class ModelRegistry:
+    """
+    Estimators and their feature encoders on local disk, at <path>/<model_id>/, with a
+    schema.json describing the target, input columns, features, metrics and config.
+    """
+
+    def __init__(self, path=MODEL_REGISTRY_DIR):
+        self.path = path
+
+    def _entry_path(self, model_id):
+        return os.path.join(self.path, model_id)
+
+    def exists(self, model_id):
+        return os.path.exists(os.path.join(self._entry_path(model_id), SCHEMA_FILE))
+
+    def save(self, model_id, model, encoder, schema):
+        import joblib
+
+        os.makedirs(self.path, exist_ok=True)
+        # Build the entry in a temp dir and rename it, so readers never see half a model
+        tmp = tempfile.mkdtemp(dir=self.path, suffix=".tmp")
+        try:
+            joblib.dump({"model": model, "encoder": encoder}, os.path.join(tmp, MODEL_FILE))
+            with open(os.path.join(tmp, SCHEMA_FILE), "w") as f:
+                json.dump({**schema, "model_id": model_id, "created": time.time()}, f, indent=2, default=str)
+            os.replace(tmp, self._entry_path(model_id))
+        except OSError:
+            # The same model was saved by another run first; its entry is just as good
+            shutil.rmtree(tmp, ignore_errors=True)
+        return self._entry_path(model_id)
+
+    def touch(self, model_id):
+        """Marks a reused model as the newest, so "latest" means the model training last reported."""
+        path = os.path.join(self._entry_path(model_id), SCHEMA_FILE)
+        schema = {**self.schema(model_id), "created": time.time()}
+        fd, tmp = tempfile.mkstemp(dir=self._entry_path(model_id), suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(schema, f, indent=2, default=str)
+        os.replace(tmp, path)
+
+    def schema(self, model_id):
+        with open(os.path.join(self._entry_path(self.resolve(model_id)), SCHEMA_FILE), "r") as f:
+            return json.load(f)
+
+    def model_path(self, model_id):
+        return os.path.join(self._entry_path(self.resolve(model_id)), MODEL_FILE)
+
+    def load(self, model_id):
+        """Returns (model, encoder, schema)."""
+        import joblib
+
+        model_id = self.resolve(model_id)
+        saved = joblib.load(self.model_path(model_id))
+        return saved["model"], saved["encoder"], self.schema(model_id)
+
+    def list(self):
+        """Schemas of every saved model, newest first."""
+        schemas = []
+        for name in _listdir(self.path):
+            try:
+                with open(os.path.join(self.path, name, SCHEMA_FILE), "r") as f:
+                    schemas.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return sorted(schemas, key=lambda s: -s.get("created", 0))
+
+    def resolve(self, model_id):
+        """Accepts a full id, a unique prefix of one, or 'latest'."""
+        model_id = (model_id or "latest").strip()
+        if model_id == "latest":
+            models = self.list()
+            if not models:
+                raise KeyError("The model registry is empty; train a model first.")
+            return models[0]["model_id"]
+        if self.exists(model_id):
+            return model_id
+        matches = [name for name in _listdir(self.path) if name.startswith(model_id) and self.exists(name)]
+        if len(matches) != 1:
+            raise KeyError(f"No unique model matches {model_id!r}")
+        return matches[0]
+
+
+def _listdir(path):
+    try:
+        return os.listdir(path)
+    except OSError:
+        return []
+
+
+def registry_from_env():
+    if MODEL_REGISTRY_MODE == "off":
+        return None
+    return ModelRegistry()
@@ -0,0 +1,410 @@
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import numpy as np
+import pandas as pd
+from data_io import CATEGORY_MAX_RATIO, CATEGORY_MAX_VALUES, iter_chunks, read_head
+from token_budget import TOOL_TOKEN_BUDGET, display_name, estimate_tokens, spill, spill_path
+from tracing import annotate
+
+# ==============================================================================
+# 1. CONFIGURATION
+# ==============================================================================
+
+PROFILE_CHUNKSIZE = int(os.getenv("PROFILE_CHUNKSIZE", 100_000))
+PROFILE_WORKERS = int(os.getenv("PROFILE_WORKERS", 1))
+# Values kept per numeric column for quantiles; files with fewer rows get exact quantiles
+QUANTILE_SAMPLE_SIZE = 10_000
+# Distinct values tracked per categorical column
+TOP_K_CAPACITY = 1_000
+
+
+# ==============================================================================
+# 2. PER-CHUNK STATISTICS
+# ==============================================================================
+
+def _chunk_stats(chunk, seed=0):
+    """Computes mergeable statistics for one chunk. Runs in worker processes."""
+    rng = np.random.default_rng(seed)
+    stats = {}
+    for name in chunk.columns:
+        col = chunk[name]
+        values = col.dropna()
+        entry = {
+            "dtype": col.dtype,
+            "count": len(values),
+            "nulls": len(col) - len(values),
+            "memory": col.memory_usage(index=False),
+        }
+        if pd.api.types.is_numeric_dtype(col) and not pd.api.types.is_bool_dtype(col):
+            arr = values.to_numpy(dtype=float)
+            entry["numeric"] = numeric_stats(arr, rng)
+        else:
+            counts = values.astype(str).value_counts()
+            entry["top"] = counts.head(TOP_K_CAPACITY).to_dict()
+        stats[name] = entry
+    return len(chunk), stats
+
+
+def numeric_stats(arr, rng):
+    n = len(arr)
+    if n == 0:
+        return {"n": 0, "mean": 0.0, "m2": 0.0, "min": np.nan, "max": np.nan,
+                "sample": np.empty(0), "keys": np.empty(0)}
+    # Bottom-k sample: every value gets a random key and the k smallest keys are kept.
+    # The union of two bottom-k samples, trimmed to k, is again a uniform sample.
+    keys = rng.random(n)
+    if n > QUANTILE_SAMPLE_SIZE:
+        keep = np.argpartition(keys, QUANTILE_SAMPLE_SIZE)[:QUANTILE_SAMPLE_SIZE]
+        arr_sample, keys = arr[keep], keys[keep]
+    else:
+        arr_sample = arr
+    mean = arr.mean()
+    return {"n": n, "mean": mean, "m2": float(((arr - mean) ** 2).sum()),
+            "min": arr.min(), "max": arr.max(), "sample": arr_sample, "keys": keys}
+
+
+# ==============================================================================
+# 3. MERGING
+# ==============================================================================
+
+def merge_numeric(a, b):
+    if a["n"] == 0:
+        return b
+    if b["n"] == 0:
+        return a
+    # Chan et al. parallel update for mean and sum of squared deviations
+    n = a["n"] + b["n"]
+    delta = b["mean"] - a["mean"]
+    mean = a["mean"] + delta * b["n"] / n
+    m2 = a["m2"] + b["m2"] + delta ** 2 * a["n"] * b["n"] / n
+
+    sample = np.concatenate([a["sample"], b["sample"]])
+    keys = np.concatenate([a["keys"], b["keys"]])
+    if len(keys) > QUANTILE_SAMPLE_SIZE:
+        keep = np.argpartition(keys, QUANTILE_SAMPLE_SIZE)[:QUANTILE_SAMPLE_SIZE]
+        sample, keys = sample[keep], keys[keep]
+    return {"n": n, "mean": mean, "m2": m2, "min": min(a["min"], b["min"]),
+            "max": max(a["max"], b["max"]), "sample": sample, "keys": keys}
+
+
+def merge_top(a, b):
+    merged = dict(a)
+    for value, count in b.items():
+        merged[value] = merged.get(value, 0) + count
+    if len(merged) > TOP_K_CAPACITY:
+        merged = dict(sorted(merged.items(), key=lambda item: -item[1])[:TOP_K_CAPACITY])
+    return merged
+
+
+def _merge_entry(a, b):
+    merged = {
+        "count": a["count"] + b["count"],
+        "nulls": a["nulls"] + b["nulls"],
+        "memory": a["memory"] + b["memory"],
+    }
+    if a["dtype"] == b["dtype"]:
+        merged["dtype"] = a["dtype"]
+    elif "numeric" in a and "numeric" in b:
+        merged["dtype"] = np.result_type(a["dtype"], b["dtype"])
+    else:
+        merged["dtype"] = np.dtype(object)
+
+    if "numeric" in a and "numeric" in b:
+        merged["numeric"] = merge_numeric(a["numeric"], b["numeric"])
+    else:
+        # A column that parses as text in any chunk is reported as text, like a full read would
+        merged["top"] = merge_top(a.get("top", {}), b.get("top", {}))
+    return merged
+
+
+class _Profile:
+    def __init__(self):
+        self.rows = 0
+        self.columns = {}
+
+    def add(self, result):
+        rows, stats = result
+        self.rows += rows
+        for name, entry in stats.items():
+            if name in self.columns:
+                self.columns[name] = _merge_entry(self.columns[name], entry)
+            else:
+                self.columns[name] = entry
+
+
+# ==============================================================================
+# 4. PUBLIC API
+# ==============================================================================
+
+def build_profile(file_path, chunksize=PROFILE_CHUNKSIZE, workers=PROFILE_WORKERS):
+    """
+    Profiles a CSV, Parquet or Arrow file in fixed-size chunks and returns (head, profile).
+    Memory is bounded by the chunk size, the quantile sample and the top-k capacity,
+    not by the file size.
+    """
+    head = read_head(file_path, 5)
+    profile = _Profile()
+    reader = iter_chunks(file_path, chunksize)
+
+    if workers and workers > 1:
+        # spawn rather than fork: the parent runs crewai/streamlit threads
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            pending = set()
+            for i, chunk in enumerate(reader):
+                # Cap in-flight chunks so a fast reader cannot outrun the workers
+                if len(pending) >= workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        profile.add(future.result())
+                pending.add(pool.submit(_chunk_stats, chunk, i))
+            for future in pending:
+                profile.add(future.result())
+    else:
+        for i, chunk in enumerate(reader):
+            profile.add(_chunk_stats(chunk, i))
+
+    # Keep the file's column order even though chunks may finish out of order
+    profile.columns = {name: profile.columns[name] for name in head.columns if name in profile.columns}
+    annotate(bytes_read=os.path.getsize(file_path), rows=profile.rows, columns=len(profile.columns))
+    return head, profile
+
+
+def profile_file(file_path, chunksize=PROFILE_CHUNKSIZE, workers=PROFILE_WORKERS):
+    """The full head/info/describe text, as `df.head()`, `df.info()` and `df.describe()` would print it."""
+    return format_profile(*build_profile(file_path, chunksize, workers))
+
+
+def format_profile(head, profile):
+    return (
+        f"First 5 rows:\n{head.to_string()}\n\n"
+        f"Data Info:\n{_format_info(profile)}\n\n"
+        f"Description:\n{_format_description(profile)}"
+    )
+
+
+def _format_info(profile):
+    rows = profile.rows
+    names = [str(name) for name in profile.columns]
+    width = max([len("Column")] + [len(name) for name in names])
+    lines = [
+        "<class 'pandas.core.frame.DataFrame'>",
+        f"RangeIndex: {rows} entries, 0 to {rows - 1}" if rows else "RangeIndex: 0 entries",
+        f"Data columns (total {len(names)} columns):",
+        f" #   {'Column'.ljust(width)}  Non-Null Count  Dtype  ",
+        f"---  {'------'.ljust(width)}  --------------  -----  ",
+    ]
+    dtype_counts = {}
+    memory = 132  # RangeIndex overhead, as reported by DataFrame.info
+    for i, (name, entry) in enumerate(zip(names, profile.columns.values())):
+        dtype = str(entry["dtype"])
+        dtype_counts[dtype] = dtype_counts.get(dtype, 0) + 1
+        memory += entry["memory"]
+        non_null = f"{entry['count']} non-null"
+        lines.append(f" {str(i).ljust(3)} {name.ljust(width)}  {non_null.ljust(14)}  {dtype}")
+    lines.append("dtypes: " + ", ".join(f"{d}({n})" for d, n in sorted(dtype_counts.items())))
+    has_object = any(str(e["dtype"]) == "object" for e in profile.columns.values())
+    lines.append(f"memory usage: {_format_bytes(memory, '+' if has_object else '')}")
+    compact = 132 + sum(_compact_bytes(e) for e in profile.columns.values())
+    if compact < memory:
+        lines.append(f"memory usage as read_frame loads it (compact dtypes): ~{_format_bytes(compact)}")
+    return "\n".join(lines) + "\n"
+
+
+def _compact_bytes(entry):
+    """Estimated size of a column with read_frame's compact dtypes, on the same basis as DataFrame.info."""
+    rows = entry["count"] + entry["nulls"]
+    dtype = entry["dtype"]
+    if not isinstance(dtype, np.dtype):
+        # Extension dtypes (category, Int64, string, Arrow, tz-aware) are already compact or nullable
+        return entry["memory"]
+    if dtype.kind in "iu" and entry.get("numeric", {}).get("n"):
+        low, high = entry["numeric"]["min"], entry["numeric"]["max"]
+        for candidate in (np.int8, np.int16, np.int32) if dtype.kind == "i" else (np.uint8, np.uint16, np.uint32):
+            info = np.iinfo(candidate)
+            if info.min <= low and high <= info.max:
+                return rows * info.bits // 8
+    if dtype == object and "top" in entry:
+        # Distinct values are known exactly while the top-k table is not full
+        distinct = len(entry["top"])
+        if (distinct < TOP_K_CAPACITY and distinct <= CATEGORY_MAX_VALUES
+                and distinct <= CATEGORY_MAX_RATIO * max(entry["count"], 1)):
+            return rows * (1 if distinct < 128 else 2)
+    return entry["memory"]
+
+
+def _format_bytes(num, suffix=""):
+    # Same rendering as DataFrame.info, e.g. "2.0+ KB"
+    for unit in ["bytes", "KB", "MB", "GB"]:
+        if num < 1024.0:
+            return f"{num:3.1f}{suffix} {unit}"
+        num /= 1024.0
+    return f"{num:3.1f}{suffix} TB"
+
+
+def _format_description(profile):
+    numeric = {name: e["numeric"] for name, e in profile.columns.items() if "numeric" in e}
+    sections = []
+    if numeric:
+        table = {}
+        for name, s in numeric.items():
+            q25, q50, q75 = (np.quantile(s["sample"], [0.25, 0.5, 0.75])
+                             if s["n"] else (np.nan, np.nan, np.nan))
+            std = np.sqrt(s["m2"] / (s["n"] - 1)) if s["n"] > 1 else np.nan
+            table[name] = [s["n"], s["mean"] if s["n"] else np.nan, std,
+                           s["min"], q25, q50, q75, s["max"]]
+        index = ["count", "mean", "std", "min", "25%", "50%", "75%", "max"]
+        sections.append(pd.DataFrame(table, index=index, dtype=float).to_string())
+
+    categorical = {name: e for name, e in profile.columns.items() if "top" in e}
+    if categorical:
+        table = {}
+        for name, e in categorical.items():
+            top, freq = max(e["top"].items(), key=lambda item: item[1]) if e["top"] else (np.nan, np.nan)
+            unique = len(e["top"])
+            # The counter is bounded, so past its capacity the distinct count is a lower bound
+            table[name] = [e["count"], unique if unique < TOP_K_CAPACITY else f">={unique}", top, freq]
+        sections.append(pd.DataFrame(table, index=["count", "unique", "top", "freq"]).to_string())
+    return "\n\n".join(sections)
+
+
+# ==============================================================================
+# 5. BUDGETED SUMMARY (what agents see)
+# ==============================================================================
+
+# Columns whose names differ only in their digits (feat_001 ... feat_400) and that are
+# all numeric or all text are reported as one line once there are this many of them.
+COLLAPSE_MIN_COLUMNS = 3
+# Columns shown in the first-rows preview of a summary
+PREVIEW_COLUMNS = 8
+TARGET_HINTS = {"target", "label", "churn", "churned", "exited", "outcome", "class", "y"}
+
+
+def _name_tokens(text):
+    words = re.findall(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])|\d+", str(text))
+    # Crude plural folding so "customers" matches "customer_id"
+    return {w[:-1] if len(w) > 3 and w.endswith("s") else w for w in (w.lower() for w in words)}
+
+
+def _relevance(name, entry, request_tokens):
+    tokens = _name_tokens(name)
+    score = 3.0 * len(tokens & request_tokens)
+    if tokens & TARGET_HINTS:
+        score += 2
+    if entry["nulls"]:
+        score += 1  # cleaning has to deal with these
+    numeric = entry.get("numeric")
+    if numeric is not None and numeric["n"] and numeric["min"] == numeric["max"]:
+        score -= 1  # constant
+    if "top" in entry and entry["count"] > 1 and len(entry["top"]) >= min(entry["count"], TOP_K_CAPACITY):
+        score -= 1  # identifier-like text, every value distinct
+    return score
+
+
+def _column_units(profile):
+    """Groups similar columns; returns [(label, [names])] in file order."""
+    groups = {}
+    for name, entry in profile.columns.items():
+        kind = "numeric" if "numeric" in entry else "text"
+        groups.setdefault((re.sub(r"\d+", "#", str(name)), kind), []).append(name)
+    units = []
+    for (pattern, _), names in groups.items():
+        if len(names) >= COLLAPSE_MIN_COLUMNS:
+            units.append((f"{pattern} ({len(names)} columns: {names[0]} ... {names[-1]})", names))
+        else:
+            units.extend((str(name), [name]) for name in names)
+    return units
+
+
+def _fmt(value):
+    return f"{value:.4g}" if isinstance(value, (int, float, np.number)) else str(value)
+
+
+def _span(values):
+    low, high = min(values), max(values)
+    return _fmt(low) if low == high else f"{_fmt(low)} to {_fmt(high)}"
+
+
+def _describe_unit(label, entries):
+    dtypes = sorted({str(e["dtype"]) for e in entries})
+    nulls = [e["nulls"] for e in entries]
+    parts = [label, "/".join(dtypes), f"nulls {_span(nulls)}"]
+    numeric = [e["numeric"] for e in entries if "numeric" in e and e["numeric"]["n"]]
+    if numeric:
+        if len(entries) == 1:
+            s = numeric[0]
+            std = np.sqrt(s["m2"] / (s["n"] - 1)) if s["n"] > 1 else np.nan
+            parts.append(f"mean {_fmt(s['mean'])}, std {_fmt(std)}, min {_fmt(s['min'])}, "
+                         f"median {_fmt(np.quantile(s['sample'], 0.5))}, max {_fmt(s['max'])}")
+        else:
+            parts.append(f"means {_span([s['mean'] for s in numeric])}, "
+                         f"min {_fmt(min(s['min'] for s in numeric))}, max {_fmt(max(s['max'] for s in numeric))}")
+    tops = [e["top"] for e in entries if "top" in e]
+    if tops:
+        uniques = [len(t) for t in tops]
+        if len(entries) == 1 and tops[0]:
+            value, freq = max(tops[0].items(), key=lambda item: item[1])
+            parts.append(f"{uniques[0]} unique, top {value!r} ({freq})")
+        else:
+            parts.append(f"unique {_span(uniques)}")
+    return " | ".join(parts)
+
+
+def summarize_profile(head, profile, request="", budget=TOOL_TOKEN_BUDGET, full_text_name=None):
+    """
+    A profile that fits in `budget` tokens however wide the table is: similar columns are
+    collapsed, units are ranked by relevance to the request and the least relevant are
+    dropped, with a pointer to the full profile (full_text_name) for the rest.
+    """
+    request_tokens = _name_tokens(request)
+    order = {name: i for i, name in enumerate(profile.columns)}
+    units = []
+    for label, names in _column_units(profile):
+        entries = [profile.columns[name] for name in names]
+        score = max(_relevance(name, profile.columns[name], request_tokens) for name in names)
+        units.append((-score, order[names[0]], label, names, entries))
+    units.sort(key=lambda unit: unit[:2])
+
+    memory = sum(e["memory"] for e in profile.columns.values())
+    lines = [
+        f"Dataset: {profile.rows} rows x {len(profile.columns)} columns, {_format_bytes(memory)} in memory.",
+        "Columns, most relevant to the request first (name | dtype | nulls | statistics):",
+    ]
+    footer = (f"Full head/info/describe for every column: '{full_text_name}' (use Read File Page)."
+              if full_text_name else "")
+    used = estimate_tokens("\n".join(lines + [footer])) + 40
+    shown = []
+    for _, _, label, names, entries in units:
+        line = _describe_unit(label, entries)
+        cost = estimate_tokens(line) + 1
+        if used + cost > budget:
+            break
+        lines.append(line)
+        shown.append(names)
+        used += cost
+    omitted = units[len(shown):]
+    if omitted:
+        lines.append(f"... {sum(len(u[3]) for u in omitted)} less relevant columns omitted.")
+
+    singles = [names[0] for names in shown if len(names) == 1][:PREVIEW_COLUMNS]
+    if singles:
+        preview = f"First rows of the top columns:\n{head[singles].head(3).to_string()}"
+        if used + estimate_tokens(preview) <= budget:
+            lines.append(preview)
+    if footer:
+        lines.append(footer)
+    return "\n".join(lines)
+
+
+def profile_for_prompt(file_path, request="", budget=TOOL_TOKEN_BUDGET, base_dir=None):
+    """
+    What the Inspect CSV tools return: the full profile when it fits in `budget`, otherwise
+    a summary, with the full text spilled to a file the agent can page through.
+    """
+    head, profile = build_profile(file_path)
+    full = format_profile(head, profile)
+    if estimate_tokens(full) <= budget:
+        return full
+    path = spill(full, spill_path(base_dir, "profile_" + re.sub(r"\W+", "_", os.path.basename(str(file_path)))))
+    return summarize_profile(head, profile, request, budget, display_name(path, base_dir))
@@ -0,0 +1,247 @@
+import ast
+import json
+import os
+import time
+import numpy as np
+import pandas as pd
+from data_io import FrameWriter, iter_chunks, map_chunks, read_frame, write_frame
+from kernel import call_limits, get_pool, limit_worker
+from profiler import TARGET_HINTS
+from tracing import annotate
+
+# ==============================================================================
+# 1. CONFIGURATION
+# ==============================================================================
+
+# In sample mode the Data Engineer experiments on a small stratified sample of the
+# upload and hands in a clean(df) function, which is then run over the full file in
+# parallel chunks. Agent iteration time no longer grows with the data.
+DATA_SAMPLE = "data_sample.parquet"
+SAMPLE_ROWS = int(os.getenv("SAMPLE_ROWS", 5_000))
+SCALE_CHUNKSIZE = int(os.getenv("SCALE_CHUNKSIZE", 200_000))
+SCALE_WORKERS = int(os.getenv("SCALE_WORKERS", os.cpu_count() or 1))
+SAMPLE_CHUNKSIZE = 100_000
+# Columns with at most this many distinct values can be stratified on
+MAX_STRATA = 50
+# Every stratum keeps at least this many rows (or all of them), so rare classes show up
+MIN_PER_STRATUM = 20
+
+TRANSFORM_NAME = "clean"
+# Calls and names that would make clean(df) depend on or change anything besides its input.
+# The check catches honest mistakes, not evasion: clean(df) itself only ever runs in
+# limited worker processes (see verify_in_worker and _clean_chunk).
+FORBIDDEN_NAMES = {"open", "exec", "eval", "compile", "__import__", "input", "globals", "setattr", "delattr"}
+FORBIDDEN_MODULES = {"os", "sys", "subprocess", "shutil", "socket", "pathlib", "requests", "urllib", "pickle"}
+FORBIDDEN_METHOD_PREFIXES = ("to_", "read_")
+ALLOWED_METHODS = {"to_numeric", "to_datetime", "to_timedelta", "to_numpy", "to_dict", "to_list", "to_period",
+                   "to_timestamp", "to_frame", "to_string"}
+
+
+class TransformError(ValueError):
+    """Cleaning code that cannot be run chunk by chunk over the full file."""
+
+
+# ==============================================================================
+# 2. STRATIFIED SAMPLE
+# ==============================================================================
+
+def _stratify_column(chunk):
+    """A low-cardinality target-like column, if the file has one."""
+    for name in chunk.columns:
+        if str(name).lower() in TARGET_HINTS and chunk[name].nunique(dropna=False) <= MAX_STRATA:
+            return name
+    return None
+
+
+def sample_frame(src, rows=SAMPLE_ROWS, stratify=None, chunksize=SAMPLE_CHUNKSIZE, seed=0):
+    """
+    Streams src once and returns (rows in the file, a sample of about `rows` rows),
+    stratified on `stratify` (by default a target-like column such as 'churn' or 'exited').
+    Strata are sampled in proportion to their size, with at least MIN_PER_STRATUM rows
+    each. Rows keep their file order; memory stays bounded by the sample size and one chunk.
+    """
+    rng = np.random.default_rng(seed)
+    kept = {}  # stratum -> its `rows` lowest-keyed rows so far
+    counts = {}
+    total = 0
+    for chunk in iter_chunks(src, chunksize):
+        if stratify is None and total == 0:
+            stratify = _stratify_column(chunk)
+        chunk = chunk.set_axis(pd.RangeIndex(total, total + len(chunk)))
+        total += len(chunk)
+        chunk["__key"] = rng.random(len(chunk))
+        groups = chunk.groupby(stratify, dropna=False, sort=False) if stratify is not None else [(None, chunk)]
+        for stratum, group in groups:
+            counts[stratum] = counts.get(stratum, 0) + len(group)
+            if stratum in kept:
+                group = pd.concat([kept[stratum], group])
+            kept[stratum] = group.nsmallest(rows, "__key")
+        if len(kept) > MAX_STRATA:
+            raise ValueError(f"Column {stratify!r} has more than {MAX_STRATA} values; pick another to stratify on.")
+
+    quotas = {s: min(n, max(MIN_PER_STRATUM, round(rows * n / max(total, 1)))) for s, n in counts.items()}
+    parts = [kept[s].nsmallest(quotas[s], "__key") for s in kept]
+    sample = (pd.concat(parts).sort_index().drop(columns="__key").reset_index(drop=True)
+              if parts else pd.DataFrame())
+    annotate(rows_in=total, rows_out=len(sample), stratify=str(stratify))
+    return total, sample
+
+
+def write_sample(src, dest, rows=SAMPLE_ROWS, stratify=None, chunksize=SAMPLE_CHUNKSIZE, seed=0):
+    """Writes sample_frame() to dest. Returns (rows in the file, rows in the sample)."""
+    total, sample = sample_frame(src, rows, stratify, chunksize, seed)
+    write_frame(sample, dest)
+    return total, len(sample)
+
+
+# ==============================================================================
+# 3. CHECKING THE TRANSFORM
+# ==============================================================================
+
+def check_transform(code):
+    """
+    Statically checks that code only defines clean(df): imports, constants and functions
+    at the top level, and no file, network or process access anywhere.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        raise TransformError(f"The code does not parse: {e}") from e
+    for node in tree.body:
+        if isinstance(node, (ast.Import, ast.ImportFrom, ast.FunctionDef)):
+            continue
+        if isinstance(node, ast.Assign) and isinstance(node.value, (ast.Constant, ast.Dict, ast.List, ast.Tuple, ast.Set)):
+            continue
+        if isinstance(node, ast.Expr) and isinstance(node.value, ast.Constant):
+            continue  # docstring
+        raise TransformError(f"Line {node.lineno}: only imports, constants and function definitions are "
+                             "allowed at the top level; do the work inside clean(df).")
+    functions = {node.name: node for node in tree.body if isinstance(node, ast.FunctionDef)}
+    if TRANSFORM_NAME not in functions or len(functions[TRANSFORM_NAME].args.args) != 1:
+        raise TransformError(f"Define `def {TRANSFORM_NAME}(df):` returning the cleaned DataFrame.")
+
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Global, ast.Nonlocal)):
+            raise TransformError(f"Line {node.lineno}: global state is not allowed.")
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            modules = [alias.name for alias in node.names] if isinstance(node, ast.Import) else [node.module or ""]
+            bad = [m for m in modules if m.split(".")[0] in FORBIDDEN_MODULES]
+            if bad:
+                raise TransformError(f"Line {node.lineno}: importing {bad} is not allowed.")
+        if isinstance(node, ast.Name) and node.id in FORBIDDEN_NAMES:
+            raise TransformError(f"Line {node.lineno}: {node.id}() is not allowed.")
+        if (isinstance(node, ast.Attribute) and node.attr.startswith(FORBIDDEN_METHOD_PREFIXES)
+                and node.attr not in ALLOWED_METHODS):
+            raise TransformError(f"Line {node.lineno}: .{node.attr}() reads or writes files; "
+                                 "clean(df) must only transform its input.")
+
+
+def load_transform(code):
+    namespace = {"__name__": "clean_transform", "pd": pd, "np": np}
+    exec(compile(code, "<clean>", "exec"), namespace)
+    return namespace[TRANSFORM_NAME]
+
+
+def verify_transform(code, sample):
+    """
+    Runs clean(df) on the sample to check it returns a DataFrame, leaves its input alone,
+    is deterministic, and gives the same rows when the sample is split into two chunks,
+    which is what running it chunk by chunk over the full file relies on.
+    Returns the cleaned sample.
+    """
+    check_transform(code)
+    clean = load_transform(code)
+    original = sample.copy()
+    try:
+        result = clean(sample)
+    except Exception as e:
+        raise TransformError(f"clean(df) failed on the sample: {e}") from e
+    if not isinstance(result, pd.DataFrame):
+        raise TransformError(f"clean(df) returned {type(result).__name__}, not a DataFrame.")
+    if not sample.equals(original):
+        raise TransformError("clean(df) modified its input in place; work on df.copy().")
+    if not _same(clean(original.copy()), result):
+        raise TransformError("clean(df) gives different results on the same input; fix any random seeds.")
+    half = len(original) // 2
+    parts = [clean(original.iloc[:half].copy()), clean(original.iloc[half:].copy())]
+    if not _same(pd.concat(parts), result):
+        raise TransformError("clean(df) gives different results when the data is split into chunks. "
+                             "Steps that need the whole file (dedupe, imputing with a median, outlier "
+                             "fences) belong in a Clean Data plan; keep clean(df) row by row, or use "
+                             "constants computed from the sample.")
+    return result
+
+
+def _verify_file(code, sample_path):
+    """Runs in a kernel worker: verify_transform() on the sample file, reported as a JSON line."""
+    cleaned = verify_transform(code, read_frame(sample_path, dtypes="default"))
+    return json.dumps({"rows": len(cleaned), "columns": len(cleaned.columns)})
+
+
+def verify_in_worker(code, sample_path):
+    """
+    verify_transform() in a worker of the shared kernel pool, under its timeout and memory
+    and CPU limits, so agent code never runs in this process. Returns (rows, columns) of
+    the cleaned sample; raises TransformError if the code fails the checks.
+    """
+    # Obvious problems are reported without a round-trip to a worker
+    check_transform(code)
+    sample_path = os.path.abspath(sample_path)
+    driver = f"from sample_mode import _verify_file\nprint(_verify_file({code!r}, {sample_path!r}))"
+    result = get_pool().execute(driver, os.path.dirname(sample_path))
+    if result["error"]:
+        raise TransformError(result["error"])
+    # clean(df) may print too; the report is the last line
+    report = json.loads(result["stdout"].strip().splitlines()[-1])
+    return report["rows"], report["columns"]
+
+
+def _same(a, b):
+    a, b = a.reset_index(drop=True), b.reset_index(drop=True)
+    try:
+        pd.testing.assert_frame_equal(a, b, check_dtype=False, check_index_type=False)
+    except AssertionError:
+        return False
+    return True
+
+
+# ==============================================================================
+# 4. EXECUTION AT SCALE
+# ==============================================================================
+
+def _clean_chunk(code, chunk):
+    """
+    Runs in a limit_worker() process, bounded per chunk like a kernel call; the code is
+    compiled once per chunk, which is cheap next to the chunk.
+    """
+    with call_limits():
+        return load_transform(code)(chunk)
+
+
+def apply_transform(code, sample_path, src, dest, workers=SCALE_WORKERS, chunksize=SCALE_CHUNKSIZE):
+    """
+    Verifies clean(df) on the sample, then applies it to every chunk of src in a pool of
+    spawned workers with the kernel's limits, and appends the results to dest in file
+    order as they complete. Returns a short report.
+    """
+    start = time.perf_counter()
+    # The sample is read with default dtypes, as the full file's chunks will have them
+    sample_rows, sample_columns = verify_in_worker(code, sample_path)
+    rows_in = 0
+
+    def chunks():
+        nonlocal rows_in
+        for chunk in iter_chunks(src, chunksize):
+            rows_in += len(chunk)
+            yield chunk
+
+    with FrameWriter(dest) as writer:
+        for cleaned in map_chunks(_clean_chunk, chunks(), workers, code, initializer=limit_worker):
+            writer.write(cleaned)
+        rows_out = writer.rows
+
+    seconds = time.perf_counter() - start
+    annotate(rows_in=rows_in, rows_out=rows_out, workers=workers)
+    return (f"clean(df) passed on the {sample_rows}-row sample and was applied to the full file: "
+            f"{rows_in} rows -> {rows_out} rows, {sample_columns} columns, in {seconds:.2f}s "
+            f"with {max(workers or 1, 1)} worker(s); saved to '{os.path.basename(str(dest))}'.")
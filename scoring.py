@@ -0,0 +1,116 @@
+import argparse
+import os
+import sys
+import time
+from data_io import FrameWriter, iter_chunks, map_chunks
+from model_registry import ModelRegistry, MODEL_REGISTRY_DIR
+
+# ==============================================================================
+# 1. CONFIGURATION
+# ==============================================================================
+
+# Scoring runs saved models only: no crew, no LLM calls
+PREDICTIONS_PATH = "predictions.parquet"
+SCORE_CHUNKSIZE = int(os.getenv("SCORE_CHUNKSIZE", 200_000))
+SCORE_WORKERS = int(os.getenv("SCORE_WORKERS", os.cpu_count() or 1))
+
+# Models loaded by this (worker) process, by file path
+_loaded = {}
+
+
+# ==============================================================================
+# 2. PER-CHUNK SCORING
+# ==============================================================================
+
+def _load(model_path, single_threaded):
+    if model_path not in _loaded:
+        import joblib
+
+        saved = joblib.load(model_path)
+        model = saved["model"]
+        if single_threaded and hasattr(model, "n_jobs"):
+            # Parallelism comes from the worker processes; threads per worker would oversubscribe
+            model.n_jobs = 1
+        _loaded[model_path] = (model, saved["encoder"])
+    return _loaded[model_path]
+
+
+def _score_chunk(model_path, single_threaded, chunk):
+    """Runs in a worker process; the model is loaded once per process and kept."""
+    import pandas as pd
+    from training import ID_PATTERN
+
+    model, encoder = _load(model_path, single_threaded)
+    X, _ = encoder.transform(chunk, with_target=False)
+    keys = [name for name in chunk.columns if ID_PATTERN.search(str(name))]
+    out = chunk[keys].reset_index(drop=True) if keys else pd.DataFrame({"row": chunk.index.to_numpy()})
+    out["prediction"] = model.predict(X)
+    if encoder.classification and hasattr(model, "predict_proba") and len(model.classes_) == 2:
+        out[f"probability_{model.classes_[1]}"] = model.predict_proba(X)[:, 1]
+    return out
+
+
+# ==============================================================================
+# 3. PUBLIC API
+# ==============================================================================
+
+def score_file(model_id, src, dest=PREDICTIONS_PATH, workers=SCORE_WORKERS, chunksize=SCORE_CHUNKSIZE,
+               registry=None):
+    """
+    Streams src (CSV, Parquet or Arrow) through a saved model in chunks across worker
+    processes and appends the predictions to dest in file order. Each output row carries
+    the input's ID columns (or its row number), the prediction and, for two classes, the
+    probability of the second. Returns a short report.
+    """
+    import pandas as pd
+
+    registry = registry or ModelRegistry()
+    model_id = registry.resolve(model_id)
+    schema = registry.schema(model_id)
+    start = time.perf_counter()
+
+    def chunks():
+        # Number rows across the whole file, so outputs without ID columns can be joined back
+        offset = 0
+        for chunk in iter_chunks(src, chunksize):
+            yield chunk.set_axis(pd.RangeIndex(offset, offset + len(chunk)))
+            offset += len(chunk)
+
+    with FrameWriter(dest) as writer:
+        for scored in map_chunks(_score_chunk, chunks(), workers, registry.model_path(model_id), workers > 1):
+            writer.write(scored)
+        rows = writer.rows
+    seconds = time.perf_counter() - start
+    return (f"Scored {rows} rows with model {model_id} ({schema['kind']}, target '{schema['target']}') "
+            f"in {seconds:.2f}s with {max(workers, 1)} worker(s); predictions saved to '{os.path.basename(str(dest))}'.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score a CSV, Parquet or Arrow file with a model from the registry.")
+    parser.add_argument("input", nargs="?", help="File to score.")
+    parser.add_argument("--model", default="latest", help="Model id (or a unique prefix of one); defaults to the newest model.")
+    parser.add_argument("--output", default=PREDICTIONS_PATH, help="Where predictions are written (.parquet, .arrow or .csv).")
+    parser.add_argument("--workers", type=int, default=SCORE_WORKERS, help="Worker processes.")
+    parser.add_argument("--chunksize", type=int, default=SCORE_CHUNKSIZE, help="Rows per chunk.")
+    parser.add_argument("--registry", default=MODEL_REGISTRY_DIR, help="Model registry directory.")
+    parser.add_argument("--list", action="store_true", help="List the saved models and exit.")
+    args = parser.parse_args(argv)
+
+    registry = ModelRegistry(args.registry)
+    if args.list:
+        for schema in registry.list():
+            print(f"{schema['model_id']}  {schema['kind']:<26} {schema['metric']} {schema['score']:.3f}  "
+                  f"target '{schema['target']}'  trained on {schema['dataset']} ({schema['rows']} rows)")
+        return 0
+    if not args.input:
+        parser.error("input is required unless --list is given")
+    try:
+        print(score_file(args.model, args.input, args.output, max(1, args.workers), args.chunksize, registry))
+    except (KeyError, OSError, ValueError) as e:
+        print(f"Error: {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
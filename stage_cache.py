@@ -0,0 +1,234 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from tracing import traced_kickoff
+
+# ==============================================================================
+# 1. CONFIGURATION
+# ==============================================================================
+
+# STAGE_CACHE=off always re-runs stages. Bump STAGE_CACHE_VERSION when a tool's
+# behaviour changes in a way the crew configuration does not show.
+STAGE_CACHE_MODE = os.getenv("STAGE_CACHE", "on").lower()
+STAGE_CACHE_DIR = os.getenv("STAGE_CACHE_DIR", ".stage_cache")
+STAGE_CACHE_MAX_BYTES = int(os.getenv("STAGE_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+STAGE_CACHE_MAX_AGE = float(os.getenv("STAGE_CACHE_MAX_AGE", 7 * 24 * 3600))
+STAGE_CACHE_VERSION = 1
+# Writes between full scans of the store (see StageCache)
+STAGE_CACHE_SCAN_EVERY = 50
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+class StageResult(str):
+    """A stage's final answer; `cached` tells whether it was replayed from the stage cache."""
+
+    def __new__(cls, text, fingerprint=None, cached=False):
+        result = super().__new__(cls, text)
+        result.fingerprint = fingerprint
+        result.cached = cached
+        return result
+
+
+# ==============================================================================
+# 2. FINGERPRINTS
+# ==============================================================================
+
+_file_hashes = {}
+_file_hashes_lock = threading.Lock()
+
+
+def file_hash(path):
+    """sha256 of a file's content, remembered per (path, size, mtime) so unchanged files are hashed once."""
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _file_hashes_lock:
+        if key in _file_hashes:
+            return _file_hashes[key]
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    with _file_hashes_lock:
+        _file_hashes[key] = digest.hexdigest()
+    return _file_hashes[key]
+
+
+def _llm_signature(llm):
+    return {"model": getattr(llm, "model", str(llm)), "temperature": getattr(llm, "temperature", None)}
+
+
+def crew_signature(crew):
+    """Everything about a crew that reaches the prompts: agents, their models and tools, and the tasks."""
+    return {
+        "agents": [{
+            "role": agent.role,
+            "goal": agent.goal,
+            "backstory": agent.backstory,
+            "llm": _llm_signature(agent.llm),
+            "tools": [{"name": t.name, "description": t.description} for t in agent.tools or []],
+        } for agent in crew.agents],
+        "tasks": [{
+            "description": task.description,
+            "expected_output": task.expected_output,
+            "agent": getattr(task.agent, "role", None),
+            "context": [crew.tasks.index(t) for t in task.context if t in crew.tasks]
+            if isinstance(task.context, list) else None,
+        } for task in crew.tasks],
+        "process": str(crew.process),
+    }
+
+
+def stage_fingerprint(stage, crew, workspace, inputs=()):
+    """Hash of the crew configuration plus the content of every input file the stage reads."""
+    payload = {
+        "version": STAGE_CACHE_VERSION,
+        "stage": stage,
+        "crew": crew_signature(crew),
+        "inputs": {name: file_hash(workspace.path(name)) for name in inputs},
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+# ==============================================================================
+# 3. ARTIFACT STORE
+# ==============================================================================
+
+class StageCache:
+    """
+    Stage results and their output files on local disk, at <path>/<fp[:2]>/<fp>/.
+    Evicts by age, then least recently used, like the LLM response cache, and likewise
+    scans the store only when its running size total crosses max_bytes or every
+    STAGE_CACHE_SCAN_EVERY writes.
+    """
+
+    def __init__(self, path=STAGE_CACHE_DIR, max_bytes=STAGE_CACHE_MAX_BYTES, max_age=STAGE_CACHE_MAX_AGE):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._total = None
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def _entry_path(self, fingerprint):
+        return os.path.join(self.path, fingerprint[:2], fingerprint)
+
+    def restore(self, fingerprint, workspace):
+        """Copies a stored stage's output files into the workspace and returns its result, or None."""
+        entry = self._entry_path(fingerprint)
+        meta_path = os.path.join(entry, "meta.json")
+        try:
+            if time.time() - os.path.getmtime(meta_path) > self.max_age:
+                shutil.rmtree(entry, ignore_errors=True)
+                return None
+            with open(meta_path, "r") as f:
+                meta = json.load(f)
+            for i, name in enumerate(meta["outputs"]):
+                # Copies, not links: agents rewrite files in place, which must never reach the cache
+                shutil.copyfile(os.path.join(entry, f"output_{i}"), workspace.path(name))
+            os.utime(meta_path)
+        except (OSError, ValueError, KeyError):
+            return None
+        return meta["result"]
+
+    def store(self, fingerprint, stage, result, workspace, outputs=()):
+        entry = self._entry_path(fingerprint)
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        # Build the entry in a temp dir and rename it, so readers never see half an entry
+        tmp = tempfile.mkdtemp(dir=os.path.dirname(entry), suffix=".tmp")
+        try:
+            for i, name in enumerate(outputs):
+                shutil.copyfile(workspace.path(name), os.path.join(tmp, f"output_{i}"))
+            with open(os.path.join(tmp, "meta.json"), "w") as f:
+                json.dump({"stage": stage, "created": time.time(), "outputs": list(outputs),
+                           "result": str(result)}, f)
+            os.replace(tmp, entry)
+        except OSError:
+            # Another run stored the same fingerprint first; its entry is just as good
+            shutil.rmtree(tmp, ignore_errors=True)
+        if self._count_write(sum(os.path.getsize(workspace.path(name)) for name in outputs)):
+            self.evict()
+
+    def _count_write(self, size):
+        with self._lock:
+            self._writes += 1
+            if self._total is not None:
+                self._total += size
+            return self._total is None or self._total > self.max_bytes or self._writes % STAGE_CACHE_SCAN_EVERY == 0
+
+    def evict(self):
+        now = time.time()
+        entries = []
+        for shard in _listdir(self.path):
+            for name in _listdir(os.path.join(self.path, shard)):
+                entry = os.path.join(self.path, shard, name)
+                meta_path = os.path.join(entry, "meta.json")
+                try:
+                    mtime = os.path.getmtime(meta_path)
+                    size = sum(os.path.getsize(os.path.join(entry, f)) for f in os.listdir(entry))
+                except OSError:
+                    continue
+                if now - mtime > self.max_age:
+                    shutil.rmtree(entry, ignore_errors=True)
+                else:
+                    entries.append((mtime, size, entry))
+
+        total = sum(size for _, size, _ in entries)
+        # Once over the limit, free a tenth of it, so a full store isn't rescanned on every write
+        target = self.max_bytes if total <= self.max_bytes else 0.9 * self.max_bytes
+        for _, size, entry in sorted(entries):
+            if total <= target:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+        with self._lock:
+            self._total = total
+
+
+def _listdir(path):
+    try:
+        return os.listdir(path)
+    except OSError:
+        return []
+
+
+_cache = None
+
+
+def stage_cache_from_env():
+    global _cache
+    if STAGE_CACHE_MODE == "off":
+        return None
+    if _cache is None:
+        _cache = StageCache()
+    return _cache
+
+
+# ==============================================================================
+# 4. PUBLIC API
+# ==============================================================================
+
+def kickoff_stage(crew, stage, workspace, inputs=(), outputs=(), cache=None):
+    """
+    Runs a stage unless an identical one (same crew configuration, same input file contents)
+    has run before, in which case its result and output files are restored into the workspace.
+    Upstream outputs are inputs of the stages after them, so a change only re-runs what follows it.
+    """
+    cache = cache if cache is not None else stage_cache_from_env()
+    if cache is None:
+        return StageResult(str(traced_kickoff(crew, stage, workspace)))
+
+    fingerprint = stage_fingerprint(stage, crew, workspace, inputs)
+    result = cache.restore(fingerprint, workspace)
+    if result is not None:
+        return StageResult(result, fingerprint, cached=True)
+
+    result = str(traced_kickoff(crew, stage, workspace))
+    # A stage that did not produce its artifacts is a failure; don't let it stick
+    if all(workspace.exists(name) for name in outputs):
+        cache.store(fingerprint, stage, result, workspace, outputs)
+    return StageResult(result, fingerprint)
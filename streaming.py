@@ -0,0 +1,108 @@
+import queue
+import threading
+from contextlib import contextmanager
+
+# ==============================================================================
+# 1. TOKEN FAN-OUT
+# ==============================================================================
+
+# LLMs built with stream=True (init_llms(..., stream=True), or any get_*_crew(..., stream=True))
+# publish every chunk on crewai's event bus. One process-wide handler forwards each chunk to
+# whoever subscribed to the agent that produced it, so concurrent crews never mix output.
+
+
+class StreamHub:
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self._installed = False
+
+    def _install(self):
+        # Imported here: crewai is heavy, and only streaming runs need the handler
+        from crewai.events import LLMStreamChunkEvent, crewai_event_bus
+
+        @crewai_event_bus.on(LLMStreamChunkEvent)
+        def on_chunk(source, event):
+            self.publish(event)
+
+        self._on_chunk = on_chunk
+        self._installed = True
+
+    def subscribe(self, agents, callback):
+        """Sends the chunks of these agents' LLM calls to callback(role, chunk)."""
+        with self._lock:
+            if not self._installed:
+                self._install()
+            for agent in agents:
+                self._subscribers[str(agent.id)] = (agent.role, callback)
+
+    def unsubscribe(self, agents):
+        with self._lock:
+            for agent in agents:
+                self._subscribers.pop(str(agent.id), None)
+
+    def publish(self, event):
+        chunk = getattr(event, "chunk", None)
+        if not chunk:
+            return
+        agent_id = getattr(event, "agent_id", None) or getattr(getattr(event, "from_agent", None), "id", None)
+        with self._lock:
+            subscriber = self._subscribers.get(str(agent_id))
+        if subscriber is not None:
+            role, callback = subscriber
+            callback(role, chunk)
+
+
+hub = StreamHub()
+
+
+@contextmanager
+def streaming(crew, on_chunk):
+    """While active, on_chunk(role, chunk) receives the crew's LLM output as it is generated."""
+    hub.subscribe(crew.agents, on_chunk)
+    try:
+        yield crew
+    finally:
+        hub.unsubscribe(crew.agents)
+
+
+# ==============================================================================
+# 2. GENERATOR INTERFACE
+# ==============================================================================
+
+def iter_kickoff(crew, kickoff=None):
+    """
+    Runs the crew on a background thread and yields ("token", role, chunk) while agents
+    write, ("step", role, text) after each agent step, and finally ("result", "", result).
+    `kickoff(crew)` replaces crew.kickoff(), e.g. stage_cache.kickoff_stage. Errors are
+    raised from the generator.
+    """
+    events = queue.Queue()
+    done = object()
+
+    def on_step(role):
+        def callback(step):
+            events.put(("step", role, str(getattr(step, "result", None) or getattr(step, "output", None)
+                                          or getattr(step, "text", step))))
+        return callback
+
+    for agent in crew.agents:
+        agent.step_callback = on_step(agent.role)
+
+    def run():
+        try:
+            with streaming(crew, lambda role, chunk: events.put(("token", role, chunk))):
+                result = kickoff(crew) if kickoff else crew.kickoff()
+            events.put(("result", "", result))
+        except BaseException as e:
+            events.put(("error", "", e))
+        events.put(done)
+
+    threading.Thread(target=run, name="crew-stream", daemon=True).start()
+    while True:
+        event = events.get()
+        if event is done:
+            return
+        if event[0] == "error":
+            raise event[2]
+        yield event
@@ -0,0 +1,159 @@
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter
+from crewai.llms.base_llm import BaseLLM
+
+# ==============================================================================
+# 1. SCRIPTS
+# ==============================================================================
+
+# A deterministic stand-in for Gemini: every agent follows a fixed script of tool
+# calls, written in crewai's ReAct format, followed by a final answer. Used with
+# LLM_BACKEND=stub for offline runs and benchmarks.
+
+# Requests per minute the stub accepts across all its instances before answering with a
+# 429, like a provider quota; 0 = unlimited. Used to exercise llm_scheduler.
+STUB_QUOTA_RPM = float(os.getenv("STUB_QUOTA_RPM", 0))
+# Length of the quota window in seconds; shorter windows allow proportionally fewer requests
+STUB_QUOTA_WINDOW = float(os.getenv("STUB_QUOTA_WINDOW", 60))
+# Seconds each call takes, like a provider round-trip; 0 answers at once. Makes concurrency
+# between tasks show up in benchmark wall times.
+STUB_LATENCY = float(os.getenv("STUB_LATENCY", 0))
+
+CLEANING_PLAN = json.dumps([{"op": "dedupe"}, {"op": "drop_nulls"}])
+
+
+def _quoted(text):
+    return re.findall(r"'([^'\s]+\.[A-Za-z0-9]+)'", text)
+
+
+def _script(role, task):
+    """Returns the (tool, arguments) steps for an agent working on a task."""
+    names = _quoted(task)
+    if role == "Scrum Master":
+        return [("Save File", {"filename": names[0], "content": "Ticket: DS-1\nScope: churn analysis\nTimeline: 2 sprints\n"})]
+    if role == "Senior Project Manager":
+        return [("Save File", {"filename": names[0], "content": "# Project Plan\n1. Clean data\n2. Train model\n3. Report\n"})]
+    if role == "Data Engineer":
+        src = names[0]
+        dest = next((name for name in names if name.endswith(".parquet")), "cleaned_data.parquet")
+        # Every stage keeps an Execute Python Code step, so benchmarks still cover the kernel path
+        return [("Inspect CSV", {"file_path": src}),
+                ("Clean Data", {"file_path": src, "plan": CLEANING_PLAN, "output_path": dest}),
+                ("Execute Python Code", {"code": f"df = read_frame({dest!r})\n"
+                                                 "print(df.shape, int(df.isna().sum().sum()), 'missing')"})]
+    if role == "Senior Data Scientist":
+        src = names[0]
+        return [("Inspect CSV", {"file_path": src}),
+                ("Execute Python Code", {"code": f"df = read_frame({src!r})\n"
+                                                 "print(df.select_dtypes('number').corr().round(2))"}),
+                ("Train Model", {"file_path": src, "target": ""})]
+    if role == "Presentation Designer":
+        return [("Generate PowerPoint", {"title": "Project Analysis Results",
+                                         "summary": "Churn model trained on the cleaned dataset.",
+                                         "findings": task[-500:]})]
+    return []
+
+
+# ==============================================================================
+# 2. STUB LLM
+# ==============================================================================
+
+class QuotaExceeded(Exception):
+    """Shaped like the provider's quota error: HTTP 429 with a retry hint."""
+
+    status_code = 429
+
+    def __init__(self, retry_after):
+        self.retry_after = retry_after
+        super().__init__(f"429 RESOURCE_EXHAUSTED: quota exceeded. Please retry in {retry_after:.2f}s.")
+
+
+class _Quota:
+    """Sliding window of accepted requests, shared by every stub in the process."""
+
+    def __init__(self, window=STUB_QUOTA_WINDOW):
+        self.window = window
+        self.accepted = []
+        self.lock = threading.Lock()
+        self.rejected = 0
+
+    def check(self, rpm):
+        if not rpm:
+            return
+        with self.lock:
+            now = time.monotonic()
+            self.accepted = [t for t in self.accepted if now - t < self.window]
+            if len(self.accepted) >= max(1, rpm * self.window / 60):
+                self.rejected += 1
+                raise QuotaExceeded(self.window - (now - self.accepted[0]))
+            self.accepted.append(now)
+
+
+quota = _Quota()
+
+
+class ScriptedLLM(BaseLLM):
+    """Replays _script() one step per call; counts calls and tool invocations per role."""
+
+    def __init__(self, model="stub/scripted", temperature=None, quota_rpm=STUB_QUOTA_RPM, stream=False,
+                 latency=STUB_LATENCY, **kwargs):
+        super().__init__(model=model, temperature=temperature, provider="stub", **kwargs)
+        self.quota_rpm = quota_rpm
+        self.latency = latency
+        self.stream = stream
+        self.calls = Counter()
+        self.tool_calls = Counter()
+        self._lock = threading.Lock()
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None,
+             from_task=None, from_agent=None, response_model=None, **kwargs):
+        quota.check(self.quota_rpm)
+        if self.latency:
+            time.sleep(self.latency)
+        response = self._respond(messages)
+        if self.stream:
+            self._emit_chunks(response, from_task, from_agent)
+        return response
+
+    def _emit_chunks(self, response, from_task, from_agent):
+        """Publishes the response word by word, the way streaming provider clients do."""
+        from crewai.events import LLMStreamChunkEvent, crewai_event_bus
+
+        for chunk in re.findall(r"\S+\s*", response):
+            crewai_event_bus.emit(self, event=LLMStreamChunkEvent(chunk=chunk, from_task=from_task, from_agent=from_agent))
+
+    def _respond(self, messages):
+        if isinstance(messages, str):
+            messages = [{"role": "user", "content": messages}]
+        text = "\n".join(str(m.get("content", "")) for m in messages if m.get("role") in ("system", "user"))
+        role_match = re.search(r"You are (.+?)\. ", text)
+        role = role_match.group(1) if role_match else "unknown"
+        task_match = re.search(r"Current Task: (.*)", text, re.S)
+        task = task_match.group(1) if task_match else text
+        step = sum(1 for m in messages if m.get("role") == "assistant")
+
+        with self._lock:
+            self.calls[role] += 1
+        script = _script(role, task)
+        if step < len(script):
+            tool, arguments = script[step]
+            with self._lock:
+                self.tool_calls[tool] += 1
+            return (f"Thought: Next I will use {tool}.\n"
+                    f"Action: {tool}\n"
+                    f"Action Input: {json.dumps(arguments)}")
+
+        # Echo the last observation so the final answer carries the tool's result
+        observations = [m["content"] for m in messages if m.get("role") == "assistant" and "Observation:" in m["content"]]
+        result = observations[-1].split("Observation:", 1)[1].strip() if observations else "Approved. The request has clear business value."
+        return f"Thought: I now know the final answer\nFinal Answer: {result}"
+
+    def supports_function_calling(self):
+        return False
+
+    def get_context_window_size(self):
+        return 1_000_000
@@ -0,0 +1,28 @@
+import json
+import pytest
+from batch_runner import load_manifest
+
+
+def _manifest(tmp_path, *entries):
+    path = tmp_path / "manifest.jsonl"
+    path.write_text("".join(json.dumps(entry) + "\n" for entry in entries))
+    return str(path)
+
+
+def test_entries_get_default_ids(tmp_path):
+    path = _manifest(tmp_path, {"request": "Predict churn", "csv_path": "a.csv"},
+                     {"id": "week-2.v1", "request": "Predict churn", "csv_path": "b.csv"})
+    assert [entry["id"] for entry in load_manifest(path)] == ["request-00001", "week-2.v1"]
+
+
+@pytest.mark.parametrize("entry_id", ["../x", "/tmp/y", "a/b", "..", ".", "x..y", ""])
+def test_ids_that_leave_the_runs_dir_are_rejected(tmp_path, entry_id):
+    path = _manifest(tmp_path, {"id": entry_id, "request": "Predict churn", "csv_path": "a.csv"})
+    with pytest.raises(ValueError, match="entry id"):
+        load_manifest(path)
+
+
+def test_duplicate_ids_are_rejected(tmp_path):
+    entry = {"id": "same", "request": "Predict churn", "csv_path": "a.csv"}
+    with pytest.raises(ValueError, match="duplicate"):
+        load_manifest(_manifest(tmp_path, entry, entry))
@@ -0,0 +1,28 @@
+import time
+from data_io import map_chunks
+
+
+def _slow_first(i):
+    time.sleep(1.0 if i == 0 else 0.01)
+    return i * 10
+
+
+def test_map_chunks_keeps_order_and_bounds_results_behind_a_slow_chunk():
+    read = []
+
+    def chunks():
+        for i in range(30):
+            read.append(i)
+            yield i
+
+    results = []
+    for value in map_chunks(_slow_first, chunks(), 2):
+        if value == 0:
+            # 2 * workers chunks in flight or waiting to be yielded, plus the one being read
+            assert len(read) <= 5
+        results.append(value)
+    assert results == [i * 10 for i in range(30)]
+
+
+def test_map_chunks_in_process():
+    assert list(map_chunks(_slow_first, [1, 2, 3], 1)) == [10, 20, 30]
@@ -0,0 +1,51 @@
+from types import SimpleNamespace
+import pytest
+from intake_cache import IntakeCache, find_intake, intake_decision, terms
+from workspace import JIRA_TICKET, PROJECT_PLAN, Workspace
+
+CHURN_REQUEST = "Build a churn model to see why users leave"
+
+
+@pytest.fixture
+def cache(tmp_path):
+    workspace = Workspace(tmp_path / "run")
+    for name in (JIRA_TICKET, PROJECT_PLAN):
+        (tmp_path / "run" / name).write_text(f"{name} for: {CHURN_REQUEST}")
+    cache = IntakeCache(str(tmp_path / "intake"))
+    cache.put(CHURN_REQUEST, "Approved.", workspace)
+    return cache
+
+
+def test_rewording_of_a_request_is_reused(cache):
+    match = find_intake("predict churn", cache=cache)
+    assert match is not None
+    assert match[1]["request"] == CHURN_REQUEST
+
+
+def test_negated_request_is_not_reused(cache):
+    assert find_intake("do not predict churn, forecast revenue", cache=cache) is None
+
+
+def test_unrelated_request_is_not_reused(cache):
+    assert find_intake("segment stores by weekly footfall", cache=cache) is None
+
+
+def test_synonyms_share_a_term():
+    assert terms("forecast customer attrition") == terms("predict user churn")
+
+
+def test_rejected_intake_is_not_offered(cache, tmp_path):
+    cache.put("Predict churn for the board", "Rejected.", Workspace(tmp_path / "run"), decision="rejected")
+    similarity, entry = cache.match("Predict churn for the board")
+    assert entry["request"] == CHURN_REQUEST
+
+
+@pytest.mark.parametrize("answer, decision", [
+    ("Approved. The request has clear business value.", "approved"),
+    ("Rejected: no business value.", "rejected"),
+    ("The request is not approved until the data owner signs off.", "rejected"),
+    ("Needs more detail.", None),
+])
+def test_intake_decision(answer, decision):
+    crew = SimpleNamespace(tasks=[SimpleNamespace(output=SimpleNamespace(raw=answer))])
+    assert intake_decision(crew) == decision
@@ -0,0 +1,20 @@
+import multiprocessing
+import os
+from kernel import PythonKernel
+
+
+def test_crashed_worker_is_reaped_and_replaced():
+    kernel = PythonKernel(persistent=True)
+    try:
+        kernel.run("x = 1")
+        fds = len(os.listdir("/proc/self/fd")) if os.path.isdir("/proc/self/fd") else None
+        for _ in range(3):
+            assert "process exited" in kernel.run("import os; os._exit(1)")
+        # No zombie workers and no leaked pipe ends after the crashes
+        assert multiprocessing.active_children() == []
+        if fds is not None:
+            assert len(os.listdir("/proc/self/fd")) <= fds
+        output = kernel.run("print(1 + 1)")
+        assert "Started a new kernel session" in output and "2" in output
+    finally:
+        kernel.shutdown()
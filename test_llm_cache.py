@@ -0,0 +1,62 @@
+import os
+import pytest
+from llm_cache import CachedLLM, CacheMissError, LLMCache, cache_key
+from stub_llm import ScriptedLLM
+
+PROMPT = [{"role": "system", "content": "You are Senior Project Manager. "},
+          {"role": "user", "content": "Current Task: Write the plan to 'project_plan.md'."}]
+
+
+def _store_bytes(path):
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, files in os.walk(path) for name in files if name.endswith(".json"))
+
+
+def test_key_ignores_trailing_whitespace_but_not_the_model():
+    padded = [{**message, "content": message["content"] + "  \n"} for message in PROMPT]
+    assert cache_key("gemini/flash", 0.5, PROMPT) == cache_key("gemini/flash", 0.5, padded)
+    assert cache_key("gemini/flash", 0.5, PROMPT) != cache_key("gemini/pro", 0.5, PROMPT)
+    assert cache_key("gemini/flash", 0.5, PROMPT) != cache_key("gemini/flash", 0.7, PROMPT)
+
+
+def test_repeated_prompt_is_served_from_disk(tmp_path):
+    stub = ScriptedLLM()
+    llm = CachedLLM(stub, LLMCache(str(tmp_path)))
+    first = llm.call(PROMPT)
+    assert llm.call(PROMPT) == first
+    assert sum(stub.calls.values()) == 1
+
+
+def test_replay_only_serves_recorded_responses_and_fails_on_a_miss(tmp_path):
+    CachedLLM(ScriptedLLM(), LLMCache(str(tmp_path))).call(PROMPT)
+
+    stub = ScriptedLLM()
+    replay = CachedLLM(stub, LLMCache(str(tmp_path), replay_only=True))
+    assert replay.call(PROMPT)
+    with pytest.raises(CacheMissError):
+        replay.call([{"role": "user", "content": "A prompt nobody recorded"}])
+    assert sum(stub.calls.values()) == 0
+
+
+def test_running_total_tracks_writes_without_rescanning(tmp_path, monkeypatch):
+    cache = LLMCache(str(tmp_path), max_bytes=10_000_000)
+    scans = []
+    evict = cache.evict
+    monkeypatch.setattr(cache, "evict", lambda: scans.append(1) or evict())
+
+    for i in range(20):
+        cache.put(cache_key("m", 0, f"prompt {i}"), "x" * 100)
+    # Only the first write scans, to learn the store's size; the rest add to the total
+    assert len(scans) == 1
+    assert cache._total == _store_bytes(tmp_path)
+
+
+def test_store_over_the_limit_is_trimmed_to_ninety_percent(tmp_path):
+    cache = LLMCache(str(tmp_path), max_bytes=5_000)
+    for i in range(60):
+        cache.put(cache_key("m", 0, f"prompt {i}"), "x" * 200)
+    assert _store_bytes(tmp_path) <= 5_000
+    assert cache._total <= 5_000
+    # The newest entry survives; the oldest ones were dropped
+    assert cache.get(cache_key("m", 0, "prompt 59")) == "x" * 200
+    assert cache.get(cache_key("m", 0, "prompt 0")) is None
@@ -0,0 +1,61 @@
+from llm_router import RouteStats, RoutedLLM, route, validate
+from stub_llm import ScriptedLLM
+
+SYSTEM = {"role": "system", "content": "You are Data Engineer. \nTool Name: Inspect CSV\nTool Name: Clean Data\n"}
+TASK = {"role": "user", "content": "Current Task: Clean 'uploaded_data.csv'."}
+ACTION = 'Thought: Look first.\nAction: Inspect CSV\nAction Input: {"file_path": "uploaded_data.csv"}'
+FINAL = "Thought: I now know the final answer\nFinal Answer: Cleaned."
+
+
+class Canned(ScriptedLLM):
+    """Answers every call with the same text."""
+
+    def __init__(self, response, **kwargs):
+        super().__init__(**kwargs)
+        self.response = response
+        self.answered = 0
+
+    def call(self, messages, *args, **kwargs):
+        self.answered += 1
+        return self.response
+
+
+def test_validate_accepts_a_known_tool_call():
+    assert validate(ACTION, [SYSTEM, TASK]) is None
+
+
+def test_validate_rejects_an_unknown_tool():
+    response = 'Action: Delete Everything\nAction Input: {}'
+    assert validate(response, [SYSTEM, TASK]) == "unknown tool 'Delete Everything'"
+
+
+def test_validate_rejects_a_final_answer_before_any_tool_call():
+    assert validate(FINAL, [SYSTEM, TASK]) == "final answer without a tool call"
+
+
+def test_validate_accepts_a_final_answer_after_a_tool_call():
+    step = {"role": "assistant", "content": f"{ACTION}\nObservation: 2 rows, 2 columns"}
+    assert validate(FINAL, [SYSTEM, TASK, step]) is None
+
+
+def test_validate_rejects_free_text():
+    assert validate("I think the data looks fine.", [SYSTEM, TASK]) == "neither an action nor a final answer"
+
+
+def test_cascade_escalates_an_invalid_fast_answer():
+    fast, strong = Canned(FINAL, model="stub/fast"), Canned(ACTION, model="stub/strong")
+    llm = RoutedLLM(fast, strong, mode="cascade", stats=RouteStats())
+    assert llm.call([SYSTEM, TASK]) == ACTION
+    assert (fast.answered, strong.answered) == (1, 1)
+    assert llm.stats.entries[("Data Engineer", "fast")]["failures"] == 1
+
+
+def test_cascade_keeps_a_valid_fast_answer():
+    fast, strong = Canned(ACTION, model="stub/fast"), Canned(ACTION, model="stub/strong")
+    llm = RoutedLLM(fast, strong, mode="cascade", stats=RouteStats())
+    assert llm.call([SYSTEM, TASK]) == ACTION
+    assert (fast.answered, strong.answered) == (1, 0)
+
+
+def test_static_routing_keeps_the_fixed_assignment():
+    assert route(Canned(ACTION), Canned(ACTION), mode="static") is None
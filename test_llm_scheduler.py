@@ -0,0 +1,146 @@
+import threading
+import time
+import pytest
+import stub_llm
+from llm_scheduler import LLMScheduler, TokenBucket
+
+PROMPT = [{"role": "user", "content": "Current Task: Write the plan to 'project_plan.md'."}]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def test_token_bucket_refills_at_its_rate():
+    clock = FakeClock()
+    bucket = TokenBucket(60, clock, burst=2)
+    assert bucket.wait_time(1) == 0
+    bucket.take(1)
+    bucket.take(1)
+    assert bucket.wait_time(1) == pytest.approx(1.0)
+    clock.now = 0.5
+    assert bucket.wait_time(1) == pytest.approx(0.5)
+    # A request bigger than the bucket waits for a full bucket, not forever
+    assert bucket.wait_time(10) == pytest.approx(1.5)
+
+
+def test_token_bucket_without_a_limit_never_waits():
+    bucket = TokenBucket(0)
+    bucket.take(1_000)
+    assert bucket.wait_time(1_000) == 0
+
+
+def test_request_rate_is_enforced():
+    scheduler = LLMScheduler(rpm=600, tpm=0, burst=1)
+    start = time.monotonic()
+    for _ in range(4):
+        scheduler.call(lambda: "ok")
+    # One request back to back, then one every 0.1s
+    assert time.monotonic() - start >= 0.28
+
+
+def test_concurrency_is_capped():
+    scheduler = LLMScheduler(rpm=0, tpm=0, max_concurrency=2)
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    def work():
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.05)
+        with lock:
+            active[0] -= 1
+
+    threads = [threading.Thread(target=scheduler.call, args=(work,)) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert peak[0] == 2
+    assert scheduler.stats["calls"] == 6
+
+
+def test_interactive_calls_are_admitted_before_batch():
+    scheduler = LLMScheduler(rpm=0, tpm=0, max_concurrency=1)
+    release = threading.Event()
+    order = []
+    blocker = threading.Thread(target=scheduler.call, args=(release.wait,))
+    blocker.start()
+    _wait_for(lambda: scheduler._active == 1)
+
+    threads = []
+    for name, priority in [("batch-1", "batch"), ("batch-2", "batch"), ("interactive", "interactive")]:
+        thread = threading.Thread(target=scheduler.call, args=(lambda name=name: order.append(name), priority))
+        thread.start()
+        threads.append(thread)
+        # Queue them in this order, so only priority can put the interactive call first
+        _wait_for(lambda n=len(threads): len(scheduler._queue) == n)
+    release.set()
+    for thread in [blocker] + threads:
+        thread.join()
+    assert order == ["interactive", "batch-1", "batch-2"]
+
+
+def test_quota_error_pauses_every_caller_and_is_retried(monkeypatch):
+    # The stub accepts one request per 0.3s window and answers the rest with a 429
+    monkeypatch.setattr(stub_llm, "quota", stub_llm._Quota(window=0.3))
+    llm = stub_llm.ScriptedLLM(quota_rpm=200)
+    scheduler = LLMScheduler(rpm=0, tpm=0, max_retries=6, retry_base=0.05, retry_max=1.0)
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(scheduler.call(lambda: llm.call(PROMPT))))
+               for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(results) == 3
+    assert stub_llm.quota.rejected >= 1
+    assert scheduler.stats["rate_limited"] == stub_llm.quota.rejected
+    assert scheduler.stats["retries"] >= 1
+
+
+def test_pause_holds_back_callers_that_did_not_hit_the_quota():
+    scheduler = LLMScheduler(rpm=0, tpm=0, retry_base=0.2, retry_max=0.2)
+    scheduler._back_off(0, hint=0.2)
+    start = time.monotonic()
+    scheduler.call(lambda: "ok", "interactive")
+    assert time.monotonic() - start >= 0.15
+
+
+def test_back_off_is_jittered_and_honours_retry_after():
+    clock = FakeClock()
+    scheduler = LLMScheduler(rpm=0, tpm=0, retry_base=1.0, retry_max=60.0, clock=clock)
+    delays = {scheduler._back_off(3) for _ in range(20)}
+    assert all(4.0 <= delay <= 8.0 for delay in delays)
+    assert len(delays) > 1
+    # The provider's retry hint wins over a shorter backoff, and pauses the whole scheduler
+    assert scheduler._back_off(0, hint=30.0) == 30.0
+    assert scheduler._paused_until == pytest.approx(30.0)
+
+
+def test_other_errors_are_not_retried():
+    scheduler = LLMScheduler(rpm=0, tpm=0, retry_base=0.01)
+    calls = []
+
+    def fail():
+        calls.append(1)
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        scheduler.call(fail)
+    assert len(calls) == 1
+    assert scheduler._active == 0
@@ -2,28 +2,46 @@ import os
 import sys
 from dotenv import load_dotenv
 from crew_modules import get_intake_crew, get_data_crew, get_analysis_crew, get_reporting_crew
+from data_io import CLEANED_DATA_PATH, CLEANED_CSV_PATH, export_csv
+from workspace import Workspace, JIRA_TICKET, PROJECT_PLAN, PRESENTATION
+from stage_cache import kickoff_stage
+from code_cache import kickoff_recipe
+from intake_cache import kickoff_intake
 
 # Load environment variables
 load_dotenv()
 api_key = os.getenv("GOOGLE_API_KEY")
 
-if not api_key:
+if not api_key and os.getenv("LLM_CACHE", "on").lower() != "replay" and os.getenv("LLM_BACKEND", "gemini").lower() != "stub":
     print("Error: GOOGLE_API_KEY not found in .env")
     sys.exit(1)
 
 def run_test():
+    # Each run writes into its own workspace, so several test runs can share a host
+    workspace = Workspace.create()
+    # PYTHON_KERNEL=1 shares one persistent Python session across the data and analysis stages
+    kernel = workspace.kernel() if os.getenv("PYTHON_KERNEL") == "1" else None
+    # SAMPLE_ROWS=5000 has the Data Engineer plan on a stratified sample and clean the full file at the end
+    sample_rows = int(os.getenv("SAMPLE_ROWS", 0)) or None
+    try:
+        _run_stages(workspace, kernel, sample_rows)
+    finally:
+        workspace.close()
+
+def _run_stages(workspace, kernel, sample_rows=None):
     print("==================================================")
     print("🧪 STARTING PIPELINE TEST")
+    print(f"   Workspace: {workspace.root}")
     print("==================================================")
 
     # 1. INTAKE
     print("\n[1/4] Testing Intake Crew...")
     request = "Analyze the churn data to identify why customers are leaving and predict future churn."
     try:
-        crew = get_intake_crew(api_key, request)
-        crew.kickoff()
-        if os.path.exists("jira_ticket.txt") and os.path.exists("project_plan.md"):
-            print("✅ Intake Successful: jira_ticket.txt and project_plan.md created.")
+        crew = get_intake_crew(api_key, request, workspace=workspace)
+        kickoff_intake(crew, workspace, request, outputs=[JIRA_TICKET, PROJECT_PLAN])
+        if workspace.exists(JIRA_TICKET) and workspace.exists(PROJECT_PLAN):
+            print(f"✅ Intake Successful: {JIRA_TICKET} and {PROJECT_PLAN} created.")
         else:
             print("❌ Intake Failed: Missing output files.")
             return
@@ -37,14 +55,17 @@ def run_test():
     if not os.path.exists(csv_path):
         print(f"❌ Error: {csv_path} not found.")
         return
-        
+    workspace.import_file(csv_path)
+
     try:
-        crew = get_data_crew(api_key, csv_path, request)
-        crew.kickoff()
-        if os.path.exists("cleaned_data.csv"):
-            print("✅ Data Engineering Successful: cleaned_data.csv created.")
+        crew = get_data_crew(api_key, csv_path, request, kernel=kernel, workspace=workspace,
+                             sample_rows=sample_rows)
+        kickoff_recipe(crew, "data", workspace, inputs=[csv_path], outputs=[CLEANED_DATA_PATH], request=request)
+        if workspace.exists(CLEANED_DATA_PATH):
+            print(f"✅ Data Engineering Successful: {CLEANED_DATA_PATH} created.")
+            export_csv(workspace.path(CLEANED_DATA_PATH), workspace.path(CLEANED_CSV_PATH))
         else:
-            print("❌ Data Engineering Failed: cleaned_data.csv not created.")
+            print(f"❌ Data Engineering Failed: {CLEANED_DATA_PATH} not created.")
             return
     except Exception as e:
         print(f"❌ Data Engineering Error: {e}")
@@ -54,8 +75,8 @@ def run_test():
     print("\n[3/4] Testing Analysis Crew...")
     analysis_result = ""
     try:
-        crew = get_analysis_crew(api_key, "cleaned_data.csv", request)
-        result = crew.kickoff()
+        crew = get_analysis_crew(api_key, CLEANED_DATA_PATH, request, kernel=kernel, workspace=workspace)
+        result = kickoff_recipe(crew, "analysis", workspace, inputs=[CLEANED_DATA_PATH], request=request)
         analysis_result = str(result)
         print("✅ Analysis Successful.")
         print(f"   Result Snippet: {analysis_result[:100]}...")
@@ -66,12 +87,12 @@ def run_test():
     # 4. REPORTING
     print("\n[4/4] Testing Reporting Crew...")
     try:
-        crew = get_reporting_crew(api_key, analysis_result)
-        crew.kickoff()
-        if os.path.exists("churn_presentation.pptx"):
-            print("✅ Reporting Successful: churn_presentation.pptx created.")
+        crew = get_reporting_crew(api_key, analysis_result, workspace=workspace)
+        kickoff_stage(crew, "reporting", workspace, outputs=[PRESENTATION])
+        if workspace.exists(PRESENTATION):
+            print(f"✅ Reporting Successful: {PRESENTATION} created.")
         else:
-            print("❌ Reporting Failed: churn_presentation.pptx not created.")
+            print(f"❌ Reporting Failed: {PRESENTATION} not created.")
             return
     except Exception as e:
         print(f"❌ Reporting Error: {e}")
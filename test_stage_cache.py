@@ -0,0 +1,55 @@
+from types import SimpleNamespace
+import pytest
+from stage_cache import StageCache, stage_fingerprint
+from workspace import Workspace
+
+
+def _crew(description="Clean 'uploaded_data.csv'."):
+    agent = SimpleNamespace(role="Data Engineer", goal="Clean data.", backstory="Careful.", tools=[],
+                            llm=SimpleNamespace(model="gemini/flash", temperature=0.5))
+    task = SimpleNamespace(description=description, expected_output="Cleaned file.", agent=agent, context=None)
+    return SimpleNamespace(agents=[agent], tasks=[task], process="sequential")
+
+
+@pytest.fixture
+def workspace(tmp_path):
+    workspace = Workspace(tmp_path / "run")
+    (tmp_path / "run" / "uploaded_data.csv").write_text("id,age\n1,34\n2,51\n")
+    return workspace
+
+
+def test_fingerprint_is_stable_for_the_same_crew_and_inputs(workspace):
+    crew = _crew()
+    assert (stage_fingerprint("data", crew, workspace, ["uploaded_data.csv"])
+            == stage_fingerprint("data", _crew(), workspace, ["uploaded_data.csv"]))
+
+
+def test_fingerprint_changes_with_the_input_file(workspace, tmp_path):
+    before = stage_fingerprint("data", _crew(), workspace, ["uploaded_data.csv"])
+    (tmp_path / "run" / "uploaded_data.csv").write_text("id,age\n1,34\n2,52\n3,40\n")
+    assert stage_fingerprint("data", _crew(), workspace, ["uploaded_data.csv"]) != before
+
+
+def test_fingerprint_changes_with_the_crew(workspace):
+    before = stage_fingerprint("data", _crew(), workspace, ["uploaded_data.csv"])
+    assert stage_fingerprint("data", _crew("Clean it differently."), workspace, ["uploaded_data.csv"]) != before
+
+
+def test_stored_stage_is_restored_into_another_workspace(workspace, tmp_path):
+    cache = StageCache(str(tmp_path / "cache"))
+    cache.store("ab" * 32, "data", "Cleaned 2 rows.", workspace, ["uploaded_data.csv"])
+
+    other = Workspace(tmp_path / "other")
+    assert cache.restore("ab" * 32, other) == "Cleaned 2 rows."
+    assert other.read_text("uploaded_data.csv") == workspace.read_text("uploaded_data.csv")
+    assert cache.restore("cd" * 32, other) is None
+
+
+def test_store_keeps_a_running_total_and_trims_when_full(workspace, tmp_path):
+    (tmp_path / "run" / "big.bin").write_bytes(b"x" * 1_000)
+    cache = StageCache(str(tmp_path / "cache"), max_bytes=5_000)
+    for i in range(10):
+        cache.store(f"{i:02d}" * 32, "data", "done", workspace, ["big.bin"])
+    assert cache._total <= 5_000
+    assert cache.restore("09" * 32, Workspace(tmp_path / "other")) == "done"
+    assert cache.restore("00" * 32, Workspace(tmp_path / "other")) is None
@@ -0,0 +1,36 @@
+import os
+import pytest
+import token_budget
+from token_budget import SPILL_DIR, fit, read_page
+from workspace import Workspace
+
+
+def test_long_output_is_cut_and_spilled_for_paging(tmp_path):
+    text = "\n".join(f"row {i}: " + "x" * 80 for i in range(2_000))
+    short = fit(text, 500, "python", str(tmp_path))
+    assert token_budget.estimate_tokens(short) <= 500
+    [name] = os.listdir(tmp_path / SPILL_DIR)
+    assert f"'{SPILL_DIR}/{name}'" in short
+    assert read_page(str(tmp_path / SPILL_DIR / name), 1).startswith("Page 1 of ")
+
+
+def test_spill_files_are_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(token_budget, "SPILL_MAX_FILES", 5)
+    for _ in range(12):
+        fit("x" * 10_000, 100, "python", str(tmp_path))
+    assert len(os.listdir(tmp_path / SPILL_DIR)) == 5
+
+
+def test_closing_a_workspace_removes_its_spills(tmp_path):
+    workspace = Workspace(tmp_path / "run")
+    fit("x" * 10_000, 100, "python", workspace.root)
+    workspace.close()
+    assert not (tmp_path / "run" / SPILL_DIR).exists()
+
+
+@pytest.mark.parametrize("name", ["/etc/passwd", "../secret.txt", "tool_outputs/../../secret.txt"])
+def test_agents_can_only_page_files_in_their_workspace(tmp_path, name):
+    (tmp_path / "secret.txt").write_text("password")
+    workspace = Workspace(tmp_path / "run")
+    with pytest.raises(ValueError, match="workspace"):
+        workspace.confined_path(name)
@@ -0,0 +1,20 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.model_selection import train_test_split
+from training import RANDOM_STATE, TEST_SIZE, _train_in_memory
+
+
+def test_encoder_is_fitted_on_training_rows_only():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"balance": rng.exponential(50_000, 200),
+                       "plan": rng.choice(["basic", "plus"], 200),
+                       "exited": rng.integers(0, 2, 200)})
+    train, _ = train_test_split(df, test_size=TEST_SIZE, random_state=RANDOM_STATE, stratify=df["exited"])
+
+    encoder, model, score, *_ = _train_in_memory(df, "exited", candidates=1, n_jobs=1)
+    assert encoder.rows == len(train)
+    # Fill values and scaling come from the training rows, not the held-out ones
+    assert encoder.fill["balance"] == pytest.approx(train["balance"].median(), rel=1e-6)
+    assert encoder.mean["balance"] == pytest.approx(train["balance"].mean(), rel=1e-6)
+    assert 0.0 <= score <= 1.0
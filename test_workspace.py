@@ -0,0 +1,58 @@
+import io
+import os
+import stat
+import pytest
+from workspace import Workspace, resolve_data_file, spool_upload
+
+
+def test_identical_uploads_are_stored_once(tmp_path):
+    store = str(tmp_path / "uploads")
+    first = spool_upload(io.BytesIO(b"id,age\n1,34\n"), ".csv", store)
+    second = spool_upload(io.BytesIO(b"id,age\n1,34\n"), ".csv", store)
+    other = spool_upload(io.BytesIO(b"id,age\n2,51\n"), ".csv", store)
+
+    assert first == second != other
+    assert sorted(os.listdir(store)) == sorted([os.path.basename(first), os.path.basename(other)])
+    with open(first, "rb") as f:
+        assert f.read() == b"id,age\n1,34\n"
+
+
+def test_uploads_are_linked_into_each_workspace_read_only(tmp_path):
+    store = str(tmp_path / "uploads")
+    for run in ("a", "b"):
+        workspace = Workspace(tmp_path / run)
+        workspace.import_file(spool_upload(io.BytesIO(b"id\n1\n"), ".csv", store), "uploaded_data.csv")
+        assert workspace.read_text("uploaded_data.csv") == "id\n1\n"
+    stored = os.path.join(store, os.listdir(store)[0])
+    assert os.stat(stored).st_nlink == 3
+    assert stat.S_IMODE(os.stat(stored).st_mode) == 0o444
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    root = tmp_path / "data"
+    (root / "extracts").mkdir(parents=True)
+    (root / "extracts" / "week1.csv").write_text("id\n1\n")
+    (tmp_path / "secret.txt").write_text("password")
+    return root
+
+
+def test_resolve_data_file_finds_files_inside_the_data_dir(data_dir):
+    assert resolve_data_file("extracts/week1.csv", str(data_dir)) == os.path.realpath(data_dir / "extracts" / "week1.csv")
+
+
+@pytest.mark.parametrize("name", ["../secret.txt", "extracts/../../secret.txt", "/etc/passwd", "extracts", "missing.csv"])
+def test_resolve_data_file_rejects_paths_outside_the_data_dir(data_dir, name):
+    with pytest.raises(ValueError):
+        resolve_data_file(name, str(data_dir))
+
+
+def test_resolve_data_file_rejects_symlinks_out_of_the_data_dir(data_dir, tmp_path):
+    os.symlink(tmp_path / "secret.txt", data_dir / "link.csv")
+    with pytest.raises(ValueError):
+        resolve_data_file("link.csv", str(data_dir))
+
+
+def test_resolve_data_file_is_disabled_without_a_data_dir():
+    with pytest.raises(ValueError, match="DATA_DIR"):
+        resolve_data_file("week1.csv", "")
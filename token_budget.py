@@ -0,0 +1,119 @@
+import os
+import itertools
+import shutil
+
+# ==============================================================================
+# 1. CONFIGURATION
+# ==============================================================================
+
+# Tool results and stage hand-offs are re-sent to the LLM on every reasoning step,
+# so each one is capped. Whatever does not fit is spilled to a file the agent can
+# page through with the Read File Page tool.
+TOOL_TOKEN_BUDGET = int(os.getenv("TOOL_TOKEN_BUDGET", 2_000))
+HANDOFF_TOKEN_BUDGET = int(os.getenv("HANDOFF_TOKEN_BUDGET", 1_000))
+PAGE_TOKENS = int(os.getenv("PAGE_TOKENS", 2_000))
+SPILL_DIR = "tool_outputs"
+# Spilled results kept per directory; the oldest go first. Workspaces also drop theirs on close.
+SPILL_MAX_FILES = int(os.getenv("SPILL_MAX_FILES", 100))
+
+# Rough but provider-independent: about 4 characters per token for English and tables
+CHARS_PER_TOKEN = 4
+
+_spill_ids = itertools.count(1)
+
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+# ==============================================================================
+# 2. SPILLING
+# ==============================================================================
+
+def spill_path(base_dir, prefix):
+    """A fresh file name under <base_dir>/tool_outputs for one spilled result."""
+    directory = os.path.join(base_dir or os.getcwd(), SPILL_DIR)
+    os.makedirs(directory, exist_ok=True)
+    _prune(directory, SPILL_MAX_FILES - 1)
+    return os.path.join(directory, f"{prefix}_{os.getpid()}_{next(_spill_ids)}.txt")
+
+
+def _prune(directory, keep):
+    files = []
+    for name in os.listdir(directory):
+        try:
+            files.append((os.path.getmtime(os.path.join(directory, name)), name))
+        except OSError:
+            continue
+    for _, name in sorted(files)[:max(0, len(files) - keep)]:
+        try:
+            os.remove(os.path.join(directory, name))
+        except OSError:
+            pass
+
+
+def clear_spills(base_dir):
+    """Removes every spilled result under base_dir, once nothing will page through them."""
+    shutil.rmtree(os.path.join(base_dir, SPILL_DIR), ignore_errors=True)
+
+
+def spill(text, path):
+    with open(path, "w") as f:
+        f.write(text)
+    return path
+
+
+def display_name(path, base_dir=None):
+    """The name an agent should pass back to Read File Page: relative to its workspace."""
+    if base_dir:
+        relative = os.path.relpath(path, base_dir)
+        if not relative.startswith(os.pardir):
+            return relative
+    return path
+
+
+def fit(text, budget, prefix=None, base_dir=None):
+    """
+    Returns text unchanged when it fits in `budget` tokens. Otherwise keeps the head and
+    tail and, when a spill prefix is given, writes the full text under base_dir and says
+    where to read the rest.
+    """
+    if estimate_tokens(text) <= budget:
+        return text
+    if prefix is not None:
+        path = spill(text, spill_path(base_dir, prefix))
+        note = (f"\n... [{estimate_tokens(text)} tokens truncated to fit the budget; full text in "
+                f"'{display_name(path, base_dir)}', {page_count(text)} pages, readable with Read File Page] ...\n")
+    else:
+        note = f"\n... [{estimate_tokens(text)} tokens truncated to fit the budget] ...\n"
+    keep = max(0, budget * CHARS_PER_TOKEN - len(note))
+    head = text[: keep * 3 // 4]
+    tail = text[len(text) - keep // 4:] if keep // 4 else ""
+    return head + note + tail
+
+
+# ==============================================================================
+# 3. PAGING
+# ==============================================================================
+
+def page_count(text, page_tokens=PAGE_TOKENS):
+    return max(1, -(-len(text) // (page_tokens * CHARS_PER_TOKEN)))
+
+
+def read_page(path, page=1, page_tokens=PAGE_TOKENS):
+    """Returns one page (1-based) of a text file, cut on line boundaries where possible."""
+    with open(path, "r") as f:
+        text = f.read()
+    pages = page_count(text, page_tokens)
+    page = min(max(1, int(page)), pages)
+    size = page_tokens * CHARS_PER_TOKEN
+    start, end = _boundary(text, (page - 1) * size, size), _boundary(text, page * size, size)
+    return f"Page {page} of {pages} of '{os.path.basename(path)}':\n{text[start:end]}"
+
+
+def _boundary(text, pos, size):
+    # Snap to a line start within the last half page so table rows are not split
+    if pos <= 0 or pos >= len(text):
+        return min(max(pos, 0), len(text))
+    newline = text.rfind("\n", pos - size // 2, pos)
+    return newline + 1 if newline >= 0 else pos
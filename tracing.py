@@ -0,0 +1,238 @@
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+from token_budget import estimate_tokens
+
+# ==============================================================================
+# 1. CONFIGURATION
+# ==============================================================================
+
+# TRACING=off disables span recording. Spans go to TRACE_FILE in the run workspace as
+# JSON lines whose fields follow the OpenTelemetry span model (trace/span/parent ids,
+# unix-nano timestamps, status, attributes), so they can be converted for any OTel backend.
+TRACING = os.getenv("TRACING", "on").lower() != "off"
+TRACE_FILE = os.getenv("TRACE_FILE", "trace.jsonl")
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+def peak_rss_mb():
+    """This process's peak resident memory in MB, or None where the platform can't tell (Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1)
+
+
+# ==============================================================================
+# 2. SPANS AND SINK
+# ==============================================================================
+
+class Span:
+    def __init__(self, tracer, name, kind, parent_id, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.kind = kind
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attributes = dict(attributes)
+        self.start_ns = time.time_ns()
+        self.status = "ok"
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def record(self, end_ns=None, start_ns=None):
+        return {
+            "trace_id": self.tracer.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start_time_unix_nano": start_ns or self.start_ns,
+            "end_time_unix_nano": end_ns or time.time_ns(),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class JsonlSink:
+    """Appends one span per line; safe to share between the threads of a crew."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def write(self, record):
+        line = json.dumps(record, default=str) + "\n"
+        with self._lock, open(self.path, "a") as f:
+            f.write(line)
+
+
+def annotate(**attributes):
+    """Adds attributes (bytes read, rows, child process memory...) to the active span, if any."""
+    span = _current_span.get()
+    if span is not None:
+        span.set(**attributes)
+
+
+# ==============================================================================
+# 3. TRACER
+# ==============================================================================
+
+class Tracer:
+    """
+    One trace per stage kickoff. The stage span is the root; task spans hang off it and
+    LLM/tool spans hang off the task their agent is working on.
+    """
+
+    def __init__(self, sink, stage):
+        self.sink = sink
+        self.trace_id = uuid.uuid4().hex
+        self.root = Span(self, stage, "stage", None, {"stage": stage})
+        self._tasks = []
+        self._task_spans = {}
+        # crewai starts async tasks on fresh threads, which do not inherit contextvars,
+        # so each thread remembers the task it last made an LLM call for
+        self._thread_task = threading.local()
+
+    @contextmanager
+    def span(self, name, kind, parent=None, **attributes):
+        if parent is None:
+            current = _current_span.get()
+            if current is not None and current.tracer is self and current is not self.root:
+                parent = current
+            else:
+                parent = getattr(self._thread_task, "span", None) or self.root
+        span = Span(self, name, kind, parent.span_id, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except Exception as e:
+            span.status = "error"
+            span.set(error=str(e))
+            raise
+        finally:
+            _current_span.reset(token)
+            span.set(peak_rss_mb=peak_rss_mb())
+            self.sink.write(span.record())
+
+    def task_span(self, task):
+        span = self._task_spans.get(id(task))
+        if span is None:
+            role = getattr(task.agent, "role", "")
+            span = self._task_spans[id(task)] = Span(self, f"task: {role}", "task", self.root.span_id, {
+                "agent": role, "description": task.description.strip()[:200]})
+        return span
+
+    def enter_task(self, task):
+        if task is not None:
+            self._thread_task.span = self.task_span(task)
+
+    def instrument(self, crew):
+        # Imported here: llm_cache pulls in crewai, which kernel workers importing annotate() must not pay for
+        from llm_cache import TracedLLM
+
+        self._tasks = list(crew.tasks)
+        for agent in crew.agents:
+            agent.llm = TracedLLM(agent.llm, self, agent.role)
+            agent.tools = [self.traced_tool(t, agent.role) for t in agent.tools or []]
+        for task in self._tasks:
+            self.task_span(task)
+            # Tasks take a copy of their agent's tools when they are built, and crewai prefers those
+            role = getattr(task.agent, "role", "")
+            task.tools = [self.traced_tool(t, role) for t in task.tools or []]
+        return self
+
+    def traced_tool(self, tool, role):
+        func = getattr(tool, "func", None)
+        if func is None:
+            return tool
+
+        def traced(*args, **kwargs):
+            with self.span(f"tool: {tool.name}", "tool", agent=role, tool=tool.name,
+                           input_bytes=len(json.dumps(kwargs, default=str))) as span:
+                result = func(*args, **kwargs)
+                span.set(output_tokens_est=estimate_tokens(str(result)))
+                return result
+
+        # Tools may be shared between crews (TeamTools), so the crew gets its own copy
+        return tool.model_copy(update={"func": traced})
+
+    def close(self, error=None):
+        for task in self._tasks:
+            if task.start_time is None:
+                continue  # never reached
+            span = self.task_span(task)
+            if task.output is None:
+                span.status = "error"
+            end_ns = _ns(task.end_time) if task.end_time else time.time_ns()
+            self.sink.write(span.record(start_ns=_ns(task.start_time), end_ns=end_ns))
+        if error is not None:
+            self.root.status = "error"
+            self.root.set(error=str(error))
+        self.root.set(peak_rss_mb=peak_rss_mb())
+        self.sink.write(self.root.record())
+
+
+def _ns(moment):
+    return int(moment.timestamp() * 1e9)
+
+
+# ==============================================================================
+# 4. PUBLIC API
+# ==============================================================================
+
+@contextmanager
+def _traced_kickoff(crew, path, stage):
+    tracer = Tracer(JsonlSink(path), stage).instrument(crew)
+    token = _current_span.set(tracer.root)
+    try:
+        yield tracer
+    except Exception as e:
+        tracer.close(error=e)
+        raise
+    else:
+        tracer.close()
+    finally:
+        _current_span.reset(token)
+
+
+def instrument(crew, path, stage):
+    """
+    Context manager around crew.kickoff() that records the stage, its tasks, every LLM call
+    and every tool call to the JSONL file at `path`. A no-op when path is None or TRACING=off.
+    """
+    if not TRACING or path is None:
+        return nullcontext()
+    return _traced_kickoff(crew, path, stage)
+
+
+def traced_kickoff(crew, stage, workspace=None):
+    """crew.kickoff(), with spans appended to the workspace's trace file."""
+    path = workspace.path(TRACE_FILE) if workspace is not None else None
+    with instrument(crew, path, stage):
+        return crew.kickoff()
+
+
+def load_spans(path):
+    """Reads a trace file back as a list of span dicts, skipping any partially written line."""
+    spans = []
+    try:
+        with open(path, "r") as f:
+            for line in f:
+                try:
+                    spans.append(json.loads(line))
+                except ValueError:
+                    continue
+    except OSError:
+        pass
+    return spans
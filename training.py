@@ -0,0 +1,375 @@
+import math
+import os
+import re
+import time
+import numpy as np
+import pandas as pd
+from data_io import iter_chunks, memory_note, read_frame
+from model_registry import model_id, registry_from_env
+from profiler import TARGET_HINTS, merge_numeric, merge_top, numeric_stats
+from stage_cache import file_hash
+from tracing import annotate
+
+# ==============================================================================
+# 1. CONFIGURATION
+# ==============================================================================
+
+# Files whose estimated in-memory size is above this are trained out of core
+TRAIN_MEMORY_BYTES = int(os.getenv("TRAIN_MEMORY_BYTES", 2 * 1024 ** 3))
+# In-memory size relative to the file size; rough, but errs on the side of streaming
+MEMORY_FACTOR = 4
+TRAIN_CHUNKSIZE = int(os.getenv("TRAIN_CHUNKSIZE", 100_000))
+# Hyperparameter configurations tried per search; unpromising ones are dropped early
+TRAIN_CANDIDATES = int(os.getenv("TRAIN_CANDIDATES", 12))
+# Parallel jobs for the search; -1 uses every core
+TRAIN_JOBS = int(os.getenv("TRAIN_JOBS", -1))
+# Passes over the data for out-of-core learners; the best third survives each pass
+TRAIN_EPOCHS = int(os.getenv("TRAIN_EPOCHS", 3))
+HALVING_FACTOR = 3
+TEST_SIZE = 0.3
+# Training sets smaller than this skip the search and fit the default forest
+SEARCH_MIN_ROWS = 300
+# One-hot columns per text feature; rarer values share an "other" column
+MAX_CATEGORIES = 20
+# A numeric target with at most this many distinct integer values is treated as classes
+MAX_CLASSES = 20
+TOP_FEATURES = 10
+RANDOM_STATE = 42
+
+FOREST_SPACE = {
+    "n_estimators": [50, 100, 200, 400],
+    "max_depth": [None, 8, 16, 32],
+    "min_samples_leaf": [1, 2, 5, 10],
+    "max_features": ["sqrt", 0.5, 1.0],
+}
+SGD_SPACE = {
+    "alpha": [1e-6, 1e-5, 1e-4, 1e-3, 1e-2],
+    "penalty": ["l2", "elasticnet"],
+}
+
+ID_PATTERN = re.compile(r"(^|[_\s])id$|Id$|ID$")
+
+
+def _is_numeric(col):
+    return pd.api.types.is_numeric_dtype(col) and not pd.api.types.is_bool_dtype(col)
+
+
+def pick_target(columns, target=None):
+    """The given target, else the first target-like column ('churn', 'exited', ...), else the last column."""
+    columns = list(columns)
+    if target:
+        if target not in columns:
+            raise ValueError(f"Target column {target!r} not found; columns are {columns}")
+        return target
+    for name in columns:
+        if str(name).lower() in TARGET_HINTS:
+            return name
+    return columns[-1]
+
+
+# ==============================================================================
+# 2. FEATURE ENCODING
+# ==============================================================================
+
+class FeatureEncoder:
+    """
+    Turns frames into a numeric feature matrix with one fixed layout: numeric columns are
+    median-filled and standardized, text columns are one-hot encoded on their most frequent
+    values. Fitted chunk by chunk, so the same encoder serves in-memory and out-of-core training.
+    """
+
+    def __init__(self, target):
+        self.target = target
+        self.numeric = {}
+        self.text = {}
+        self.target_counts = {}
+        self.rows = 0
+        self.chunks = 0
+
+    def fit(self, chunk):
+        rng = np.random.default_rng(self.chunks)
+        self.chunks += 1
+        self.rows += len(chunk)
+        for name in chunk.columns:
+            col = _as_feature(chunk[name])
+            values = col.dropna()
+            if name == self.target:
+                self.target_counts = merge_top(self.target_counts, values.value_counts().to_dict())
+            elif _is_numeric(col):
+                stats = numeric_stats(values.to_numpy(dtype=float), rng)
+                self.numeric[name] = merge_numeric(self.numeric[name], stats) if name in self.numeric else stats
+            else:
+                self.text[name] = merge_top(self.text.get(name, {}), values.astype(str).value_counts().to_dict())
+        return self
+
+    def finish(self):
+        classes = list(self.target_counts)
+        self.classification = (
+            not all(isinstance(c, (int, float, np.number)) and not isinstance(c, (bool, np.bool_)) for c in classes)
+            or (len(classes) <= MAX_CLASSES and all(float(c).is_integer() for c in classes))
+        )
+        self.classes = np.array(sorted(classes, key=str)) if self.classification else None
+
+        self.columns = []
+        for name in list(self.numeric) + list(self.text):
+            if name in self.columns or _id_like(name, self.text.get(name), self.numeric.get(name)):
+                continue
+            self.columns.append(name)
+        self.fill, self.mean, self.scale, self.vocab = {}, {}, {}, {}
+        names = []
+        for name in self.columns:
+            stats, counts = self.numeric.get(name), self.text.get(name, {})
+            # A column that parses as numbers in most chunks is numeric; stray text becomes missing
+            if stats is not None and stats["n"] >= sum(counts.values()):
+                self.fill[name] = float(np.quantile(stats["sample"], 0.5)) if stats["n"] else 0.0
+                self.mean[name] = stats["mean"] if stats["n"] else 0.0
+                std = math.sqrt(stats["m2"] / (stats["n"] - 1)) if stats["n"] > 1 else 0.0
+                self.scale[name] = std or 1.0
+                names.append(str(name))
+            else:
+                top = sorted(counts.items(), key=lambda item: -item[1])[:MAX_CATEGORIES]
+                self.vocab[name] = [value for value, _ in top]
+                names += [f"{name}={value}" for value in self.vocab[name]] + [f"{name}=other"]
+        self.feature_names = names
+        # The per-column statistics are only needed to fit; keep the saved encoder small
+        self.numeric, self.text = {}, {}
+        return self
+
+    def transform(self, chunk, with_target=True):
+        """
+        Returns (X, y) for one frame; rows without a usable target value are dropped.
+        With with_target=False (scoring) every row is kept and y is None.
+        """
+        y = None
+        if with_target and self.target in chunk.columns:
+            y = _as_feature(chunk[self.target])
+            if not self.classification:
+                y = pd.to_numeric(y, errors="coerce")
+            chunk, y = chunk[y.notna()], y[y.notna()]
+            y = y.to_numpy() if self.classification else y.to_numpy(dtype=float)
+        parts = []
+        for name in self.columns:
+            col = _as_feature(chunk[name]) if name in chunk.columns else pd.Series(np.nan, index=chunk.index)
+            if name in self.fill:
+                values = pd.to_numeric(col, errors="coerce").astype(float).fillna(self.fill[name]).to_numpy()
+                parts.append(((values - self.mean[name]) / self.scale[name])[:, None])
+            else:
+                text = col.astype(str).where(col.notna(), None)
+                codes = pd.Categorical(text, categories=self.vocab[name]).codes
+                onehot = np.zeros((len(chunk), len(self.vocab[name]) + 1))
+                onehot[np.arange(len(chunk)), np.where(codes < 0, len(self.vocab[name]), codes)] = 1.0
+                parts.append(onehot)
+        X = np.hstack(parts) if parts else np.zeros((len(chunk), 0))
+        return X, y
+
+
+def _as_feature(col):
+    if pd.api.types.is_datetime64_any_dtype(col):
+        # Dates become days since the epoch
+        return (col - pd.Timestamp(0, tz=getattr(col.dt, "tz", None))).dt.days.astype("float64")
+    if pd.api.types.is_bool_dtype(col):
+        return col.astype("float64")
+    return col
+
+
+def _id_like(name, counts, stats):
+    if ID_PATTERN.search(str(name)):
+        return True
+    # Text where nearly every value is distinct carries no signal for one-hot features
+    return counts is not None and stats is None and len(counts) > MAX_CATEGORIES and \
+        len(counts) >= 0.9 * sum(counts.values())
+
+
+# ==============================================================================
+# 3. IN-MEMORY: FOREST WITH SUCCESSIVE-HALVING SEARCH
+# ==============================================================================
+
+def _train_in_memory(df, target, candidates, n_jobs):
+    from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+    from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+    from sklearn.model_selection import HalvingRandomSearchCV, train_test_split
+
+    # Split before fitting the encoder, so the test rows' medians, scales and category
+    # counts never reach the features the model is scored on
+    labels = _as_feature(df[target])
+    counts = labels.value_counts()
+    stratify = labels if labels.notna().all() and 1 < len(counts) <= MAX_CLASSES and counts.min() > 1 else None
+    train, test = train_test_split(df, test_size=TEST_SIZE, random_state=RANDOM_STATE, stratify=stratify)
+    encoder = FeatureEncoder(target).fit(train).finish()
+    X_train, y_train = encoder.transform(train)
+    X_test, y_test = encoder.transform(test)
+    forest = (RandomForestClassifier if encoder.classification else RandomForestRegressor)(random_state=RANDOM_STATE)
+
+    if len(X_train) < SEARCH_MIN_ROWS or candidates <= 1:
+        model = forest.set_params(n_estimators=100, n_jobs=n_jobs).fit(X_train, y_train)
+        search_note = "default forest, no search (small data)"
+        params = {}
+    else:
+        # Candidates are cross-validated on growing row subsets; only the best third of
+        # each round moves on, so poor settings never see the full training set
+        search = HalvingRandomSearchCV(forest, FOREST_SPACE, n_candidates=candidates, factor=HALVING_FACTOR,
+                                       resource="n_samples", cv=3, n_jobs=n_jobs, random_state=RANDOM_STATE,
+                                       refit=False)
+        search.fit(X_train, y_train)
+        params = search.best_params_
+        model = forest.set_params(n_jobs=n_jobs, **params).fit(X_train, y_train)
+        search_note = f"{candidates} settings searched by successive halving"
+    return encoder, model, model.score(X_test, y_test), model.feature_importances_, params, search_note
+
+
+# ==============================================================================
+# 4. OUT OF CORE: PARTIAL_FIT LEARNERS OVER CHUNKS
+# ==============================================================================
+
+def _configs(candidates):
+    from sklearn.model_selection import ParameterSampler
+
+    space_size = len(SGD_SPACE["alpha"]) * len(SGD_SPACE["penalty"])
+    return list(ParameterSampler(SGD_SPACE, n_iter=min(candidates, space_size), random_state=RANDOM_STATE))
+
+
+def _split(chunk_index, n):
+    # Fixed per chunk (over its raw rows), so the encoder and every epoch hold out the same rows
+    return np.random.default_rng(chunk_index).random(n) < TEST_SIZE
+
+
+def _train_out_of_core(path, target, candidates, n_jobs, chunksize):
+    from joblib import Parallel, delayed
+    from sklearn.linear_model import SGDClassifier, SGDRegressor
+
+    # Only the training rows of each chunk shape the encoder, as in memory
+    encoder = FeatureEncoder(target)
+    for chunk_index, chunk in enumerate(iter_chunks(path, chunksize)):
+        encoder.fit(chunk[~_split(chunk_index, len(chunk))])
+    encoder.finish()
+
+    def make(params):
+        if encoder.classification:
+            return SGDClassifier(loss="log_loss", random_state=RANDOM_STATE, **params)
+        return SGDRegressor(random_state=RANDOM_STATE, **params)
+
+    configs = _configs(candidates)
+    models = [make(params) for params in configs]
+    alive = list(range(len(models)))
+    kwargs = {"classes": encoder.classes} if encoder.classification else {}
+    scores = {}
+    with Parallel(n_jobs=n_jobs, prefer="threads") as parallel:
+        for epoch in range(max(1, TRAIN_EPOCHS)):
+            hits = {i: 0.0 for i in alive}
+            tested = 0
+            for chunk_index, chunk in enumerate(iter_chunks(path, chunksize)):
+                test = _split(chunk_index, len(chunk))
+                if epoch > 0 and test.any():
+                    # Held-out rows are scored with the models as they stand; they are never trained on
+                    X, y = encoder.transform(chunk[test])
+                    if len(y):
+                        for i in alive:
+                            hits[i] += models[i].score(X, y) * len(y)
+                        tested += len(y)
+                X, y = encoder.transform(chunk[~test])
+                if len(y):
+                    parallel(delayed(models[i].partial_fit)(X, y, **kwargs) for i in alive)
+            if epoch == 0:
+                continue
+            scores = {i: hits[i] / max(tested, 1) for i in alive}
+            if epoch < TRAIN_EPOCHS - 1:
+                keep = max(1, math.ceil(len(alive) / HALVING_FACTOR))
+                alive = sorted(alive, key=lambda i: -scores[i])[:keep]
+
+    if not scores:
+        # A single epoch gives no held-out scores yet; score every config once
+        scores = _score_out_of_core(path, encoder, [models[i] for i in alive], chunksize)
+        scores = dict(zip(alive, scores))
+    best = max(alive, key=lambda i: scores[i])
+    model = models[best]
+    coef = np.abs(np.atleast_2d(model.coef_)).mean(axis=0)
+    importances = coef / coef.sum() if coef.sum() else coef
+    note = f"{len(configs)} settings, the best third kept after each of {TRAIN_EPOCHS} passes over the data"
+    return encoder, model, scores[best], importances, configs[best], note
+
+
+def _score_out_of_core(path, encoder, models, chunksize):
+    totals, tested = [0.0] * len(models), 0
+    for chunk_index, chunk in enumerate(iter_chunks(path, chunksize)):
+        X, y = encoder.transform(chunk[_split(chunk_index, len(chunk))])
+        if len(y):
+            for i, model in enumerate(models):
+                totals[i] += model.score(X, y) * len(y)
+            tested += len(y)
+    return [total / max(tested, 1) for total in totals]
+
+
+# ==============================================================================
+# 5. PUBLIC API
+# ==============================================================================
+
+def fits_in_memory(path, limit=TRAIN_MEMORY_BYTES):
+    return os.path.getsize(path) * MEMORY_FACTOR <= limit
+
+
+def _config(target, candidates, out_of_core, chunksize):
+    config = {"target": target, "candidates": candidates, "out_of_core": out_of_core,
+              "test_size": TEST_SIZE, "max_categories": MAX_CATEGORIES}
+    if out_of_core:
+        # Chunk boundaries decide the held-out rows
+        config.update(chunksize=chunksize, epochs=TRAIN_EPOCHS, space=SGD_SPACE)
+    else:
+        config.update(space=FOREST_SPACE)
+    return config
+
+
+def train_model(path, target=None, candidates=TRAIN_CANDIDATES, n_jobs=TRAIN_JOBS,
+                chunksize=TRAIN_CHUNKSIZE, out_of_core=None, registry=None):
+    """
+    Trains a model on a CSV, Parquet or Arrow file and reports the held-out score and the
+    most important features. Files that fit in memory get a random forest tuned by
+    successive halving across every core; larger ones are streamed through partial_fit
+    linear models, tuned the same way over passes of the data.
+    The model is saved to the registry under an id derived from the file's content and
+    the training config; training the same file the same way again reuses it.
+    """
+    start = time.perf_counter()
+    head = next(iter_chunks(path, 5), None)
+    if head is None or head.empty:
+        raise ValueError(f"'{os.path.basename(str(path))}' has no rows")
+    target = pick_target(head.columns, target)
+    if out_of_core is None:
+        out_of_core = not fits_in_memory(path)
+
+    registry = registry if registry is not None else registry_from_env()
+    config = _config(target, candidates, out_of_core, chunksize)
+    key = model_id(file_hash(path), config)
+    if registry is not None and registry.exists(key):
+        annotate(model_id=key, reused=True)
+        registry.touch(key)
+        return f"{registry.schema(key)['report']} (Reused from the model registry.)"
+
+    if out_of_core:
+        encoder, model, score, importances, params, note = _train_out_of_core(path, target, candidates, n_jobs, chunksize)
+        kind = "SGD classifier" if encoder.classification else "SGD regressor"
+    else:
+        df = read_frame(path)
+        encoder, model, score, importances, params, note = _train_in_memory(df, target, candidates, n_jobs)
+        kind = "Random Forest classifier" if encoder.classification else "Random Forest regressor"
+        note = f"{note}; data loaded as {memory_note(df)}"
+        del df
+
+    ranked = sorted(zip(encoder.feature_names, importances), key=lambda item: -item[1])[:TOP_FEATURES]
+    importances = {name: round(float(value), 3) for name, value in ranked}
+    metric = "Accuracy" if encoder.classification else "R2"
+    seconds = time.perf_counter() - start
+    report = (f"Model Trained ({kind} on {encoder.rows} training rows, target '{target}'; {note}; "
+              f"best params {params}; {seconds:.1f}s). {metric}: {score:.2f}. "
+              f"Feature Importance (top {len(importances)}): {importances}")
+    if registry is not None:
+        registry.save(key, model, encoder, {
+            "kind": kind, "target": target, "classification": encoder.classification,
+            "classes": None if encoder.classes is None else [str(c) for c in encoder.classes],
+            "columns": [str(c) for c in encoder.columns], "features": encoder.feature_names,
+            "metric": metric, "score": float(score), "params": params, "config": config,
+            "dataset": os.path.basename(str(path)), "rows": encoder.rows,
+            "report": f"{report} Model id: {key}.",
+        })
+        report += f" Model id: {key}."
+    annotate(rows=encoder.rows, features=len(encoder.feature_names), out_of_core=out_of_core, score=score, model_id=key)
+    return report
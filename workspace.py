@@ -0,0 +1,171 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from kernel import PooledKernel, get_kernel, shutdown_kernel
+from token_budget import clear_spills
+
+# ==============================================================================
+# 1. ARTIFACT NAMES
+# ==============================================================================
+
+# Names are relative to a run's workspace, so prompts stay identical between runs
+# (and keep hitting the LLM cache) while files never collide.
+JIRA_TICKET = "jira_ticket.txt"
+PROJECT_PLAN = "project_plan.md"
+UPLOADED_DATA = "uploaded_data.csv"
+PRESENTATION = "churn_presentation.pptx"
+
+WORKSPACE_ROOT = os.getenv("WORKSPACE_ROOT", "runs")
+
+# Uploads are stored once per content hash and hard-linked into each run's workspace
+UPLOAD_STORE = os.getenv("UPLOAD_STORE", ".uploads")
+UPLOAD_MAX_AGE = float(os.getenv("UPLOAD_MAX_AGE", 7 * 24 * 3600))
+UPLOAD_BLOCK_SIZE = 8 * 1024 * 1024
+# Server directory whose files app users may load by name, for files too large to upload;
+# unset, only uploads are accepted
+DATA_DIR = os.getenv("DATA_DIR", "")
+
+
+# ==============================================================================
+# 2. UPLOAD STORE
+# ==============================================================================
+
+def spool_upload(fileobj, suffix="", store=UPLOAD_STORE):
+    """
+    Copies a file-like object to disk block by block, hashing as it goes, and files it
+    under its sha256 in `store`. Content already in the store is kept and the copy dropped.
+    Returns the stored path.
+    """
+    os.makedirs(store, exist_ok=True)
+    _evict_uploads(store)
+    if hasattr(fileobj, "seek"):
+        fileobj.seek(0)
+    digest = hashlib.sha256()
+    fd, tmp = tempfile.mkstemp(dir=store, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            for block in iter(lambda: fileobj.read(UPLOAD_BLOCK_SIZE), b""):
+                digest.update(block)
+                out.write(block)
+        path = os.path.join(store, digest.hexdigest() + suffix)
+        if os.path.exists(path):
+            os.remove(tmp)
+            os.utime(path)
+        else:
+            # Workspaces hard-link this file; read-only keeps an agent's in-place write from reaching other runs
+            os.chmod(tmp, 0o444)
+            os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return path
+
+
+def resolve_inside(name, directory, label="the data directory"):
+    """
+    The real path of file `name` inside directory. Raises ValueError for anything that
+    resolves outside it (absolute paths elsewhere, "..", symlinks).
+    """
+    root = os.path.realpath(directory)
+    path = os.path.realpath(os.path.join(root, name))
+    if os.path.commonpath([root, path]) != root or not os.path.isfile(path):
+        raise ValueError(f"'{name}' is not a file in {label}")
+    return path
+
+
+def resolve_data_file(name, data_dir=DATA_DIR):
+    """The real path of `name` inside data_dir, so users can't read arbitrary server files."""
+    if not data_dir:
+        raise ValueError("Loading files from the server is disabled (DATA_DIR is not set)")
+    return resolve_inside(name, data_dir)
+
+
+def _evict_uploads(store):
+    cutoff = time.time() - UPLOAD_MAX_AGE
+    for name in os.listdir(store):
+        path = os.path.join(store, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            continue
+
+
+# ==============================================================================
+# 3. WORKSPACE
+# ==============================================================================
+
+class Workspace:
+    """
+    A run-scoped directory holding every artifact of one pipeline run, plus the
+    Python kernels that execute the agents' code with the directory as their CWD.
+    """
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+
+    @classmethod
+    def create(cls, run_id=None, base=WORKSPACE_ROOT):
+        run_id = run_id or f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        return cls(os.path.join(base, run_id))
+
+    @property
+    def run_id(self):
+        return os.path.basename(self.root)
+
+    def path(self, name):
+        """Resolves a relative artifact name inside the workspace; absolute paths pass through."""
+        return name if os.path.isabs(name) else os.path.join(self.root, name)
+
+    def confined_path(self, name):
+        """Like path(), for names an agent chose: raises ValueError unless it is a file in the workspace."""
+        return resolve_inside(name, self.root, "this run's workspace")
+
+    def exists(self, name):
+        return os.path.exists(self.path(name))
+
+    def read_text(self, name):
+        with open(self.path(name), "r") as f:
+            return f.read()
+
+    def import_file(self, src, name=None):
+        """Makes an input file available inside the workspace, hard-linking when possible."""
+        dest = self.path(name or os.path.basename(src))
+        if os.path.abspath(src) == dest:
+            return dest
+        if os.path.exists(dest):
+            os.remove(dest)
+        try:
+            os.link(src, dest)
+        except OSError:
+            shutil.copyfile(src, dest)
+        return dest
+
+    def import_upload(self, fileobj, name):
+        """Saves an uploaded file-like object as `name`, without parsing it (see spool_upload)."""
+        return self.import_file(spool_upload(fileobj, os.path.splitext(name)[1]), name)
+
+    def kernel(self, persistent=True):
+        """
+        The run's Python kernel. persistent=False gives a clean namespace on every call,
+        from the process-wide pool of stateless workers, so parallel calls don't queue.
+        """
+        if not persistent:
+            return PooledKernel(self.root)
+        return get_kernel(self.root, cwd=self.root, persistent=True)
+
+    def shutdown_kernel(self):
+        shutdown_kernel(self.root)
+
+    def close(self):
+        self.shutdown_kernel()
+        clear_spills(self.root)
+
+    def cleanup(self):
+        self.close()
+        shutil.rmtree(self.root, ignore_errors=True)